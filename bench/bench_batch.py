@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Benchmark: distância/raio/mais próximo por registro (loop do radar()) vs Columns (NumPy).
+# Uso: python bench/bench_batch.py [n_aeronaves ...]
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from index import Columns, RADIUS_KM, load_numpy
+
+def synthetic(n, lat, lon, spread_deg=3.0, seed=7):
+    rnd = random.Random(seed)
+    return [{"hex": f"{i:06x}", "lat": lat + rnd.uniform(-spread_deg, spread_deg), "lon": lon + rnd.uniform(-spread_deg, spread_deg),
+             "gs": rnd.uniform(0, 520), "alt_baro": rnd.choice(["ground", rnd.randint(0, 43000)]), "track": rnd.uniform(0, 360),
+             "baro_rate": rnd.randint(-3000, 3000)} for i in range(n)]
+
+def loop(data, lat, lon):
+    out = []
+    for i, s in enumerate(data):
+        slat, slon = s.get('lat'), s.get('lon')
+        d = 6371 * 2 * math.asin(math.sqrt(math.sin(math.radians(slat-lat)/2)**2 + math.cos(math.radians(lat)) * math.cos(math.radians(slat)) * math.sin(math.radians(slon-lon)/2)**2))
+        if d <= RADIUS_KM: out.append((i, d))
+    return out
+
+def timeit(fn, reps):
+    t0 = time.perf_counter()
+    for _ in range(reps): fn()
+    return (time.perf_counter() - t0) / reps * 1000
+
+def main(sizes):
+    if not load_numpy(): sys.exit("NumPy não instalado: caminho em lote indisponível")
+    lat, lon = 51.47, -0.45
+    print(f"{'n':>7} {'loop ms':>8} {'columns ms':>11} {'query ms':>9} {'target ms':>10} {'hits':>6}")
+    for n in sizes:
+        data = synthetic(n, lat, lon)
+        reps = max(3, 20000 // n)
+        cols = Columns(data)
+        ref = loop(data, lat, lon)
+        idx, dist = cols.query(lat, lon, RADIUS_KM)
+        assert [r[0] for r in ref] == idx.tolist()
+        assert all(abs(r[1] - d) < 1e-6 for r, d in zip(ref, dist.tolist()))
+        if ref: # Mais próximo: o do loop (em décimos, como select_target) é o do argmin vetorizado
+            assert cols.target(lat, lon, RADIUS_KM)[1] is data[min(ref, key=lambda r: round(r[1], 1))[0]]
+        print(f"{n:>7} {timeit(lambda: loop(data, lat, lon), reps):>8.2f} {timeit(lambda: Columns(data), reps):>11.2f} "
+              f"{timeit(lambda: cols.query(lat, lon, RADIUS_KM), reps):>9.3f} {timeit(lambda: cols.target(lat, lon, RADIUS_KM), reps):>10.3f} {len(ref):>6}")
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [100, 1000, 5000, 20000])
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+# Benchmark + relatório de consistência: classify() (tabela por prefixo) vs cadeia elif original.
+# Uso: python bench/bench_classify.py [--report]
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from index import MIL_RARE, airline_table, classify
+
+# Cópia literal da cadeia do radar() antes da tabela (V106.2)
+def legacy(call, type_code, mil=False):
+    airline, color, is_rare = "PRIVATE", "#444", False
+    
+    if mil or type_code in MIL_RARE:
+        airline, color, is_rare = "MILITARY", "#000", True
+    elif call.startswith(("TAM", "JJ", "LA")): airline, color = "LATAM BRASIL", "#E6004C"
+    elif call.startswith(("GLO", "G3")): airline, color = "GOL AIRLINES", "#FF6700"
+    elif call.startswith(("AZU", "AD")): airline, color = "AZUL LINHAS", "#004590"
+    elif call.startswith(("PTB", "2Z")): airline, color = "VOEPASS", "#F9A825"
+    elif call.startswith("SID"): airline, color = "SIDERAL CARGO", "#FF0000"
+    elif call.startswith("MWM"): airline, color = "MODERN LOG", "#202020"
+    elif call.startswith("OWT"): airline, color = "TOTAL CARGO", "#005544"
+    elif call.startswith("ABV"): airline, color = "ABAETE AVIAÇÃO", "#003366"
+    elif call.startswith("ASL"): airline, color = "AEROSUL", "#00BFFF"
+    elif call.startswith("SUL"): airline, color = "ASTA LINHAS", "#ED1C24"
+    elif call.startswith("TTL"): airline, color = "TOTAL LINHAS", "#005544"
+    elif call.startswith("PAM"): airline, color = "MAP LINHAS", "#0072CE"
+    elif call.startswith("VXP"): airline, color = "AVION EXPRESS", "#701630"
+    elif call.startswith("OMI"): airline, color = "OMNI TÁXI AÉREO", "#003366"
+    elif call.startswith("DPF"): airline, color, is_rare = "POLÍCIA FEDERAL", "#000", True
+    elif call.startswith("BRS"): airline, color, is_rare = "FAB MILITARY", "#003366", True
+    elif call.startswith("RYR"): airline, color = "RYANAIR", "#003399"
+    elif call.startswith("EZY"): airline, color = "EASYJET", "#FF6600"
+    elif call.startswith("SWA"): airline, color = "SOUTHWEST AIR", "#FFBF00"
+    elif call.startswith(("EJA", "NJE")): airline, color, is_rare = "NETJETS", "#000", True
+    elif "MLBR" in call or "MELI" in call: airline, color, is_rare = "MERCADO LIVRE", "#FFE600", True
+    elif call.startswith("GTI"): airline, color = "ATLAS AIR", "#003366"
+    elif call.startswith("CLX"): airline, color = "CARGOLUX", "#ED1C24"
+    elif call.startswith("ACA"): airline, color = "AIR CANADA", "#FF0000"
+    elif call.startswith("QTR"): airline, color = "QATAR AIRWAYS", "#8A1538" # Grená Corrigido
+    elif call.startswith(("SIA", "SQ")): airline, color = "SINGAPORE AIR", "#FFB200"
+    elif call.startswith("CPA"): airline, color = "CATHAY PACIFIC", "#00656B"
+    elif call.startswith("UAE"): airline, color = "EMIRATES", "#FF0000"
+    elif call.startswith("ANA"): airline, color = "ANA NIPPON", "#003192"
+    elif call.startswith("THY"): airline, color = "TURKISH AIR", "#C8102E"
+    elif call.startswith("KAL"): airline, color = "KOREAN AIR", "#003399"
+    elif call.startswith("AFR"): airline, color = "AIR FRANCE", "#002395"
+    elif call.startswith("AAL"): airline, color = "AMERICAN AIR", "#12316E"
+    elif call.startswith("DAL"): airline, color = "DELTA LINES", "#E01933"
+    elif call.startswith("UAL"): airline, color = "UNITED AIR", "#1B3E93"
+    elif call.startswith("CSN"): airline, color = "CHINA SOUTHERN", "#007AC1"
+    elif call.startswith(("CMP", "RPB", "VCP")): airline, color = "COPA AIRLINES", "#003366"
+    elif call.startswith("BAW"): airline, color = "BRITISH AIR", "#002366"
+    elif call.startswith("IBE"): airline, color = "IBERIA", "#D7192D"
+    elif call.startswith("KLM"): airline, color = "KLM ROYAL", "#00A1DE"
+    elif call.startswith(("ARG", "AR", "GNA")): airline, color = "AEROLINEAS ARG", "#00AEEF"
+    elif call.startswith("TAP"): airline, color = "TAP PORTUGAL", "#2F8E44"
+    elif call.startswith("FDX"): airline, color = "FEDEX", "#4D148C"
+    elif call.startswith("UPS"): airline, color = "UPS CARGO", "#351C15"
+    elif call.startswith("VJT"): airline, color, is_rare = "VISTAJET", "#C0C0C0", True
+    elif call.startswith("LXJ"): airline, color, is_rare = "FLEXJET", "#A52A2A", True
+    elif call.startswith("BCS"): airline, color = "DHL CARGO", "#D40511"
+    elif call.startswith(("ETH", "ET")): airline, color = "ETHIOPIAN AIR", "#006738"
+    elif call.startswith(("MSR", "MS")): airline, color = "EGYPTAIR", "#002855"
+    elif call.startswith(("SAA", "SA")): airline, color = "SOUTH AFRICAN", "#F9BE00"
+    elif call.startswith(("RAM", "AT")): airline, color = "ROYAL AIR MAROC", "#C2102E"
+    elif call.startswith(("KQA", "KQ")): airline, color = "KENYA AIRWAYS", "#C1121F"
+    elif call.startswith(("DLA", "AH")): airline, color = "AIR ALGERIE", "#D21034"
+    elif call.startswith(("LAA", "LN")): airline, color = "LIBYAN AIRLINES", "#000000"
+    elif call.startswith(("TUI", "BY")): airline, color = "TUI AIRWAYS", "#2AD2FF"
+    elif call.startswith(("ETD", "EY")): airline, color = "ETIHAD AIRWAYS", "#AD944D"
+    elif call.startswith(("AXM", "AK")): airline, color = "AIRASIA", "#ED1C24"
+    elif call.startswith(("JSA", "3K")): airline, color = "JETSTAR AIR", "#FF5000"
+    elif call.startswith(("FDB", "FZ")): airline, color = "FLYDUBAI", "#003264"
+    elif call.startswith(("RYN", "RD")): airline, color = "ROYAL JORDANIAN", "#8B0D1E"
+    elif call.startswith(("AIC", "AI")): airline, color = "AIR INDIA", "#ED1C24"
+    elif call.startswith(("IGO", "6E")): airline, color = "INDIGO", "#0055A4"
+    elif call.startswith(("EVA", "BR")): airline, color = "EVA AIR", "#006233"
+    elif call.startswith(("CAL", "CI")): airline, color = "CHINA AIRLINES", "#532E91"
+    elif call.startswith(("CES", "MU")): airline, color = "CHINA EASTERN", "#013B82"
+    elif call.startswith(("CHH", "HU")): airline, color = "HAINAN AIR", "#FFD700"
+    elif call.startswith(("GIA", "GA")): airline, color = "GARUDA INDONESIA", "#004C64"
+    elif call.startswith(("MAS", "MH")): airline, color = "MALAYSIA AIR", "#002244"
+    elif call.startswith(("THA", "TG")): airline, color = "THAI AIRWAYS", "#4A2483"
+    elif call.startswith(("HVN", "VN")): airline, color = "VIETNAM AIRLINES", "#006782"
+    elif call.startswith(("PAL", "PR")): airline, color = "PHILIPPINE AIR", "#013281"
+    elif call.startswith(("EVA", "BR")): airline, color = "EVA AIR", "#006233"
+    elif call.startswith(("SIA", "SQ")): airline, color = "SINGAPORE AIR", "#FFB200"
+    elif call.startswith(("CCA", "CA")): airline, color = "AIR CHINA", "#E30613"
+    elif call.startswith(("VJC", "VJ")): airline, color = "VIETJET AIR", "#F9A825"
+    elif call.startswith(("ITY", "AZ")): airline, color = "ITA AIRWAYS", "#004B96"
+    elif call.startswith(("LOT", "LO")): airline, color = "LOT POLISH", "#003366"
+    elif call.startswith(("FIN", "AY")): airline, color = "FINNAIR", "#00005C"
+    elif call.startswith(("NAX", "DY")): airline, color = "NORWEGIAN AIR", "#D92121"
+    elif call.startswith(("BEL", "SN")): airline, color = "BRUSSELS AIR", "#003399"
+    elif call.startswith(("SWR", "LX", "EDW")): airline, color = "SWISS / EDELWEISS", "#E30613"
+    elif call.startswith(("AUA", "OS")): airline, color = "AUSTRIAN AIR", "#E30613"
+    elif call.startswith(("WZZ", "W6")): airline, color = "WIZZ AIR", "#D0006F"
+    elif call.startswith(("PGT", "PC")): airline, color = "PEGASUS AIR", "#FFD700"
+    elif call.startswith(("AEE", "A3")): airline, color = "AEGEAN AIR", "#002E62"
+    elif call.startswith(("ICE", "FI")): airline, color = "ICELANDAIR", "#00205B"
+    elif call.startswith(("TRA", "HV")): airline, color = "TRANSAVIA", "#00D66C"
+    elif call.startswith(("AEA", "UX")): airline, color = "AIR EUROPA", "#0066FF"
+    elif call.startswith(("VLG", "VY")): airline, color = "VUELING", "#FFD700"
+    elif call.startswith(("JBU", "B6")): airline, color = "JETBLUE", "#00205B"
+    elif call.startswith(("NKS", "NK")): airline, color = "SPIRIT AIR", "#FFEC00"
+    elif call.startswith(("FFT", "F9")): airline, color = "FRONTIER AIR", "#006644"
+    elif call.startswith(("ASA", "AS")): airline, color = "ALASKA AIR", "#00426A"
+    elif call.startswith(("HAL", "HA")): airline, color = "HAWAIIAN AIR", "#93268F"
+    elif call.startswith(("AAY", "G4")): airline, color = "ALLEGIANT AIR", "#FBBA00"
+    elif call.startswith(("AMX", "AM")): airline, color = "AEROMEXICO", "#00235D"
+    elif call.startswith(("VOI", "Y4")): airline, color = "VOLARIS", "#000000"
+    elif call.startswith(("VIV", "VB")): airline, color = "VIVA AEROBUS", "#00A650"
+    elif call.startswith(("WJA", "WS")): airline, color = "WESTJET", "#003A5D"
+    elif call.startswith(("RPA", "YX")): airline, color = "REPUBLIC AIR", "#1D3263"
+    elif call.startswith(("SKW", "OO")): airline, color = "SKYWEST AIR", "#003366"
+    elif call.startswith(("PDT", "PT")): airline, color = "PIEDMONT AIR", "#C41230"
+    elif call.startswith(("ENY", "MQ")): airline, color = "ENVOY AIR", "#AD1124"
+    elif call.startswith(("QFA", "QF")): airline, color = "QANTAS", "#E3001B"
+    elif call.startswith(("ANZ", "NZ")): airline, color = "AIR NEW ZEALAND", "#000000"
+    elif call.startswith(("VOZ", "VA")): airline, color = "VIRGIN AUSTRALIA", "#E21737"
+    elif call.startswith(("JST", "JQ")): airline, color = "JETSTAR", "#FF5100"
+    elif call.startswith(("PAC", "PO")): airline, color = "POLAR CARGO", "#003366"
+    elif call.startswith(("CKS", "K4")): airline, color = "KALITTA AIR", "#ED1C24"
+    elif call.startswith(("AZG", "ZP")): airline, color = "SILK WAY WEST", "#001D41"
+    elif call.startswith(("TAY", "3V")): airline, color = "ASL BELGIUM", "#FF6600"
+    elif call.startswith(("VDA", "VI")): airline, color, is_rare = "VOLGA-DNEPR", "#003399", True
+    elif call.startswith("XRO"): airline, color, is_rare = "JET FLYER", "#000", True
+    elif call.startswith("VMP"): airline, color, is_rare = "VAMP AIR", "#333", True
+    elif call.startswith("AXY"): airline, color, is_rare = "AIRX CHARTER", "#000", True
+    elif call.startswith("FYG"): airline, color, is_rare = "FLYING SERVICE", "#555", True
+    elif call.startswith(("JAT", "LBT", "JA" "JSS", "JWC", "JES")): airline, color = "JetSMART", "#D20019" # Fix JetSMART
+    elif call.startswith(("LPE", "LP")): airline, color = "LATAM PERU", "#E6004C"
+    elif call.startswith(("LNE", "XL")): airline, color = "LATAM ECUADOR", "#E6004C"
+    elif call.startswith(("LNC", "4C")): airline, color = "LATAM COLOMBIA", "#E6004C"
+    elif call.startswith(("LAN", "LA")): airline, color = "LATAM CHILE", "#E6004C"
+    elif call.startswith(("BOV", "OB")): airline, color = "BOLIVIANA AVIACION", "#003399"
+    elif call.startswith(("CUB", "CU")): airline, color = "CUBANA DE AVIACION", "#003399"
+    elif call.startswith(("BWY", "BW")): airline, color = "CARIBBEAN AIRLINES", "#00AEEF"
+    elif call.startswith(("GIA", "GA")): airline, color = "GARUDA INDONESIA", "#004C64"
+    elif call.startswith(("AVA", "AV", "TAI", "LRC", "TPA", "GLP")): airline, color = "AVIANCA GROUP", "#E01F26"
+    elif call.startswith(("GLG", "G3")): airline, color = "GOL (INTL)", "#FF6700"
+    elif call.startswith("CMX"): airline, color = "AEROMEXICO CONNECT", "#00235D"
+    elif call.startswith(("ELY", "LY")): airline, color = "EL AL ISRAEL", "#00205B"
+    elif call.startswith(("SVA", "SV")): airline, color = "SAUDIA AIR", "#133E3C"
+    elif call.startswith(("KAC", "KU")): airline, color = "KUWAIT AIRWAYS", "#004B91"
+    elif call.startswith(("KZR", "KC")): airline, color = "AIR ASTANA", "#988252"
+    elif call.startswith(("CFG", "DE")): airline, color = "CONDOR", "#FBC400"
+    elif call.startswith("VRE"): airline, color, is_rare = "VOLARE AIR", "#000", True
+    elif call.startswith("GES"): airline, color, is_rare = "GESTAIR", "#222", True
+    elif call.startswith("LAV"): airline, color, is_rare = "ALBASTAR", "#E21E26"
+    elif call.startswith("SWT"): airline, color = "SWIFTAIR", "#004A99"
+    elif call.startswith("PWP"): airline, color = "PARANAIR", "#003366"
+    elif call.startswith(("WHL", "FBZ")): airline, color = "FLYBONDI", "#FFD700"
+    elif call.startswith("LDR"): airline, color, is_rare = "LIDER AVIAÇÃO", "#000", True
+    elif call.startswith("NCR"): airline, color = "NATIONAL AIR", "#003366"
+    elif call.startswith("VIR"): airline, color = "VIRGIN ATLANTIC", "#C8102E"
+    elif call.startswith("AFL"): airline, color = "AEROFLOT", "#003399"
+    elif call.startswith("VUK"): airline, color = "VOLOTEA", "#FF4F00"
+    elif call.startswith("EXS"): airline, color = "JET2", "#ED1C24"
+    elif call.startswith("RZO"): airline, color = "SATA AZORES", "#004B91"
+    elif call.startswith("KRE"): airline, color, is_rare = "AEROSUCRE", "#FFD700", True
+    elif call.startswith("OAE"): airline, color, is_rare = "OMNI AIR INTL", "#1D2951", True
+    elif call.startswith("ICV"): airline, color = "CARGOLUX ITALIA", "#ED1C24"
+    elif call.startswith("SBI"): airline, color = "S7 AIRLINES", "#C4D600" # Verde Limão
+    elif call.startswith("BOS"): airline, color = "OPEN SKIES", "#003366"
+    elif call.startswith("RPB"): airline, color = "COPA COLOMBIA", "#003366"
+    elif call.startswith("PUE"): airline, color = "PLUS ULTRA", "#D7192D"
+    elif call.startswith("VCV"): airline, color, is_rare = "CONVIASA", "#003366", True
+    elif call.startswith("WTI"): airline, color = "WORLD TICKET", "#555"
+    elif call.startswith(("SKU", "H2")): airline, color = "SKY AIRLINE", "#FF00FF"
+    elif call.startswith("SAS"): airline, color = "SCANDINAVIAN", "#003399"
+    elif call.startswith("MXY"): airline, color = "BREEZE AIRWAYS", "#00A3E0"
+    elif call.startswith(("DLH", "GEC")): airline, color = "LUFTHANSA CARGO", "#FFD700"
+    elif call.startswith("AAY"): airline, color = "ALLEGIANT AIR", "#FBBA00"
+    elif call.startswith("BOX"): airline, color = "AEROLOGIC", "#FFD700"
+    elif call.startswith("PDT"): airline, color = "PIEDMONT AIR", "#C41230"
+    elif call.startswith("SVW"): airline, color, is_rare = "GLOBAL JET", "#000", True
+    elif call.startswith("NJE"): airline, color, is_rare = "NETJETS EUROPE", "#333"
+    elif call.startswith("SHH"): airline, color = "SKY HIGH", "#E21737"
+    elif call.startswith("EDW"): airline, color = "EDELWEISS AIR", "#ED1C24"
+    elif call.startswith("ACN"): airline, color = "AZUL CONECTA", "#004590"
+    elif call.startswith("TNO"): airline, color = "AEROUNION", "#003366"
+    elif call.startswith("LAE"): airline, color = "LATAM CARGO", "#E6004C"
+    elif call.startswith("MPH"): airline, color = "MARTINAIR CARGO", "#FF4F00"
+    elif call.startswith("CKS"): airline, color = "KALITTA AIR", "#ED1C24"
+    elif call.startswith("LCO"): airline, color = "LAN CARGO", "#E6004C"
+    elif call.startswith("CAO"): airline, color = "AIR CHINA CARGO", "#E30613"
+    elif call.startswith("MSX"): airline, color = "EGYPTAIR CARGO", "#002855"
+    elif call.startswith("KWC"): airline, color = "KOREAN AIR CARGO", "#003399"
+    elif call.startswith("TNO"): airline, color = "AEROUNION", "#003366"
+    elif call.startswith("MPH"): airline, color = "MARTINAIR CARGO", "#FF4F00"
+    elif call.startswith(("JAL", "JL")): airline, color = "JAPAN AIRLINES", "#D90011"
+    elif call.startswith(("VIV", "VA")): airline, color = "VIVA AEROBUS", "#00A650"
+    elif call.startswith(("LID", "LD")): airline, color = "LINEA TURISTICA", "#003366"
+    elif call.startswith("THK"): airline, color = "TURKISH CARGO", "#C8102E"
+    elif call.startswith("ETD"): airline, color = "ETIHAD AIRWAYS", "#AD944D"
+    elif call.startswith("FJI"): airline, color = "FIJI AIRWAYS", "#000000"
+    elif call.startswith("MAU"): airline, color = "AIR MAURITIUS", "#EA1C2D"
+    elif call.startswith("RBA"): airline, color = "ROYAL BRUNEI", "#F9DD16"
+    elif call.startswith("OMA"): airline, color = "OMAN AIR", "#004B8D"
+    elif call.startswith("LUA"): airline, color, is_rare = "LUXEMBOURG GOV", "#00A1DE", True
+    elif call.startswith("CTM"): airline, color, is_rare = "REPUBLIQUE FRANÇAISE", "#002395", True
+    elif call.startswith("GAF"): airline, color, is_rare = "GERMAN AIR FORCE", "#000", True
+    elif call.startswith("TIE"): airline, color, is_rare = "TIME TO FLY", "#000", True
+    elif call.startswith("FYL"): airline, color, is_rare = "FLYING GROUP", "#8B0000", True
+    elif call.startswith("AXY"): airline, color, is_rare = "AIRX CHARTER", "#000", True
+    elif call.startswith("AZG"): airline, color = "SILK WAY WEST", "#001D41"
+    elif call.startswith("VDA"): airline, color, is_rare = "VOLGA-DNEPR", "#003399", True
+    elif call.startswith("IBB"): airline, color = "IBERIA REGIONAL", "#D7192D"
+    elif call.startswith("LNK"): airline, color = "AIR LINK", "#003366"
+    elif call.startswith("EST"): airline, color = "ESTAR AIR", "#000"
+    elif call.startswith("WFL"): airline, color = "WORLD2FLY", "#00AEEF"
+    elif call.startswith("BOV"): airline, color = "BOA BOLIVIA", "#003399"
+    elif call.startswith("PUA"): airline, color = "PLUNA (EX)", "#00AEEF"
+    elif call.startswith("TUS"): airline, color = "ABSA CARGO", "#E6004C"
+    elif call.startswith("MGE"): airline, color = "GENAVIA", "#444"
+    elif call.startswith("RCH"): airline, color, is_rare = "US AIR FORCE AMC", "#555", True
+    elif call.startswith("ASY"): airline, color, is_rare = "ROYAL AUSTRALIAN AF", "#002366", True
+    elif call.startswith("KRH"): airline, color, is_rare = "SAUDI ROYAL FLIGHT", "#133E3C", True
+    elif call.startswith("LWG"): airline, color, is_rare = "LUXWING", "#000", True
+    elif call.startswith("T7"): airline, color, is_rare = "SAN MARINO REG", "#00A1DE", True
+    elif call.startswith("BLU"): airline, color = "AZUL CARGO", "#002855"
+    elif call.startswith(("TTL", "OWT")): airline, color = "TOTAL LINHAS", "#005544"
+    elif call.startswith("RSV"): airline, color = "RICO TÁXI AÉREO", "#003366"
+    elif call.startswith("VUR"): airline, color = "VOE ARUANÃ", "#00AEEF"
+    elif call.startswith("AIB"): airline, color, is_rare = "AIRBUS BELUGA", "#003399", True
+    elif call.startswith("VGN"): airline, color = "VIRGIN ATLANTIC", "#C8102E"
+    elif call.startswith("TGB"): airline, color = "TUI FLY NORDIC", "#2AD2FF"
+    elif call.startswith("ABD"): airline, color = "AIR ATLANTA", "#003366"
+    elif call.startswith("ASY"): airline, color, is_rare = "ROYAL AUSTRALIAN AF", "#002366", True
+    elif call.startswith("TEST"): airline, color, is_rare = "TEST FLIGHT", "#FFFF00", True
+    elif call.startswith("DWI"): airline, color = "ARAJET", "#4ED3E5"
+    elif call.startswith("PWF"): airline, color = "FLY ALLWAYS", "#003366"
+    elif call.startswith("LQD"): airline, color = "LIQUID AIR", "#202020"
+    elif call.startswith("VCP"): airline, color = "COPA CARGO", "#003366"
+    elif call.startswith("TPA"): airline, color = "AVIANCA CARGO", "#E01F26"
+    elif call.startswith("GUY"): airline, color = "GUYANA AIRWAYS", "#007A33"
+    elif call.startswith("AHU"): airline, color, is_rare = "HULK JET (EXTRA)", "#000", True
+    elif call.startswith("SRR"): airline, color = "STAR AIR (UPS)", "#351C15"
+    elif call.startswith("LVU"): airline, color = "LEVU AIR CARGO", "#003366"
+    elif call.startswith("QQE"): airline, color, is_rare = "QATAR EXECUTIVE", "#8A1538", True
+    elif call.startswith("EAV"): airline, color = "MAERSK AIR CARGO", "#00205B"
+    elif call.startswith("FSA"): airline, color = "FLYSA AIR", "#00AEEF"
+    elif call.startswith(("RXA", "ZL")): airline, color = "REX AIRLINES", "#F15A24" # Laranja Rex
+    elif call.startswith("VPC"): airline, color = "CONTOUR AIRL", "#004B91"
+    elif "SANTA" in call or "HOHOHO" in call or type_code == "SLEI": 
+        airline, color, is_rare = "SANTA CLAUS", "#D42426", True
+    elif call.startswith(("PT", "PR", "PP", "PS")): airline, color = f"PRIVATE ({call[:2]})", "#71797E"
+    return airline, color, is_rare
+
+def samples(n=20000, seed=3):
+    rnd = random.Random(seed)
+    calls = [p + "%d" % rnd.randint(1, 9999) for p in airline_table()[0]] + ["SANTA1", "MLBR01", "N/A", "N123AB", "ZZZ999", "LAN800", "LAV101"]
+    while len(calls) < n:
+        calls.append(''.join(rnd.choice(string.ascii_uppercase) for _ in range(3)) + "%d" % rnd.randint(1, 9999))
+    typed = [(c, t) for c in ("TAM3452", "GLO1234", "N123AB") for t in ("A320", "C17", "SLEI")]
+    return [(c, "") for c in calls] + typed
+
+def report(data):
+    diffs = {}
+    for call, t in data:
+        try: old = legacy(call, t)
+        except ValueError as e: old = ("ERRO: %s" % e,)
+        new = classify(call, t)
+        if old != new:
+            key = (old, new)
+            diffs.setdefault(key, []).append(call)
+    print(f"{len(data)} callsigns, {sum(len(v) for v in diffs.values())} divergentes em {len(diffs)} padrões")
+    for (old, new), calls in sorted(diffs.items(), key=lambda kv: -len(kv[1])):
+        print(f"  {len(calls):>5}  {old[0]!s:<22} -> {new[0]!s:<22} ex: {', '.join(calls[:4])}")
+
+def timeit(fn, data, reps=5):
+    best = float('inf')
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        for call, t in data:
+            try: fn(call, t)
+            except ValueError: pass
+        best = min(best, time.perf_counter() - t0)
+    return best / len(data) * 1e6
+
+def main():
+    data = samples()
+    misses = [(c, t) for c, t in data if classify(c, t)[0] == "PRIVATE"]
+    print(f"{'':<22} {'cadeia us':>10} {'tabela us':>10}")
+    print(f"{'todos':<22} {timeit(legacy, data):>10.2f} {timeit(classify, data):>10.2f}")
+    print(f"{'sem match (PRIVATE)':<22} {timeit(legacy, misses):>10.2f} {timeit(classify, misses):>10.2f}")
+    if '--report' in sys.argv: report(data)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Benchmark: tamanho e tempo de codificação das respostas multi-aeronave
+# (jsonify atual vs colunas JSON vs MessagePack, cru / gzip / brotli).
+# Uso: python bench/bench_encoding.py [n_aeronaves ...]
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from index import airline_table, app, brotli, columnar, flight_dict, jsonify, msgpack
+
+def synthetic_payload(n, seed=11):
+    rnd = random.Random(seed)
+    prefixes = sorted(p for p in airline_table()[0] if len(p) == 3)
+    flights = []
+    for i in range(n):
+        s = {"hex": f"{rnd.getrandbits(24):06x}", "r": f"PR-{i:03d}", "flight": f"{rnd.choice(prefixes[:40])}{rnd.randint(1, 9999)}",
+             "lat": -23.4 + rnd.uniform(-1, 1), "lon": -46.5 + rnd.uniform(-1, 1), "gs": rnd.uniform(120, 520),
+             "alt_baro": rnd.randint(0, 41000), "track": rnd.uniform(0, 360), "baro_rate": rnd.randint(-2000, 2000), "route": "GRU GIG"}
+        flights.append(flight_dict(rnd.uniform(0, 190), s, "18 OCT 2026", "10.30"))
+    return {"flights": flights, "count": n, "total": n, "next_cursor": None, "date": "18 OCT 2026", "time": "10.30",
+            "weather": {"temp": "24C", "sky": "CLEAR SKY", "vis": "10KM"}, "feeds": ["adsb.lol", "adsb.fi"]}
+
+def timeit(fn, reps):
+    t0 = time.perf_counter()
+    for _ in range(reps): out = fn()
+    return out, (time.perf_counter() - t0) / reps * 1000
+
+def main(sizes):
+    encoders = [("jsonify", lambda p: jsonify(p).get_data()),
+                ("columnar", lambda p: json.dumps(columnar(p), separators=(',', ':')).encode())]
+    if msgpack is not None: encoders.append(("msgpack", lambda p: msgpack.packb(columnar(p))))
+    with app.app_context():
+        for n in sizes:
+            payload = synthetic_payload(n)
+            reps = max(5, 2000 // n)
+            print(f"n={n}")
+            print(f"  {'formato':<10} {'bytes':>8} {'gzip':>7} {'br':>7} {'encode ms':>10} {'gzip ms':>8} {'br ms':>7}")
+            for name, enc in encoders:
+                data, t_enc = timeit(lambda: enc(payload), reps)
+                gz, t_gz = timeit(lambda: gzip.compress(data, 5), reps)
+                br, t_br = timeit(lambda: brotli.compress(data, quality=5), reps) if brotli else (b'', 0.0)
+                print(f"  {name:<10} {len(data):>8} {len(gz):>7} {len(br) or '-':>7} {t_enc:>10.3f} {t_gz:>8.3f} {t_br:>7.3f}")
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [20, 100, 1000])
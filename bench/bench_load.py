@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+# Teste de carga ponta a ponta: sobe um upstream ADS-B falso local (fontes /v2/lat/../lon/../dist/..,
+# /v2/callsign/.. e o /v1/forecast do open-meteo) com latência, taxa de erro e densidade
+# configuráveis, sobe o app num processo separado apontado para ele (RADAR_UPSTREAM) e dispara
+# /api/radar com N clientes concorrentes espalhados pelas localizações dadas.
+# Uso:
+#   python bench/bench_load.py [--clients 20] [--duration 20] [--locations "-23.43,-46.47;-22.81,-43.25"]
+#                              [--spread 0] [--latency-ms 120] [--jitter-ms 60] [--error-rate 0.02]
+#                              [--density 150] [--json]
+# --spread N sorteia N localizações extras em torno da primeira (±2°), para medir o tile cache.
+# Relata vazão, p50/p95/p99 e chamadas ao upstream por requisição de cliente (total e por tipo).
+import argparse
+import http.server
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+FEED_PATH = re.compile(r'/lat/(-?[\d.]+)/lon/(-?[\d.]+)/dist/(\d+)')
+PREFIXES = ["TAM", "GLO", "AZU", "PTB", "AAL", "AFR", "KLM", "UAE", "N", "PR", "RCH"]
+
+class Upstream(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, latency, jitter, error_rate, density):
+        super().__init__(addr, Handler)
+        self.latency, self.jitter, self.error_rate, self.density = latency, jitter, error_rate, density
+        self.calls = {"feed": 0, "route": 0, "weather": 0, "error": 0}
+        self.lock = threading.Lock()
+
+    def count(self, kind):
+        with self.lock: self.calls[kind] += 1
+
+    def traffic(self, lat, lon, dist_nm, feed):
+        # Mesmo tráfego para a mesma região em todas as fontes; cada fonte perde ~10%
+        rnd = random.Random(f"{round(lat, 1)}:{round(lon, 1)}")
+        span = dist_nm * 1.852 / 111.2
+        out = []
+        for i in range(self.density):
+            a = {"hex": f"{rnd.getrandbits(24):06x}", "flight": f"{rnd.choice(PREFIXES)}{rnd.randint(1, 9999)}".ljust(8),
+                 "r": f"PR-{i:03d}", "t": rnd.choice(["A320", "B738", "E195", "B77W", "C130"]),
+                 "lat": lat + rnd.uniform(-span, span), "lon": lon + rnd.uniform(-span, span),
+                 "gs": rnd.uniform(120, 500), "alt_baro": rnd.randint(1000, 41000), "track": rnd.uniform(0, 360),
+                 "seen_pos": rnd.uniform(0, 10)}
+            if hash((feed, a["hex"])) % 10: out.append(a)
+        return out
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        srv = self.server
+        url = urllib.parse.urlsplit(self.path)
+        m = FEED_PATH.search(url.path)
+        kind = "feed" if m else "route" if '/callsign/' in url.path else "weather" if url.path.endswith('/forecast') else None
+        if not kind: return self.reply(404, {})
+        srv.count(kind)
+        time.sleep(max(0.0, srv.latency + random.uniform(-srv.jitter, srv.jitter)) / 1000)
+        if random.random() < srv.error_rate:
+            srv.count("error")
+            return self.reply(503, {"error": "fake upstream"})
+        if kind == "feed":
+            feed = url.path.split('/')[1]
+            return self.reply(200, {"aircraft": srv.traffic(float(m.group(1)), float(m.group(2)), int(m.group(3)), feed)})
+        if kind == "route":
+            return self.reply(200, {"aircraft": [{"callsign": url.path.rsplit('/', 1)[-1], "route": "GRU-GIG"}]})
+        return self.reply(200, {"current": {"temperature_2m": 24.6, "weather_code": 1, "visibility": 24000}})
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+APP = r'''
+import sys
+from werkzeug.serving import run_simple
+import index
+run_simple("127.0.0.1", int(sys.argv[1]), index.app, threaded=True)
+'''
+
+def start_app(port, upstream):
+    env = dict(os.environ, RADAR_UPSTREAM=upstream, PYTHONDONTWRITEBYTECODE='1')
+    env.setdefault('RADAR_ROUTE_DB', os.path.join(tempfile.mkdtemp(prefix='radar_load_'), 'routes.sqlite3'))
+    proc = subprocess.Popen([sys.executable, '-c', APP, str(port)], cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            requests.get(f"http://127.0.0.1:{port}/api/internal/feeds", timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.1)
+    proc.kill()
+    sys.exit("app não subiu")
+
+def parse_locations(spec, spread, seed=3):
+    locs = [tuple(float(x) for x in p.split(',')) for p in spec.split(';') if p.strip()]
+    rnd = random.Random(seed)
+    base = locs[0]
+    locs += [(base[0] + rnd.uniform(-2, 2), base[1] + rnd.uniform(-2, 2)) for _ in range(spread)]
+    return locs
+
+def client(base, locs, until, out, seed):
+    rnd = random.Random(seed)
+    s = requests.Session()
+    lat, lon = rnd.choice(locs)
+    current = None
+    while time.perf_counter() < until:
+        params = {"lat": f"{lat:.4f}", "lon": f"{lon:.4f}"}
+        if current: params["current_icao"] = current
+        t0 = time.perf_counter()
+        try:
+            r = s.get(base + "/api/radar", params=params, timeout=30)
+            ms = (time.perf_counter() - t0) * 1000
+            flight = r.json().get('flight') if r.status_code == 200 else None
+            current = flight and flight.get('icao')
+            out.append((ms, r.status_code))
+        except (requests.RequestException, ValueError):
+            out.append(((time.perf_counter() - t0) * 1000, 0))
+        if rnd.random() < 0.05: lat, lon = rnd.choice(locs) # De vez em quando o cliente muda de lugar
+
+def pct(xs, p):
+    return round(xs[min(len(xs) - 1, int(len(xs) * p / 100))], 1) if xs else None
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--clients', type=int, default=20)
+    ap.add_argument('--duration', type=float, default=20)
+    ap.add_argument('--locations', default="-23.43,-46.47")
+    ap.add_argument('--spread', type=int, default=0)
+    ap.add_argument('--latency-ms', type=float, default=120)
+    ap.add_argument('--jitter-ms', type=float, default=60)
+    ap.add_argument('--error-rate', type=float, default=0.02)
+    ap.add_argument('--density', type=int, default=150)
+    ap.add_argument('--json', action='store_true')
+    args = ap.parse_args()
+
+    up = Upstream(('127.0.0.1', 0), args.latency_ms, args.jitter_ms, args.error_rate, args.density)
+    threading.Thread(target=up.serve_forever, daemon=True).start()
+    port = free_port()
+    proc = start_app(port, f"http://127.0.0.1:{up.server_address[1]}")
+    try:
+        with up.lock: up.calls = dict.fromkeys(up.calls, 0) # Ignora o ping de prontidão
+        locs = parse_locations(args.locations, args.spread)
+        results = []
+        t0 = time.perf_counter()
+        until = t0 + args.duration
+        threads = [threading.Thread(target=client, args=(f"http://127.0.0.1:{port}", locs, until, results, i)) for i in range(args.clients)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        elapsed = time.perf_counter() - t0
+    finally:
+        proc.terminate()
+        proc.wait()
+        up.shutdown()
+
+    lat_ms = sorted(ms for ms, _ in results)
+    n = len(results)
+    calls = dict(up.calls)
+    report = {"clients": args.clients, "locations": len(locs), "duration_s": round(elapsed, 2), "requests": n,
+              "errors": sum(1 for _, code in results if code != 200), "rps": round(n / elapsed, 1),
+              "p50_ms": pct(lat_ms, 50), "p95_ms": pct(lat_ms, 95), "p99_ms": pct(lat_ms, 99),
+              "mean_ms": round(statistics.fmean(lat_ms), 1) if lat_ms else None,
+              "upstream_calls": calls, "upstream_per_request": {k: round(v / n, 3) for k, v in calls.items()} if n else {},
+              "upstream": {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "error_rate": args.error_rate, "density": args.density}}
+    if args.json:
+        print(json.dumps(report, indent=1))
+        return
+    print(f"{n} req em {report['duration_s']}s com {args.clients} clientes / {len(locs)} locais: {report['rps']} req/s, {report['errors']} erros")
+    print(f"latência ms  p50 {report['p50_ms']}  p95 {report['p95_ms']}  p99 {report['p99_ms']}  média {report['mean_ms']}")
+    print("upstream por req  " + "  ".join(f"{k} {v}" for k, v in report["upstream_per_request"].items())
+          + f"  (total {sum(calls[k] for k in ('feed', 'route', 'weather'))})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Microbenchmarks offline do pipeline do radar, estágio por estágio, de 10 a 20.000
+# aeronaves: dedupe do fetch_aircrafts, índice espacial, filtro por raio, classificação,
+# montagem dos dicts, seleção (alvo único e top-K) e serialização JSON.
+# Uso:
+#   python bench/bench_pipeline.py [--sizes 10,100,1000,5000,20000] [--snapshot gravado.json]
+#                                   [--out resultado.json] [--compare anterior.json]
+# --snapshot aceita a resposta de uma fonte ({"aircraft": [...]}) ou uma lista delas;
+# o snapshot é repetido/deslocado até o tamanho pedido. --out grava JSON para comparar versões.
+import argparse
+import datetime
+import heapq
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import index
+from index import FEEDS, GridIndex, RADIUS_KM, app, callsign, classify, fetch_aircrafts, flight_dict, load_numpy
+
+LAT, LON = -23.43, -46.47
+PREFIXES = ["TAM", "GLO", "AZU", "PTB", "AAL", "UAL", "DAL", "AFR", "KLM", "BAW", "UAE", "QTR", "N", "PR", "RCH", "ZZZ"]
+TYPES = ["A320", "B738", "A21N", "E195", "B77W", "C17", "", "AT76", "C130"]
+
+def synthetic(n, seed=5):
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        out.append({"hex": f"{i:06x}", "flight": f"{rnd.choice(PREFIXES)}{rnd.randint(1, 9999)}".ljust(8), "r": f"PR-{i % 1000:03d}",
+                    "t": rnd.choice(TYPES), "lat": LAT + rnd.uniform(-3.3, 3.3), "lon": LON + rnd.uniform(-3.3, 3.3),
+                    "gs": rnd.uniform(0, 520), "alt_baro": rnd.choice(["ground"] + [rnd.randint(500, 43000)] * 9),
+                    "track": rnd.uniform(0, 360), "baro_rate": rnd.randint(-3000, 3000), "seen_pos": rnd.uniform(0, 30)})
+    return out
+
+def from_snapshot(path, n):
+    raw = json.load(open(path, encoding='utf-8'))
+    base = [a for doc in (raw if isinstance(raw, list) else [raw]) for a in doc.get('aircraft', []) if a.get('lat') is not None]
+    if not base: sys.exit("snapshot sem aeronaves com posição")
+    out = []
+    while len(out) < n:
+        shift = len(out) // len(base) * 0.37 # Cópias deslocadas para não colapsar no dedupe
+        for a in base[:n - len(out)]:
+            out.append(dict(a, hex=f"{len(out):06x}", lat=a['lat'] + shift % 2, lon=a['lon'] + shift % 3))
+    return out
+
+def feed_split(data, seed=9):
+    # Cada fonte vê ~85% do tráfego, com sobreposição, como as quatro fontes reais
+    rnd = random.Random(seed)
+    return {name: [a for a in data if rnd.random() < 0.85] for name, _ in FEEDS}
+
+def measure(fn, reps):
+    times = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return round(statistics.median(times), 4)
+
+def stages(data):
+    n = len(data)
+    reps = max(3, min(200, 20000 // max(n, 1)))
+    per_feed = feed_split(data)
+    index.fetch_feed = lambda name, url, keep=index.has_position, deadline=None, stop=None: [a for a in per_feed[name] if keep(a)]
+    merged, _ = fetch_aircrafts(LAT, LON)
+    grid = GridIndex(merged)
+    hits = grid.query(LAT, LON, RADIUS_KM)
+    dicts = [flight_dict(d, s, "18 OCT 2026", "10.30") for d, s in hits]
+    nearest = min(hits, key=lambda h: round(h[0], 1)) if hits else None
+    single = {"flight": dicts[0] if dicts else None, "weather": {"temp": "24C", "sky": "CLEAR SKY", "vis": "10KM"}, "date": "18 OCT 2026", "time": "10.30"}
+    top = {"flights": dicts[:100], "count": min(100, len(dicts))}
+    r = {"n": n, "in_radius": len(hits), "reps": reps}
+    r["dedupe_ms"] = measure(lambda: fetch_aircrafts(LAT, LON), reps)
+    r["index_build_ms"] = measure(lambda: GridIndex(merged), reps)
+    r["radius_filter_ms"] = measure(lambda: grid.query(LAT, LON, RADIUS_KM), reps)
+    r["classify_ms"] = measure(lambda: [classify(callsign(s), (s.get('t') or '').upper(), s.get('mil')) for _, s in hits], reps)
+    r["dict_build_ms"] = measure(lambda: [flight_dict(d, s, "18 OCT 2026", "10.30") for d, s in hits], reps)
+    r["sort_full_ms"] = measure(lambda: sorted(dicts, key=lambda x: x['dist']), reps) # Seleção antiga (V106.2)
+    r["select_nearest_ms"] = measure(lambda: min(hits, key=lambda h: round(h[0], 1)) if hits else None, reps)
+    r["select_top20_ms"] = measure(lambda: heapq.nsmallest(20, hits, key=lambda h: (h[0], h[1]['hex'])), reps)
+    with app.app_context():
+        r["json_single_ms"] = measure(lambda: app.json.dumps(single), reps)
+        r["json_top100_ms"] = measure(lambda: app.json.dumps(top), reps)
+    return r
+
+def git_rev():
+    try: return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError: return None
+
+STAGES = ["dedupe_ms", "index_build_ms", "radius_filter_ms", "classify_ms", "dict_build_ms", "sort_full_ms",
+          "select_nearest_ms", "select_top20_ms", "json_single_ms", "json_top100_ms"]
+
+def print_table(results, baseline=None):
+    base = {r["n"]: r for r in (baseline or {}).get("results", [])}
+    print(f"{'estágio':<18}" + ''.join(f"{r['n']:>12}" for r in results))
+    print(f"{'no raio':<18}" + ''.join(f"{r['in_radius']:>12}" for r in results))
+    for st in STAGES:
+        cells = []
+        for r in results:
+            cell = f"{r[st]:.3f}"
+            old = base.get(r["n"], {}).get(st)
+            if old: cell += f" {r[st] / old:.2f}x"
+            cells.append(f"{cell:>12}")
+        print(f"{st:<18}" + ''.join(cells))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--sizes', default="10,100,1000,5000,20000")
+    ap.add_argument('--snapshot')
+    ap.add_argument('--out')
+    ap.add_argument('--compare')
+    args = ap.parse_args()
+    sizes = [int(x) for x in args.sizes.split(',') if x]
+    results = [stages(from_snapshot(args.snapshot, n) if args.snapshot else synthetic(n)) for n in sizes]
+    doc = {"rev": git_rev(), "when": datetime.datetime.utcnow().isoformat(timespec='seconds') + "Z", "python": sys.version.split()[0],
+           "numpy": bool(load_numpy()), "source": args.snapshot or "synthetic", "unit": "ms (mediana por execução)", "results": results}
+    print_table(results, json.load(open(args.compare)) if args.compare else None)
+    if args.out:
+        with open(args.out, 'w') as f: json.dump(doc, f, indent=1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Benchmark: varredura linear com haversine (loop original do radar()) vs GridIndex.
+# Uso: python bench/bench_spatial.py [n_aeronaves ...]
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from index import GridIndex, RADIUS_KM
+
+def synthetic(n, lat, lon, spread_deg=6.0, seed=42):
+    rnd = random.Random(seed)
+    return [{"hex": f"{i:06x}", "lat": lat + rnd.uniform(-spread_deg, spread_deg), "lon": lon + rnd.uniform(-spread_deg, spread_deg)} for i in range(n)]
+
+def linear(data, lat, lon):
+    out = []
+    for s in data:
+        slat, slon = s.get('lat'), s.get('lon')
+        if slat and slon:
+            d = 6371 * 2 * math.asin(math.sqrt(math.sin(math.radians(slat-lat)/2)**2 + math.cos(math.radians(lat)) * math.cos(math.radians(slat)) * math.sin(math.radians(slon-lon)/2)**2))
+            if d <= RADIUS_KM: out.append((d, s))
+    return out
+
+def timeit(fn, reps):
+    t0 = time.perf_counter()
+    for _ in range(reps): fn()
+    return (time.perf_counter() - t0) / reps * 1000
+
+def main(sizes):
+    lat, lon = -23.43, -46.47
+    print(f"{'n':>7} {'linear ms':>10} {'build ms':>9} {'within ms':>10} {'nearest ms':>11} {'hits':>6}")
+    for n in sizes:
+        data = synthetic(n, lat, lon)
+        reps = max(3, 20000 // n)
+        grid = GridIndex(data)
+        ref = sorted(h[1]['hex'] for h in linear(data, lat, lon))
+        got = sorted(h[1]['hex'] for h in grid.within(lat, lon, RADIUS_KM))
+        assert ref == got, "GridIndex diverge da varredura linear"
+        assert grid.nearest(lat, lon)[1] is min(linear(data, lat, lon), key=lambda h: h[0])[1]
+        print(f"{n:>7} {timeit(lambda: linear(data, lat, lon), reps):>10.2f} {timeit(lambda: GridIndex(data), reps):>9.2f} "
+              f"{timeit(lambda: grid.within(lat, lon, RADIUS_KM), reps):>10.2f} {timeit(lambda: grid.nearest(lat, lon), reps):>11.3f} {len(got):>6}")
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [100, 1000, 5000, 20000])
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# Benchmark de cold start: tempo de import do index.py e até a primeira resposta de
+# /api/radar e de / em processos novos, sem rede (fontes, clima e rotas são stubs).
+# Uso: python bench/bench_startup.py [--runs N] [--import-budget-ms X] [--first-radar-budget-ms Y] [--modules]
+# Sai com código 1 se a mediana passar do orçamento, para pegar regressões.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CHILD = r'''
+import json, sys, time
+t0 = time.perf_counter()
+import index
+t_import = time.perf_counter()
+index.fetch_feed = lambda name, url, keep=None, deadline=None, stop=None: [{"hex": "e48c12", "lat": -23.40, "lon": -46.45, "flight": "TAM3452", "gs": 450, "alt_baro": 35000, "track": 220}]
+index.fetch_weather = lambda lat, lon: {"temp": "24C", "sky": "CLEAR SKY", "vis": "10KM"}
+index.fetch_route = lambda call: "GRU GIG"
+c = index.app.test_client()
+r = c.get('/api/radar?lat=-23.43&lon=-46.47')
+assert r.status_code == 200 and r.get_json()['flight'], r.data
+t_radar = time.perf_counter()
+r = c.get('/', headers={'Accept-Encoding': 'gzip, br'})
+assert r.status_code == 200
+t_page = time.perf_counter()
+print(json.dumps({"import_ms": (t_import - t0) * 1000, "first_radar_ms": (t_radar - t0) * 1000, "first_page_ms": (t_page - t_radar) * 1000}))
+'''
+
+def run_once():
+    out = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def slowest_modules(n=12):
+    # Imports diretos do index.py (nível 1 do -X importtime), do mais caro para o mais barato
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import index'], cwd=ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or line.count('|') != 2: continue
+        self_us, cum_us, raw = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit(): continue
+        depth = (len(raw) - len(raw.lstrip()) - 1) // 2
+        if depth <= 1: rows.append((int(cum_us), int(self_us), raw.strip()))
+    return sorted(rows, reverse=True)[:n]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--runs', type=int, default=7)
+    ap.add_argument('--import-budget-ms', type=float)
+    ap.add_argument('--first-radar-budget-ms', type=float)
+    ap.add_argument('--modules', action='store_true', help='lista os módulos mais caros (-X importtime)')
+    ap.add_argument('--json', action='store_true')
+    args = ap.parse_args()
+    run_once() # Aquece __pycache__ e cache de disco
+    runs = [run_once() for _ in range(args.runs)]
+    result = {k: {"median": round(statistics.median(r[k] for r in runs), 1), "min": round(min(r[k] for r in runs), 1),
+                  "max": round(max(r[k] for r in runs), 1)} for k in runs[0]}
+    result["python"] = sys.version.split()[0]
+    if args.json: print(json.dumps(result))
+    else:
+        print(f"{'':<16} {'mediana ms':>11} {'min':>8} {'max':>8}   ({args.runs} processos)")
+        for k in ("import_ms", "first_radar_ms", "first_page_ms"):
+            print(f"{k:<16} {result[k]['median']:>11.1f} {result[k]['min']:>8.1f} {result[k]['max']:>8.1f}")
+    if args.modules:
+        print(f"\n{'acumulado ms':>12} {'próprio ms':>11}  módulo")
+        for cum, own, name in slowest_modules():
+            print(f"{cum / 1000:>12.1f} {own / 1000:>11.1f}  {name}")
+    over = []
+    if args.import_budget_ms and result["import_ms"]["median"] > args.import_budget_ms: over.append("import_ms")
+    if args.first_radar_budget_ms and result["first_radar_ms"]["median"] > args.first_radar_budget_ms: over.append("first_radar_ms")
+    if over:
+        print("ACIMA DO ORÇAMENTO: " + ", ".join(over), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
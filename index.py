@@ -1,10 +1,45 @@
 # -*- coding: utf-8 -*-
-from flask import Flask, jsonify, request, render_template_string
+from flask import Flask, Response, jsonify, request
+from array import array
+import base64
+import bisect
+import codecs
+import gzip
+import hashlib
+import hmac
+import heapq
+import itertools
+import json
 import requests
+from requests.adapters import HTTPAdapter
 import math
+import mmap
+import os
 import random
+import re
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
 from datetime import datetime, timedelta
+from collections import OrderedDict
 from functools import lru_cache
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+np = None # NumPy (opcional) só é importado quando um snapshot grande pede o caminho em lote; ver load_numpy()
+try:
+    import msgpack # Opcional: variante binária das respostas multi-aeronave
+except ImportError:
+    msgpack = None
+try:
+    import brotli # Opcional: Content-Encoding br
+except ImportError:
+    brotli = None
+try:
+    import fcntl # Eleição do fetcher do snapshot compartilhado (só Unix)
+except ImportError:
+    fcntl = None
 
 app = Flask(__name__)
 
@@ -14,7 +49,7 @@ DEFAULT_LAT = 37.24804
 DEFAULT_LON = -115.800155
 
 # LISTA DE MILITARES SOLICITADA
-MIL_RARE = [
+MIL_RARE = frozenset([
     'F14', 'F15', 'F16', 'F18', 'F22', 'F35', 'FA18', 'F4', 'F5', 'F117', 'A10', 'AV8B',
     'B1', 'B2', 'B52', 'C130', 'C17', 'C5', 'C160', 'A400', 'CN35', 'C295', 'C390', 'C212',
     'KC10', 'KC135', 'A332', 'K35R', 'KC76', 'P3', 'P8', 'E3', 'E8', 'E2', 'C2', 'RC135',
@@ -24,7 +59,437 @@ MIL_RARE = [
     'J10', 'J11', 'J15', 'J16', 'J20', 'H6', 'KJ200', 'KJ500', 'KJ2000', 'Y8', 'Y9', 'Y20',
     'EUFI', 'RAFA', 'GRIP', 'TOR', 'HAWK', 'T38', 'M346', 'L39', 'K8', 'EMB3', 'AT27', 'C95', 
     'C97', 'C98', 'U27', 'R99', 'E99', 'P95', 'KC390', 'AMX', 'A1', 'A29'
+])
+
+# --- OPERADORES: TABELA COMPILADA EM LOOKUP POR PREFIXO MAIS LONGO ---
+# (prefixo ou tupla de prefixos, airline, cor[, raro]). O prefixo mais longo vence
+# ("LAN" > "LA"); prefixo repetido mantém a primeira linha. "{}" em airline vira o prefixo.
+AIRLINE_DEFAULT = ("PRIVATE", "#444", False)
+AIRLINE_MIL = ("MILITARY", "#000", True)
+AIRLINE_TYPES = {"SLEI": ("SANTA CLAUS", "#D42426", True)}
+# Regras por substring: avaliadas antes dos prefixos
+AIRLINE_SUBSTRINGS = [
+    (("MLBR", "MELI"), "MERCADO LIVRE", "#FFE600", True),
+    (("SANTA", "HOHOHO"), "SANTA CLAUS", "#D42426", True),
 ]
+AIRLINES = [
+    (("TAM", "JJ", "LA"), "LATAM BRASIL", "#E6004C"),
+    (("GLO", "G3"), "GOL AIRLINES", "#FF6700"),
+    (("AZU", "AD"), "AZUL LINHAS", "#004590"),
+    (("PTB", "2Z"), "VOEPASS", "#F9A825"),
+    ("SID", "SIDERAL CARGO", "#FF0000"),
+    ("MWM", "MODERN LOG", "#202020"),
+    ("OWT", "TOTAL CARGO", "#005544"),
+    ("ABV", "ABAETE AVIAÇÃO", "#003366"),
+    ("ASL", "AEROSUL", "#00BFFF"),
+    ("SUL", "ASTA LINHAS", "#ED1C24"),
+    ("TTL", "TOTAL LINHAS", "#005544"),
+    ("PAM", "MAP LINHAS", "#0072CE"),
+    ("VXP", "AVION EXPRESS", "#701630"),
+    ("OMI", "OMNI TÁXI AÉREO", "#003366"),
+    ("DPF", "POLÍCIA FEDERAL", "#000", True),
+    ("BRS", "FAB MILITARY", "#003366", True),
+    ("RYR", "RYANAIR", "#003399"),
+    ("EZY", "EASYJET", "#FF6600"),
+    ("SWA", "SOUTHWEST AIR", "#FFBF00"),
+    (("EJA", "NJE"), "NETJETS", "#000", True),
+    ("GTI", "ATLAS AIR", "#003366"),
+    ("CLX", "CARGOLUX", "#ED1C24"),
+    ("ACA", "AIR CANADA", "#FF0000"),
+    ("QTR", "QATAR AIRWAYS", "#8A1538"), # Grená Corrigido
+    (("SIA", "SQ"), "SINGAPORE AIR", "#FFB200"),
+    ("CPA", "CATHAY PACIFIC", "#00656B"),
+    ("UAE", "EMIRATES", "#FF0000"),
+    ("ANA", "ANA NIPPON", "#003192"),
+    ("THY", "TURKISH AIR", "#C8102E"),
+    ("KAL", "KOREAN AIR", "#003399"),
+    ("AFR", "AIR FRANCE", "#002395"),
+    ("AAL", "AMERICAN AIR", "#12316E"),
+    ("DAL", "DELTA LINES", "#E01933"),
+    ("UAL", "UNITED AIR", "#1B3E93"),
+    ("CSN", "CHINA SOUTHERN", "#007AC1"),
+    (("CMP", "RPB", "VCP"), "COPA AIRLINES", "#003366"),
+    ("BAW", "BRITISH AIR", "#002366"),
+    ("IBE", "IBERIA", "#D7192D"),
+    ("KLM", "KLM ROYAL", "#00A1DE"),
+    (("ARG", "AR", "GNA"), "AEROLINEAS ARG", "#00AEEF"),
+    ("TAP", "TAP PORTUGAL", "#2F8E44"),
+    ("FDX", "FEDEX", "#4D148C"),
+    ("UPS", "UPS CARGO", "#351C15"),
+    ("VJT", "VISTAJET", "#C0C0C0", True),
+    ("LXJ", "FLEXJET", "#A52A2A", True),
+    ("BCS", "DHL CARGO", "#D40511"),
+    (("ETH", "ET"), "ETHIOPIAN AIR", "#006738"),
+    (("MSR", "MS"), "EGYPTAIR", "#002855"),
+    (("SAA", "SA"), "SOUTH AFRICAN", "#F9BE00"),
+    (("RAM", "AT"), "ROYAL AIR MAROC", "#C2102E"),
+    (("KQA", "KQ"), "KENYA AIRWAYS", "#C1121F"),
+    (("DLA", "AH"), "AIR ALGERIE", "#D21034"),
+    (("LAA", "LN"), "LIBYAN AIRLINES", "#000000"),
+    (("TUI", "BY"), "TUI AIRWAYS", "#2AD2FF"),
+    (("ETD", "EY"), "ETIHAD AIRWAYS", "#AD944D"),
+    (("AXM", "AK"), "AIRASIA", "#ED1C24"),
+    (("JSA", "3K"), "JETSTAR AIR", "#FF5000"),
+    (("FDB", "FZ"), "FLYDUBAI", "#003264"),
+    (("RYN", "RD"), "ROYAL JORDANIAN", "#8B0D1E"),
+    (("AIC", "AI"), "AIR INDIA", "#ED1C24"),
+    (("IGO", "6E"), "INDIGO", "#0055A4"),
+    (("EVA", "BR"), "EVA AIR", "#006233"),
+    (("CAL", "CI"), "CHINA AIRLINES", "#532E91"),
+    (("CES", "MU"), "CHINA EASTERN", "#013B82"),
+    (("CHH", "HU"), "HAINAN AIR", "#FFD700"),
+    (("GIA", "GA"), "GARUDA INDONESIA", "#004C64"),
+    (("MAS", "MH"), "MALAYSIA AIR", "#002244"),
+    (("THA", "TG"), "THAI AIRWAYS", "#4A2483"),
+    (("HVN", "VN"), "VIETNAM AIRLINES", "#006782"),
+    (("PAL", "PR"), "PHILIPPINE AIR", "#013281"),
+    (("CCA", "CA"), "AIR CHINA", "#E30613"),
+    (("VJC", "VJ"), "VIETJET AIR", "#F9A825"),
+    (("ITY", "AZ"), "ITA AIRWAYS", "#004B96"),
+    (("LOT", "LO"), "LOT POLISH", "#003366"),
+    (("FIN", "AY"), "FINNAIR", "#00005C"),
+    (("NAX", "DY"), "NORWEGIAN AIR", "#D92121"),
+    (("BEL", "SN"), "BRUSSELS AIR", "#003399"),
+    (("SWR", "LX", "EDW"), "SWISS / EDELWEISS", "#E30613"),
+    (("AUA", "OS"), "AUSTRIAN AIR", "#E30613"),
+    (("WZZ", "W6"), "WIZZ AIR", "#D0006F"),
+    (("PGT", "PC"), "PEGASUS AIR", "#FFD700"),
+    (("AEE", "A3"), "AEGEAN AIR", "#002E62"),
+    (("ICE", "FI"), "ICELANDAIR", "#00205B"),
+    (("TRA", "HV"), "TRANSAVIA", "#00D66C"),
+    (("AEA", "UX"), "AIR EUROPA", "#0066FF"),
+    (("VLG", "VY"), "VUELING", "#FFD700"),
+    (("JBU", "B6"), "JETBLUE", "#00205B"),
+    (("NKS", "NK"), "SPIRIT AIR", "#FFEC00"),
+    (("FFT", "F9"), "FRONTIER AIR", "#006644"),
+    (("ASA", "AS"), "ALASKA AIR", "#00426A"),
+    (("HAL", "HA"), "HAWAIIAN AIR", "#93268F"),
+    (("AAY", "G4"), "ALLEGIANT AIR", "#FBBA00"),
+    (("AMX", "AM"), "AEROMEXICO", "#00235D"),
+    (("VOI", "Y4"), "VOLARIS", "#000000"),
+    (("VIV", "VB"), "VIVA AEROBUS", "#00A650"),
+    (("WJA", "WS"), "WESTJET", "#003A5D"),
+    (("RPA", "YX"), "REPUBLIC AIR", "#1D3263"),
+    (("SKW", "OO"), "SKYWEST AIR", "#003366"),
+    (("PDT", "PT"), "PIEDMONT AIR", "#C41230"),
+    (("ENY", "MQ"), "ENVOY AIR", "#AD1124"),
+    (("QFA", "QF"), "QANTAS", "#E3001B"),
+    (("ANZ", "NZ"), "AIR NEW ZEALAND", "#000000"),
+    (("VOZ", "VA"), "VIRGIN AUSTRALIA", "#E21737"),
+    (("JST", "JQ"), "JETSTAR", "#FF5100"),
+    (("PAC", "PO"), "POLAR CARGO", "#003366"),
+    (("CKS", "K4"), "KALITTA AIR", "#ED1C24"),
+    (("AZG", "ZP"), "SILK WAY WEST", "#001D41"),
+    (("TAY", "3V"), "ASL BELGIUM", "#FF6600"),
+    (("VDA", "VI"), "VOLGA-DNEPR", "#003399", True),
+    ("XRO", "JET FLYER", "#000", True),
+    ("VMP", "VAMP AIR", "#333", True),
+    ("AXY", "AIRX CHARTER", "#000", True),
+    ("FYG", "FLYING SERVICE", "#555", True),
+    (("JAT", "LBT", "JA", "JSS", "JWC", "JES"), "JetSMART", "#D20019"), # Fix JetSMART ("JA" e "JSS" estavam concatenados)
+    (("LPE", "LP"), "LATAM PERU", "#E6004C"),
+    (("LNE", "XL"), "LATAM ECUADOR", "#E6004C"),
+    (("LNC", "4C"), "LATAM COLOMBIA", "#E6004C"),
+    ("LAN", "LATAM CHILE", "#E6004C"),
+    (("BOV", "OB"), "BOLIVIANA AVIACION", "#003399"),
+    (("CUB", "CU"), "CUBANA DE AVIACION", "#003399"),
+    (("BWY", "BW"), "CARIBBEAN AIRLINES", "#00AEEF"),
+    (("AVA", "AV", "TAI", "LRC", "TPA", "GLP"), "AVIANCA GROUP", "#E01F26"),
+    ("GLG", "GOL (INTL)", "#FF6700"),
+    ("CMX", "AEROMEXICO CONNECT", "#00235D"),
+    (("ELY", "LY"), "EL AL ISRAEL", "#00205B"),
+    (("SVA", "SV"), "SAUDIA AIR", "#133E3C"),
+    (("KAC", "KU"), "KUWAIT AIRWAYS", "#004B91"),
+    (("KZR", "KC"), "AIR ASTANA", "#988252"),
+    (("CFG", "DE"), "CONDOR", "#FBC400"),
+    ("VRE", "VOLARE AIR", "#000", True),
+    ("GES", "GESTAIR", "#222", True),
+    ("LAV", "ALBASTAR", "#E21E26"),
+    ("SWT", "SWIFTAIR", "#004A99"),
+    ("PWP", "PARANAIR", "#003366"),
+    (("WHL", "FBZ"), "FLYBONDI", "#FFD700"),
+    ("LDR", "LIDER AVIAÇÃO", "#000", True),
+    ("NCR", "NATIONAL AIR", "#003366"),
+    ("VIR", "VIRGIN ATLANTIC", "#C8102E"),
+    ("AFL", "AEROFLOT", "#003399"),
+    ("VUK", "VOLOTEA", "#FF4F00"),
+    ("EXS", "JET2", "#ED1C24"),
+    ("RZO", "SATA AZORES", "#004B91"),
+    ("KRE", "AEROSUCRE", "#FFD700", True),
+    ("OAE", "OMNI AIR INTL", "#1D2951", True),
+    ("ICV", "CARGOLUX ITALIA", "#ED1C24"),
+    ("SBI", "S7 AIRLINES", "#C4D600"), # Verde Limão
+    ("BOS", "OPEN SKIES", "#003366"),
+    ("PUE", "PLUS ULTRA", "#D7192D"),
+    ("VCV", "CONVIASA", "#003366", True),
+    ("WTI", "WORLD TICKET", "#555"),
+    (("SKU", "H2"), "SKY AIRLINE", "#FF00FF"),
+    ("SAS", "SCANDINAVIAN", "#003399"),
+    ("MXY", "BREEZE AIRWAYS", "#00A3E0"),
+    (("DLH", "GEC"), "LUFTHANSA CARGO", "#FFD700"),
+    ("BOX", "AEROLOGIC", "#FFD700"),
+    ("SVW", "GLOBAL JET", "#000", True),
+    ("SHH", "SKY HIGH", "#E21737"),
+    ("ACN", "AZUL CONECTA", "#004590"),
+    ("TNO", "AEROUNION", "#003366"),
+    ("LAE", "LATAM CARGO", "#E6004C"),
+    ("MPH", "MARTINAIR CARGO", "#FF4F00"),
+    ("LCO", "LAN CARGO", "#E6004C"),
+    ("CAO", "AIR CHINA CARGO", "#E30613"),
+    ("MSX", "EGYPTAIR CARGO", "#002855"),
+    ("KWC", "KOREAN AIR CARGO", "#003399"),
+    (("JAL", "JL"), "JAPAN AIRLINES", "#D90011"),
+    (("LID", "LD"), "LINEA TURISTICA", "#003366"),
+    ("THK", "TURKISH CARGO", "#C8102E"),
+    ("FJI", "FIJI AIRWAYS", "#000000"),
+    ("MAU", "AIR MAURITIUS", "#EA1C2D"),
+    ("RBA", "ROYAL BRUNEI", "#F9DD16"),
+    ("OMA", "OMAN AIR", "#004B8D"),
+    ("LUA", "LUXEMBOURG GOV", "#00A1DE", True),
+    ("CTM", "REPUBLIQUE FRANÇAISE", "#002395", True),
+    ("GAF", "GERMAN AIR FORCE", "#000", True),
+    ("TIE", "TIME TO FLY", "#000", True),
+    ("FYL", "FLYING GROUP", "#8B0000", True),
+    ("IBB", "IBERIA REGIONAL", "#D7192D"),
+    ("LNK", "AIR LINK", "#003366"),
+    ("EST", "ESTAR AIR", "#000"),
+    ("WFL", "WORLD2FLY", "#00AEEF"),
+    ("PUA", "PLUNA (EX)", "#00AEEF"),
+    ("TUS", "ABSA CARGO", "#E6004C"),
+    ("MGE", "GENAVIA", "#444"),
+    ("RCH", "US AIR FORCE AMC", "#555", True),
+    ("ASY", "ROYAL AUSTRALIAN AF", "#002366", True),
+    ("KRH", "SAUDI ROYAL FLIGHT", "#133E3C", True),
+    ("LWG", "LUXWING", "#000", True),
+    ("T7", "SAN MARINO REG", "#00A1DE", True),
+    ("BLU", "AZUL CARGO", "#002855"),
+    ("RSV", "RICO TÁXI AÉREO", "#003366"),
+    ("VUR", "VOE ARUANÃ", "#00AEEF"),
+    ("AIB", "AIRBUS BELUGA", "#003399", True),
+    ("VGN", "VIRGIN ATLANTIC", "#C8102E"),
+    ("TGB", "TUI FLY NORDIC", "#2AD2FF"),
+    ("ABD", "AIR ATLANTA", "#003366"),
+    ("TEST", "TEST FLIGHT", "#FFFF00", True),
+    ("DWI", "ARAJET", "#4ED3E5"),
+    ("PWF", "FLY ALLWAYS", "#003366"),
+    ("LQD", "LIQUID AIR", "#202020"),
+    ("GUY", "GUYANA AIRWAYS", "#007A33"),
+    ("AHU", "HULK JET (EXTRA)", "#000", True),
+    ("SRR", "STAR AIR (UPS)", "#351C15"),
+    ("LVU", "LEVU AIR CARGO", "#003366"),
+    ("QQE", "QATAR EXECUTIVE", "#8A1538", True),
+    ("EAV", "MAERSK AIR CARGO", "#00205B"),
+    ("FSA", "FLYSA AIR", "#00AEEF"),
+    (("RXA", "ZL"), "REX AIRLINES", "#F15A24"), # Laranja Rex
+    ("VPC", "CONTOUR AIRL", "#004B91"),
+    (("PP", "PS"), "PRIVATE ({})", "#71797E"),
+]
+
+def compile_airlines(rows):
+    table = {}
+    for row in rows:
+        prefixes, airline, color = row[:3]
+        rare = row[3] if len(row) > 3 else False
+        for p in ((prefixes,) if isinstance(prefixes, str) else prefixes):
+            table.setdefault(p, (airline.format(p), color, rare))
+    return table, sorted({len(p) for p in table}, reverse=True)
+
+@lru_cache(maxsize=None)
+def airline_table():
+    # Compilada no primeiro classify(), fora do cold start
+    return compile_airlines(AIRLINES)
+
+def classify(call, type_code='', mil=False):
+    # -> (airline, color, is_rare)
+    if mil or type_code in MIL_RARE: return AIRLINE_MIL
+    if type_code in AIRLINE_TYPES: return AIRLINE_TYPES[type_code]
+    for needles, airline, color, rare in AIRLINE_SUBSTRINGS:
+        if any(n in call for n in needles): return airline, color, rare
+    prefixes, lengths = airline_table()
+    for n in lengths:
+        hit = prefixes.get(call[:n])
+        if hit: return hit
+    return AIRLINE_DEFAULT
+
+# --- MÉTRICAS: SERVER-TIMING POR REQUISIÇÃO + /metrics (PROMETHEUS) ---
+# Histogramas de buckets fixos e contadores em dicts sob um lock só; custo de um
+# bisect e um incremento por observação, dá para deixar sempre ligado. Os estágios
+# medidos na thread da requisição também vão para o header Server-Timing.
+METRIC_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_HELP = {
+    "radar_request_seconds": "Latência por endpoint",
+    "radar_requests_total": "Requisições por endpoint e status",
+    "radar_stage_seconds": "Latência por estágio do pipeline",
+    "radar_upstream_seconds": "Latência das chamadas ao upstream (fontes, clima, rotas)",
+    "radar_upstream_errors_total": "Falhas de upstream por fonte e tipo de erro",
+    "radar_cache_total": "Consultas aos caches de tile e clima por resultado",
+    "radar_suppressed_errors_total": "Erros engolidos com fallback (clima, rota, resposta de erro)",
+    "radar_feed_calls_total": "Chamadas por fonte: ok, erro ou pulada pelo circuit breaker",
+    "radar_feed_score": "Score de saúde da fonte (1 = saudável)",
+    "radar_feed_breaker_open": "1 se o circuit breaker da fonte está aberto",
+    "radar_route_cache_total": "Consultas ao cache de rotas por resultado",
+    "radar_fanout_busy_total": "Fan-outs recusados por falta de slot dentro do prazo",
+    "radar_feed_abandoned_total": "Fontes largadas no meio do corpo após a janela de graça do fan-out",
+}
+
+class Metrics:
+    def __init__(self, buckets=METRIC_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}   # (nome, labels) -> valor
+        self.histograms = {} # (nome, labels) -> [por bucket..., +Inf, soma, total]
+
+    def inc(self, name, n=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock: self.counters[key] = self.counters.get(key, 0) + n
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            h = self.histograms.get(key)
+            if h is None: h = self.histograms[key] = [0] * (len(self.buckets) + 3)
+            h[i] += 1
+            h[-2] += seconds
+            h[-1] += 1
+
+    def render(self, extra=()):
+        # Formato texto do Prometheus; extra = [(nome, tipo, labels, valor)] lidos na hora
+        with self.lock:
+            counters = sorted(self.counters.items())
+            hists = sorted((k, list(v)) for k, v in self.histograms.items())
+        rows = [(name, 'counter', labels, v) for (name, labels), v in counters] + list(extra)
+        out, typed = [], set()
+        def head(name, kind):
+            if name in typed: return
+            typed.add(name)
+            if name in METRIC_HELP: out.append(f"# HELP {name} {METRIC_HELP[name]}")
+            out.append(f"# TYPE {name} {kind}")
+        for (name, labels), h in hists:
+            head(name, 'histogram')
+            acc = 0
+            for bound, n in zip(self.buckets + (float('inf'),), h):
+                acc += n
+                out.append(f"{name}_bucket{metric_labels(labels + (('le', '+Inf' if bound == float('inf') else repr(bound)),))} {acc}")
+            out.append(f"{name}_sum{metric_labels(labels)} {h[-2]:.6f}")
+            out.append(f"{name}_count{metric_labels(labels)} {h[-1]}")
+        for name, kind, labels, v in rows:
+            head(name, kind)
+            out.append(f"{name}{metric_labels(tuple(labels))} {v}")
+        return "\n".join(out) + "\n"
+
+def metric_labels(labels):
+    if not labels: return ""
+    esc = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels) + "}"
+
+metrics = Metrics()
+trace = threading.local() # .spans = [(estágio, ms)] da requisição atual; None fora dela
+
+def span(name, ms):
+    spans = getattr(trace, 'spans', None)
+    if spans is not None: spans.append((name, ms))
+
+def stage(name, t0):
+    # Fecha o estágio iniciado em t0 (perf_counter): histograma + Server-Timing
+    ms = (time.perf_counter() - t0) * 1000
+    metrics.observe('radar_stage_seconds', ms / 1000, stage=name)
+    span(name, ms)
+    return ms
+
+# --- CLIENTE UPSTREAM: POOL KEEP-ALIVE + CIRCUIT BREAKER POR FONTE ---
+BREAKER_FAILS = 3      # Falhas seguidas para abrir o circuito
+BREAKER_COOLDOWN = 60  # Segundos que a fonte fica de fora antes de nova tentativa
+HEALTH_ALPHA = 0.2     # Peso da média móvel de latência/erro
+
+http = requests.Session()
+http.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=32))
+http.mount('http://', HTTPAdapter(pool_connections=16, pool_maxsize=32))
+
+# RADAR_UPSTREAM troca todas as fontes, o clima e as rotas por um único servidor
+# (ex.: o upstream falso do bench/bench_load.py). Vazio = APIs reais.
+UPSTREAM = os.environ.get('RADAR_UPSTREAM', '').rstrip('/')
+
+class UpstreamError(Exception):
+    pass
+
+class FeedAbandoned(Exception):
+    # Retardatário largado pelo fan-out depois que as fontes rápidas responderam: não é falha da fonte
+    pass
+
+class FanoutBusy(UpstreamError):
+    # Contenção local (todos os slots de fan-out ocupados), não falha das fontes
+    pass
+
+class FeedHealth:
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.ok, self.errors, self.skipped, self.fails = 0, 0, 0, 0
+        self.latency_ms, self.err_rate = None, 0.0
+        self.open_until, self.last_error = 0.0, None
+
+    def available(self):
+        with self.lock:
+            if time.time() >= self.open_until: return True
+            self.skipped += 1
+            return False
+
+    def record(self, ms, error=None):
+        with self.lock:
+            self.latency_ms = ms if self.latency_ms is None else self.latency_ms + HEALTH_ALPHA * (ms - self.latency_ms)
+            self.err_rate += HEALTH_ALPHA * ((1.0 if error else 0.0) - self.err_rate)
+            if error is None:
+                self.ok, self.fails = self.ok + 1, 0
+                return
+            self.errors, self.fails = self.errors + 1, self.fails + 1
+            self.last_error = f"{type(error).__name__}: {error}"[:200]
+            if self.fails >= BREAKER_FAILS: self.open_until = time.time() + BREAKER_COOLDOWN
+
+    def score(self):
+        # 1.0 = saudável; cai com taxa de erro e latência (referência 2 s)
+        if time.time() < self.open_until: return 0.0
+        lat = self.latency_ms or 0.0
+        return round(max(0.0, (1.0 - self.err_rate) * (1.0 - min(lat, 2000.0) / 4000.0)), 3)
+
+    def snapshot(self):
+        with self.lock:
+            open_for = max(0.0, self.open_until - time.time())
+            return {"name": self.name, "state": "open" if open_for else "closed", "open_for_s": round(open_for, 1),
+                    "score": self.score(), "latency_ms": round(self.latency_ms or 0.0, 1), "err_rate": round(self.err_rate, 3),
+                    "ok": self.ok, "errors": self.errors, "skipped": self.skipped, "consecutive_fails": self.fails,
+                    "last_error": self.last_error}
+
+feed_health = {}
+feed_health_lock = threading.Lock()
+
+def health(name):
+    with feed_health_lock:
+        if name not in feed_health: feed_health[name] = FeedHealth(name)
+        return feed_health[name]
+
+def upstream_get(name, url, timeout, headers=None, parse=None):
+    # parse(resposta) consome o corpo em streaming; sem parse, r.json()
+    h = health(name)
+    if not h.available(): raise UpstreamError(f"{name}: circuit open")
+    t0 = time.perf_counter()
+    try:
+        with http.get(url, headers=headers, timeout=timeout, stream=parse is not None) as r:
+            r.raise_for_status()
+            data = parse(r) if parse else r.json()
+    except FeedAbandoned:
+        metrics.inc('radar_feed_abandoned_total', upstream=name)
+        raise
+    except Exception as e:
+        ms = (time.perf_counter() - t0) * 1000
+        h.record(ms, e)
+        metrics.observe('radar_upstream_seconds', ms / 1000, upstream=name, outcome='error')
+        metrics.inc('radar_upstream_errors_total', upstream=name, error=type(e).__name__)
+        raise
+    ms = (time.perf_counter() - t0) * 1000
+    h.record(ms)
+    metrics.observe('radar_upstream_seconds', ms / 1000, upstream=name, outcome='ok')
+    return data
 
 def get_time_local():
     return datetime.utcnow() - timedelta(hours=3)
@@ -33,55 +498,1562 @@ def get_weather_desc(code):
     mapping = {0: "CLEAR SKY", 1: "FEW CLOUDS", 2: "SCATTERED", 3: "OVERCAST", 45: "FOG", 51: "LIGHT DRIZZLE", 61: "RAIN", 80: "SHOWERS"}
     return mapping.get(code, "CONDITIONS OK")
 
-def get_weather(lat, lon):
+def fetch_weather(lat, lon):
+    url = f"{UPSTREAM or 'https://api.open-meteo.com'}/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,weather_code,visibility"
+    resp = upstream_get("open-meteo", url, 5)
+    curr = resp['current']
+    vis_km = int(curr.get('visibility', 10000) / 1000)
+    return {"temp": f"{int(curr['temperature_2m'])}C", "sky": get_weather_desc(curr['weather_code']), "vis": f"{vis_km}KM"}
+
+# --- CACHE DE CLIMA POR CÉLULA, STALE-WHILE-REVALIDATE ---
+# Célula de WEATHER_CELL_DEG (~25 km). Fresco até WEATHER_TTL; até WEATHER_MAX_STALE
+# serve o valor velho e atualiza em background. O radar() dispara o clima junto com o
+# tráfego e só espera WEATHER_GRACE no final: clima nunca segura o poll.
+WEATHER_CELL_DEG = 0.25
+WEATHER_TTL = 600
+WEATHER_MAX_STALE = 3600
+WEATHER_GRACE = 0.25
+WEATHER_NA = {"temp": "--C", "sky": "METAR ON", "vis": "--KM"}
+weather_cache = {}    # célula -> (ts, clima)
+weather_inflight = {} # célula -> Future do refresh
+weather_lock = threading.Lock()
+weather_pool = ThreadPoolExecutor(max_workers=2)
+snapshot_changed = threading.Condition() # Acorda os streams SSE quando tráfego ou clima mudam
+
+def notify_snapshot():
+    with snapshot_changed: snapshot_changed.notify_all()
+
+def weather_key(lat, lon):
+    return (math.floor(lat / WEATHER_CELL_DEG), math.floor(lon / WEATHER_CELL_DEG))
+
+def load_weather(key):
     try:
-        url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,weather_code,visibility"
-        resp = requests.get(url, timeout=5).json()
-        curr = resp['current']
-        vis_km = int(curr.get('visibility', 10000) / 1000)
-        return {"temp": f"{int(curr['temperature_2m'])}C", "sky": get_weather_desc(curr['weather_code']), "vis": f"{vis_km}KM"}
-    except:
-        return {"temp": "--C", "sky": "METAR ON", "vis": "--KM"}
-
-def fetch_aircrafts(lat, lon):
-    endpoints = [
-        f"https://api.adsb.lol/v2/lat/{lat}/lon/{lon}/dist/200",
-        f"https://opendata.adsb.fi/api/v2/lat/{lat}/lon/{lon}/dist/200",
-        f"https://api.adsb.one/v2/lat/{lat}/lon/{lon}/dist/200",
-        f"https://api.theairtraffic.com/v1/lat/{lat}/lon/{lon}/dist/200" # NOVA FONTE
-    ]
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36', 'Accept': 'application/json'}
-    all_aircraft = []
-    for url in endpoints:
-        try:
-            r = requests.get(url, headers=headers, timeout=10)
-            if r.status_code == 200:
-                data = r.json().get('aircraft', [])
-                if data: all_aircraft.extend(data)
-        except: continue      
-    unique_data = {}
-    for a in all_aircraft:
-        icao = a.get('hex')
-        if icao and icao not in unique_data:
-            unique_data[icao] = a
-    return list(unique_data.values())
+        hit = shared_weather.get(key) # Outro worker pode ter buscado há pouco
+        if hit and time.time() - hit[0] < WEATHER_TTL: ts, w = hit
+        else:
+            ts, w = time.time(), fetch_weather(round((key[0] + 0.5) * WEATHER_CELL_DEG, 3), round((key[1] + 0.5) * WEATHER_CELL_DEG, 3))
+            shared_weather.put(key, ts, w)
+        with weather_lock: weather_cache[key] = (ts, w)
+        notify_snapshot()
+        return w
+    finally:
+        with weather_lock: weather_inflight.pop(key, None)
+
+def weather_future(lat, lon):
+    # Future já resolvido quando o cache serve (fresco ou stale)
+    key = weather_key(lat, lon)
+    with weather_lock:
+        hit = weather_cache.get(key)
+        age = time.time() - hit[0] if hit else None
+        if hit and age < WEATHER_TTL: fut, result = None, 'hit'
+        else:
+            fut = weather_inflight.get(key)
+            result = 'stale' if hit and age < WEATHER_MAX_STALE else 'coalesced' if fut else 'miss'
+            if fut is None: fut = weather_inflight[key] = weather_pool.submit(load_weather, key)
+    metrics.inc('radar_cache_total', cache='weather', result=result)
+    if hit and age < WEATHER_MAX_STALE:
+        fut = Future()
+        fut.set_result(hit[1])
+    return fut
+
+def weather_result(fut, timeout=WEATHER_GRACE):
+    t0 = time.perf_counter()
+    try: return fut.result(timeout=timeout)
+    except Exception as e:
+        metrics.inc('radar_suppressed_errors_total', where='weather', error=type(e).__name__)
+        return dict(WEATHER_NA)
+    finally:
+        if timeout: stage('weather', t0) # timeout 0 = só coleta (o lote mede a espera conjunta)
+
+# FONTES ADS-B (CONSULTADAS EM PARALELO)
+FEEDS = [
+    ("adsb.lol", "https://api.adsb.lol/v2/lat/{lat}/lon/{lon}/dist/200"),
+    ("adsb.fi", "https://opendata.adsb.fi/api/v2/lat/{lat}/lon/{lon}/dist/200"),
+    ("adsb.one", "https://api.adsb.one/v2/lat/{lat}/lon/{lon}/dist/200"),
+    ("theairtraffic", "https://api.theairtraffic.com/v1/lat/{lat}/lon/{lon}/dist/200") # NOVA FONTE
+]
+if UPSTREAM: FEEDS = [(name, UPSTREAM + "/" + name + "/v2/lat/{lat}/lon/{lon}/dist/200") for name, _ in FEEDS]
+FEED_HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36', 'Accept': 'application/json'}
+FEED_DEADLINE = 4.0 # Prazo global por requisição (s), não por fonte
+# Fan-outs simultâneos por processo. O pool tem uma thread por fonte de cada fan-out,
+# então um job nunca espera na fila. A espera pelo slot conta dentro do FEED_DEADLINE;
+# sem slot no prazo o fan-out falha (FanoutBusy) e o fetch_tile serve o tile vencido
+FEED_FANOUTS = 4
+# A primeira fonte que responde abre uma janela de FEED_GRACE; quem não chegou até lá
+# é abandonado (FeedAbandoned, sem contar como erro da fonte). A latência do fan-out
+# fica presa à fonte saudável mais rápida, não à mais lenta que ainda responde.
+FEED_GRACE = 0.3
+fanout_slots = threading.BoundedSemaphore(FEED_FANOUTS)
+feed_pool = ThreadPoolExecutor(max_workers=len(FEEDS) * FEED_FANOUTS)
+
+FEED_CHUNK = 64 * 1024
+
+# O corpo de cada fonte é decodificado em streaming: cada objeto do array "aircraft"
+# sai do buffer assim que chega inteiro e só é guardado se passar no prefiltro
+# (posição e raio). Nada de payload inteiro em memória nem lista intermediária.
+AIRCRAFT_KEY = re.compile(r'"aircraft"\s*:\s*(\S)') # Chave de objeto; o grupo é o primeiro token do valor
+
+def iter_aircraft(chunks):
+    # chunks de bytes de {"aircraft": [{...}, ...], ...} -> registros, um a um
+    text, scan = codecs.getincrementaldecoder('utf-8')(), json.JSONDecoder()
+    buf, pos, inside = '', 0, False
+    for chunk in chunks:
+        buf = buf[pos:] + text.decode(chunk)
+        pos = 0
+        if not inside:
+            m = AIRCRAFT_KEY.search(buf)
+            while m and m.group(1) != '[': m = AIRCRAFT_KEY.search(buf, m.end()) # "aircraft": null etc.: não é o array
+            if not m:
+                pos = max(0, len(buf) - 64) # Guarda o pedaço que pode ser o começo da chave
+                continue
+            pos, inside = m.end(), True
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,': pos += 1
+            if pos >= len(buf): break
+            if buf[pos] == ']': return
+            try: obj, pos = scan.raw_decode(buf, pos)
+            except ValueError: break # Objeto ainda incompleto: espera o próximo chunk
+            if isinstance(obj, dict): yield obj # Item que não é objeto não é aeronave
+    if inside: raise ValueError("payload de aeronaves truncado")
+
+def has_position(a):
+    return a.get('lat') is not None and a.get('lon') is not None
+
+def radius_filter(lat, lon, radius_km):
+    # Caixa em graus (rejeição barata) e só então o haversine exato
+    dlat = radius_km / KM_PER_DEG
+    dlon = radius_km / (KM_PER_DEG * max(0.01, math.cos(math.radians(min(89.9, abs(lat) + dlat)))))
+    def keep(a):
+        la, lo = a.get('lat'), a.get('lon')
+        if la is None or lo is None or abs(la - lat) > dlat or abs((lo - lon + 180) % 360 - 180) > dlon: return False
+        return haversine_km(lat, lon, la, lo) <= radius_km
+    return keep
+
+def body_chunks(r):
+    # O que já chegou (read1), sem esperar FEED_CHUNK bytes; urllib3 sem read1 usa iter_content
+    if not hasattr(r.raw, 'read1'):
+        yield from r.iter_content(FEED_CHUNK)
+        return
+    while True:
+        chunk = r.raw.read1(FEED_CHUNK, decode_content=True)
+        if not chunk: return
+        yield chunk
+
+def until(chunks, deadline, stop=None):
+    # O timeout do requests vale por leitura, não pelo corpo: um corpo que pinga devagar
+    # passaria do prazo. Estourou = erro, e o with do upstream_get fecha a conexão.
+    for chunk in chunks:
+        if stop is not None and stop.is_set(): raise FeedAbandoned("fan-out já respondeu")
+        if time.monotonic() > deadline: raise UpstreamError("prazo do fan-out esgotado durante o corpo")
+        yield chunk
+
+def fetch_feed(name, url, keep=has_position, deadline=None, stop=None):
+    # deadline: time.monotonic() absoluto do fan-out; None = FEED_DEADLINE a partir de agora
+    # stop: Event do fan-out, setado quando a janela de graça fecha
+    deadline = deadline or time.monotonic() + FEED_DEADLINE
+    parse = lambda r: [a for a in iter_aircraft(until(body_chunks(r), deadline, stop)) if keep(a)]
+    return upstream_get(name, url, max(0.1, deadline - time.monotonic()), FEED_HEADERS, parse)
+
+def freshness(a):
+    s = a.get('seen_pos')
+    return s if isinstance(s, (int, float)) else math.inf
+
+def fetch_aircrafts(lat, lon, radius_km=None):
+    # radius_km: prefiltro aplicado no stream de cada fonte; None = tudo que tem posição
+    keep = radius_filter(lat, lon, radius_km) if radius_km else has_position
+    deadline = time.monotonic() + FEED_DEADLINE # Inclui a espera pelo slot
+    if not fanout_slots.acquire(timeout=FEED_DEADLINE):
+        metrics.inc('radar_fanout_busy_total')
+        raise FanoutBusy("todos os fan-outs ocupados")
+    t0, ends, stop = time.perf_counter(), {}, threading.Event()
+    try:
+        # Fontes com circuito aberto nem entram no fan-out
+        jobs = {feed_pool.submit(fetch_feed, name, url.format(lat=lat, lon=lon), keep, deadline, stop): (rank, name)
+                for rank, (name, url) in enumerate(FEEDS) if health(name).available()}
+    except BaseException:
+        fanout_slots.release()
+        raise
+    # O slot só volta quando o último job termina: retardatário abandonado ainda ocupa
+    # uma thread do pool, e o dimensionamento do pool conta com isso
+    left = [len(jobs)]
+    left_lock = threading.Lock()
+    def finished(f):
+        ends.setdefault(f, time.perf_counter())
+        with left_lock:
+            left[0] -= 1
+            if left[0] == 0: fanout_slots.release()
+    if not jobs: fanout_slots.release()
+    for f in jobs: f.add_done_callback(finished)
+    # Merge incremental conforme cada fonte termina: fica o fix mais recente (menor
+    # seen_pos) de cada hex; empate vai para a fonte de maior prioridade (ordem de FEEDS)
+    unique_data, got, pending = {}, set(), set(jobs)
+    cutoff = deadline
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, cutoff - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done: break
+        for f in done:
+            if f.exception(): continue
+            cutoff = min(cutoff, time.monotonic() + FEED_GRACE) # Primeira resposta: só a graça para as demais
+            rank, name = jobs[f]
+            data = f.result()
+            if not data: continue
+            got.add(name)
+            for a in data:
+                icao = a.get('hex')
+                if not icao: continue
+                cur = unique_data.get(icao)
+                if cur is None or (freshness(a), rank) < (freshness(cur[1]), cur[0]): unique_data[icao] = (rank, a)
+    stop.set()
+    for f in pending: f.cancel() # Na fila: nem começa. Rodando: para no próximo chunk (stop) ou no prazo
+    for f, (_, name) in jobs.items(): span(f"feed.{name}", (ends.get(f, time.perf_counter()) - t0) * 1000)
+    return [a for _, a in unique_data.values()], [name for name, _ in FEEDS if name in got]
     
-@lru_cache(maxsize=128)
+# --- ÍNDICE ESPACIAL (GRADE LAT/LON) ---
+# Imutável depois de construído: o tile cache e o store reconstroem a cada snapshot
+# e os leitores só trocam a referência. Consulta = células do bounding box do círculo,
+# rejeição barata por lat/lon e só então o haversine exato.
+INDEX_CELL_DEG = 0.5
+EARTH_KM = 6371.0
+KM_PER_DEG = EARTH_KM * math.pi / 180
+GRID_SERIALS = itertools.count(1) # Versão do snapshot: cada índice novo ganha um serial
+
+class GridIndex:
+    def __init__(self, records=(), cell_deg=INDEX_CELL_DEG):
+        self.serial = next(GRID_SERIALS)
+        self.cell = cell_deg
+        self.ncol = int(round(360 / cell_deg))
+        self.cells = {} # (linha, coluna) -> [(lat, lon, cos(lat), registro)]
+        self.records = []
+        self.cols = None
+        for a in records:
+            la, lo = a.get('lat'), a.get('lon')
+            if la is None or lo is None: continue
+            self.records.append(a)
+            self.cells.setdefault(self.key(la, lo), []).append((la, lo, math.cos(math.radians(la)), a))
+
+    def __len__(self):
+        return len(self.records)
+
+    def key(self, lat, lon):
+        return (math.floor(lat / self.cell), math.floor(lon / self.cell) % self.ncol)
+
+    def within(self, lat, lon, radius_km):
+        # Lista de (distância km, registro) dentro do raio, sem ordem
+        rho = radius_km / EARTH_KM
+        dlat = math.degrees(rho)
+        coslat = math.cos(math.radians(lat))
+        dlon = 180.0 if math.sin(rho) >= coslat else math.degrees(math.asin(math.sin(rho) / coslat))
+        rows = range(math.floor((lat - dlat) / self.cell), math.floor((lat + dlat) / self.cell) + 1)
+        if dlon >= 180.0: cols = range(self.ncol)
+        else: cols = {c % self.ncol for c in range(math.floor((lon - dlon) / self.cell), math.floor((lon + dlon) / self.cell) + 1)}
+        rlat, rlon = math.radians(lat), math.radians(lon)
+        hav_max = math.sin(rho / 2) ** 2
+        out = []
+        for r in rows:
+            for c in cols:
+                bucket = self.cells.get((r, c))
+                if not bucket: continue
+                for la, lo, cla, a in bucket:
+                    if abs(la - lat) > dlat: continue
+                    dl = abs(lo - lon) % 360
+                    if min(dl, 360 - dl) > dlon: continue
+                    h = math.sin((math.radians(la) - rlat) / 2) ** 2 + coslat * cla * math.sin((math.radians(lo) - rlon) / 2) ** 2
+                    if h <= hav_max: out.append((EARTH_KM * 2 * math.asin(math.sqrt(h)), a))
+        return out
+
+    def columns(self):
+        # Montado sob demanda, uma vez por snapshot; None sem NumPy
+        if self.cols is None and load_numpy(): self.cols = Columns(self.records)
+        return self.cols
+
+    def query(self, lat, lon, radius_km):
+        # Como within(), mas vetorizado quando o snapshot é grande e o NumPy existe
+        cols = self.columns() if len(self) >= BATCH_MIN else None
+        if cols is None: return self.within(lat, lon, radius_km)
+        idx, dist = cols.query(lat, lon, radius_km)
+        return [(d, self.records[i]) for i, d in zip(idx.tolist(), dist.tolist())]
+
+    def target(self, lat, lon, radius_km, keep=None, current_icao=None, alt=(None, None)):
+        # Alvo do radar (select_target sobre os que passam em keep); vetorizado com NumPy
+        # em snapshot grande. alt = faixa de altitude já contida em keep, só para pré-filtrar
+        cols = self.columns() if len(self) >= BATCH_MIN else None
+        if cols is not None: return cols.target(lat, lon, radius_km, keep, current_icao, alt)
+        hits = self.query(lat, lon, radius_km)
+        if keep: hits = [h for h in hits if keep(h[1])]
+        return select_target(hits, current_icao) if hits else None
+
+    def nearest(self, lat, lon, max_km=RADIUS_KM):
+        # Raio crescente: o primeiro raio com resultado contém o mais próximo
+        r = self.cell * KM_PER_DEG
+        while True:
+            hits = self.within(lat, lon, min(r, max_km))
+            if hits: return min(hits, key=lambda h: h[0])
+            if r >= max_km: return None
+            r *= 2
+
+# --- GEOMETRIA EM LOTE (NUMPY, OPCIONAL) ---
+BATCH_MIN = 2000 # Abaixo disso o loop em Python ganha do overhead do NumPy
+
+def load_numpy():
+    # Import adiado: NumPy custa ~60-100 ms de cold start e só serve para snapshots grandes
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        np = numpy
+    return np or None
+
+def num(v):
+    return float(v) if isinstance(v, (int, float)) else 0.0
+
+class Columns:
+    # Snapshot em colunas: distância, raio, faixa de altitude e o mais próximo saem em
+    # operações vetorizadas; só as linhas escolhidas passam pelo filtro em Python e viram dict
+    def __init__(self, records):
+        n = len(records)
+        self.records = records
+        self.lat = np.fromiter((a['lat'] for a in records), float, n)
+        self.lon = np.fromiter((a['lon'] for a in records), float, n)
+        self.rlat, self.rlon = np.radians(self.lat), np.radians(self.lon)
+        self.coslat = np.cos(self.rlat)
+        self.alt = np.fromiter((alt_ft(a) for a in records), float, n)
+        self.by_hex = None # s_icao -> linha, montado na primeira histerese
+
+    def distances(self, lat, lon):
+        rlat, rlon = math.radians(lat), math.radians(lon)
+        h = np.sin((self.rlat - rlat) / 2) ** 2 + math.cos(rlat) * self.coslat * np.sin((self.rlon - rlon) / 2) ** 2
+        return EARTH_KM * 2 * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+    def query(self, lat, lon, radius_km):
+        # -> (índices dentro do raio, distâncias km)
+        d = self.distances(lat, lon)
+        idx = np.flatnonzero(d <= radius_km)
+        return idx, d[idx]
+
+    def target(self, lat, lon, radius_km, keep=None, current_icao=None, alt=(None, None)):
+        # Mesmo resultado de select_target(query + keep): (dist, registro) ou None
+        d = self.distances(lat, lon)
+        mask = d <= radius_km
+        if alt[0] is not None: mask &= self.alt >= alt[0]
+        if alt[1] is not None: mask &= self.alt <= alt[1]
+        idx = np.flatnonzero(mask)
+        if not len(idx): return None
+        dr = np.round(d[idx], 1) # select_target compara em décimos; empate fica com a menor linha
+        if keep is None: best = int(idx[np.argmin(dr)])
+        else:
+            best = None
+            for i in idx[np.argsort(dr, kind='stable')].tolist(): # Em ordem de distância até um passar
+                if keep(self.records[i]):
+                    best = i
+                    break
+            if best is None: return None
+        if current_icao:
+            if self.by_hex is None: self.by_hex = {s_icao(a): i for i, a in enumerate(self.records)}
+            cur = self.by_hex.get(current_icao)
+            if cur is not None and cur != best and mask[cur] and (keep is None or keep(self.records[cur])):
+                if not round(float(d[best]), 1) < round(float(d[cur]), 1) - 5: best = cur
+        return float(d[best]), self.records[best]
+
+# --- HISTÓRICO DE TRAJETÓRIA POR ICAO + MODELO DE MOVIMENTO ---
+# Cada aeronave guarda as últimas TRACK_LEN amostras (t, lat, lon, alt, gs, track,
+# baro_rate) num array('d') circular, alimentado a cada snapshot das fontes (tile ou
+# ingestão). t = hora do fix (agora - seen_pos); fix repetido não entra. Daí sai o
+# vetor velocidade, razão de subida, curva e o ponto de maior aproximação do
+# observador, além do próximo poll recomendado: o tempo até a extrapolação linear
+# errar mais que TRACK_TOLERANCE_KM com a curva atual.
+TRACK_LEN = 12
+TRACK_FIELDS = 7
+TRACK_TTL = 300           # Trajetória sem fix novo por esse tempo é descartada
+TRACK_WINDOW = 60         # Janela (s) para diferenças finitas e taxa de curva
+TRACK_TOLERANCE_KM = 0.5
+NEXT_POLL_MIN = 5         # Abaixo disso o snapshot (TILE_TTL) nem mudou
+NEXT_POLL_MAX = 30
+NEXT_POLL_DEFAULT = 10    # Sem histórico suficiente: o intervalo antigo da página
+TRACK_EMPTY = array('d', bytes(8 * TRACK_LEN * TRACK_FIELDS))
+
+def fnum(v):
+    try: return float(v)
+    except (TypeError, ValueError): return math.nan
+
+class Track:
+    __slots__ = ('buf', 'head', 'size')
+
+    def __init__(self):
+        self.buf = TRACK_EMPTY * 1 # Cópia do template: mais barato que montar o array
+        self.head, self.size = 0, 0 # head = posição da próxima escrita
+
+    def last_t(self):
+        return self.buf[((self.head - 1) % TRACK_LEN) * TRACK_FIELDS] if self.size else -math.inf
+
+    def push(self, t, lat, lon, alt, gs, trk, vr):
+        b, i = self.buf, self.head * TRACK_FIELDS
+        b[i], b[i + 1], b[i + 2], b[i + 3], b[i + 4], b[i + 5], b[i + 6] = t, lat, lon, alt, gs, trk, vr
+        self.head = (self.head + 1) % TRACK_LEN
+        self.size = min(self.size + 1, TRACK_LEN)
+
+    def samples(self):
+        # Da mais antiga para a mais recente
+        start = (self.head - self.size) % TRACK_LEN
+        return [tuple(self.buf[j * TRACK_FIELDS:(j + 1) * TRACK_FIELDS]) for j in ((start + k) % TRACK_LEN for k in range(self.size))]
+
+class TrackHistory:
+    def __init__(self, ttl=TRACK_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.tracks = {} # hex -> Track
+        self.last_prune = 0.0
+
+    def observe(self, records, now=None):
+        now = now or time.time()
+        with self.lock:
+            for a in records:
+                icao, la, lo = a.get('hex'), a.get('lat'), a.get('lon')
+                if not icao or la is None or lo is None: continue
+                t = now - (a.get('seen_pos') or 0.0)
+                tr = self.tracks.get(icao)
+                if tr is None: tr = self.tracks[icao] = Track()
+                elif t <= tr.last_t() + 0.5: continue # Mesmo fix (tile em cache, fontes repetidas)
+                alt = a.get('alt_baro')
+                tr.push(t, la, lo, 0.0 if alt == "ground" else fnum(alt), fnum(a.get('gs')), fnum(a.get('track')), fnum(a.get('baro_rate')))
+            if now - self.last_prune > self.ttl / 10:
+                self.last_prune = now
+                for icao in [k for k, tr in self.tracks.items() if now - tr.last_t() > self.ttl]: del self.tracks[icao]
+
+    def history(self, icao):
+        with self.lock:
+            tr = self.tracks.get(icao.lower())
+            return tr.samples() if tr else []
+
+    def status(self):
+        with self.lock:
+            return {"tracks": len(self.tracks), "len": TRACK_LEN, "ttl_s": self.ttl}
+
+def motion_model(samples, lat, lon):
+    # -> (modelo de movimento relativo ao observador em lat/lon, próximo poll em s)
+    if not samples: return None, NEXT_POLL_DEFAULT
+    t, la, lo, alt, gs, trk, vr = samples[-1]
+    window = [s for s in samples if t - s[0] <= TRACK_WINDOW]
+    first = window[0]
+    dt = t - first[0]
+    coslat = math.cos(math.radians(la))
+    if not (math.isnan(gs) or math.isnan(trk)):
+        v = gs * 1.852
+        ve, vn = v * math.sin(math.radians(trk)), v * math.cos(math.radians(trk))
+    elif dt > 0:
+        ve = (lo - first[2]) * KM_PER_DEG * coslat / dt * 3600
+        vn = (la - first[1]) * KM_PER_DEG / dt * 3600
+    else:
+        return None, NEXT_POLL_DEFAULT
+    if not math.isnan(vr): climb = vr
+    elif dt > 0 and not (math.isnan(alt) or math.isnan(first[3])): climb = (alt - first[3]) / dt * 60
+    else: climb = 0.0
+    turn = 0.0 # graus/s, do primeiro ao último rumo reportado na janela
+    tracked = [s for s in window if not math.isnan(s[5])]
+    if len(tracked) >= 2 and tracked[-1][0] > tracked[0][0]:
+        turn = ((tracked[-1][5] - tracked[0][5] + 180) % 360 - 180) / (tracked[-1][0] - tracked[0][0])
+    # Plano local em km centrado no observador; v em km/s
+    px, py = (lo - lon) * KM_PER_DEG * math.cos(math.radians(lat)), (la - lat) * KM_PER_DEG
+    vx, vy = ve / 3600, vn / 3600
+    vv = vx * vx + vy * vy
+    tca = max(0.0, -(px * vx + py * vy) / vv) if vv > 0 else 0.0
+    cpa = math.hypot(px + vx * tca, py + vy * tca)
+    rng = math.hypot(px, py)
+    range_rate = (px * vx + py * vy) / rng * 3600 if rng > 0 else 0.0
+    # Erro da extrapolação em linha reta ~ a t²/2 com a = v ω (aceleração lateral da curva)
+    accel = math.sqrt(vv) * abs(math.radians(turn))
+    poll = math.sqrt(2 * TRACK_TOLERANCE_KM / accel) if accel > 0 else NEXT_POLL_MAX
+    if len(samples) < 2: poll = min(poll, NEXT_POLL_DEFAULT)
+    if tca > 0: poll = min(poll, max(NEXT_POLL_MIN, tca / 2)) # Não dormir na maior aproximação
+    poll = int(max(NEXT_POLL_MIN, min(NEXT_POLL_MAX, poll)))
+    trend = "CLOSING IN" if range_rate < -5 else "MOVING AWAY" if range_rate > 5 else "MAINTAINING"
+    return {"t": round(t, 1), "lat": la, "lon": lo, "ve_kmh": round(ve, 1), "vn_kmh": round(vn, 1), "climb_fpm": int(climb),
+            "turn_dps": round(turn, 2), "range_rate_kmh": round(range_rate, 1), "tca_s": int(tca), "cpa_km": round(cpa, 1),
+            "trend": trend, "samples": len(samples)}, poll
+
+tracks = TrackHistory()
+
+# --- CACHE POR TILE GEOGRÁFICO + SINGLE-FLIGHT ---
+# Cada tile de TILE_DEG graus é buscado uma vez no centro (raio de 200 NM das fontes);
+# com tiles de 1 grau qualquer ponto do tile fica a < 80 km do centro, então o círculo
+# de RADIUS_KM do usuário continua coberto pelo snapshot do tile.
+TILE_DEG = 1.0
+TILE_TTL = 8       # Segundos; o cliente faz polling a cada 10 s
+TILE_MAX = 512
+TILE_STALE_S = 60  # Tile vencido ainda serve enquanto outro fetch roda ou quando o fetch falha
+TILE_REACH_KM = RADIUS_KM + math.hypot(TILE_DEG, TILE_DEG) / 2 * KM_PER_DEG # Prefiltro: raio a partir de qualquer ponto do tile
+tile_cache = {}    # key -> (ts, GridIndex, feeds)
+tile_inflight = {} # key -> Future do fetch em andamento
+tile_lock = threading.Lock()
+
+def tile_key(lat, lon):
+    return (math.floor(lat / TILE_DEG), math.floor(lon / TILE_DEG))
+
+def tile_center(key):
+    return (round((key[0] + 0.5) * TILE_DEG, 4), round((key[1] + 0.5) * TILE_DEG, 4))
+
+def fetch_tile(lat, lon):
+    key = tile_key(lat, lon)
+    with tile_lock:
+        hit = tile_cache.get(key)
+        if hit and time.time() - hit[0] < TILE_TTL:
+            metrics.inc('radar_cache_total', cache='tile', result='hit')
+            return hit[1], hit[2]
+        stale = hit if hit and time.time() - hit[0] < TILE_STALE_S else None
+        fut = tile_inflight.get(key)
+        leader = fut is None
+        if leader: fut = tile_inflight[key] = Future()
+    if not leader:
+        # Refresh já em andamento: o vencido responde na hora; sem ele, carona no fetch
+        metrics.inc('radar_cache_total', cache='tile', result='stale' if stale else 'coalesced')
+        return (stale[1], stale[2]) if stale else fut.result()
+    metrics.inc('radar_cache_total', cache='tile', result='miss')
+    try:
+        data, feeds = fetch_aircrafts(*tile_center(key), TILE_REACH_KM)
+        tracks.observe(data)
+        watch_snapshot(data)
+        grid = GridIndex(data)
+        if feeds:
+            with tile_lock:
+                tile_cache.pop(key, None) # Reinserido no fim: a ordem do dict é a da última atualização
+                if len(tile_cache) >= TILE_MAX:
+                    now = time.time()
+                    for k in [k for k, v in tile_cache.items() if now - v[0] >= TILE_STALE_S]: del tile_cache[k]
+                    while len(tile_cache) >= TILE_MAX: del tile_cache[next(iter(tile_cache))] # Ainda cheio: sai o mais antigo
+                tile_cache[key] = (time.time(), grid, feeds)
+            notify_snapshot()
+        elif stale: grid, feeds = stale[1], stale[2] # Nenhuma fonte respondeu: fica o último bom
+        fut.set_result((grid, feeds))
+        return grid, feeds
+    except Exception as e:
+        if stale: # Fan-out ocupado ou fontes fora: o último snapshot bom vale mais que erro
+            metrics.inc('radar_suppressed_errors_total', where='tile', error=type(e).__name__)
+            fut.set_result((stale[1], stale[2]))
+            return stale[1], stale[2]
+        fut.set_exception(e)
+        raise
+    finally:
+        with tile_lock: tile_inflight.pop(key, None)
+
+# --- MODO INGESTÃO: WORKER EM BACKGROUND + STORE EM MEMÓRIA ---
+# Ativado com RADAR_INGEST=1; regiões em RADAR_WATCH="lat,lon;lat,lon" (padrão: DEFAULT_LAT/LON).
+# Com o modo ativo, /api/radar lê só do store para posições cobertas pelas regiões.
+FEED_RANGE_KM = 370    # 200 NM pedidos às fontes
+INGEST_INTERVAL = 5    # Segundos entre ciclos
+STORE_TTL = 60         # Aeronave some do store se não for vista por esse tempo
+INGEST_STALE_S = 30    # Snapshot da ingestão mais velho que isso (ou ainda inexistente) = cai no tile
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    return 6371 * 2 * math.asin(math.sqrt(math.sin(math.radians(lat2-lat1)/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(math.radians(lon2-lon1)/2)**2))
+
+class AircraftStore:
+    def __init__(self, ttl=STORE_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.aircraft = {} # hex -> (last_seen, registro bruto da fonte)
+        self.index = GridIndex()
+        self.feeds, self.last_tick, self.version = [], 0.0, 0
+
+    def merge(self, records, feeds=(), now=None):
+        now = now or time.time()
+        with self.lock:
+            for a in records:
+                icao = a.get('hex')
+                if icao: self.aircraft[icao] = (now, a)
+            for icao in [k for k, (seen, _) in self.aircraft.items() if now - seen > self.ttl]:
+                del self.aircraft[icao]
+            self.index = GridIndex(a for _, a in self.aircraft.values())
+            self.feeds, self.last_tick = list(feeds), now
+            self.version += 1
+        tracks.observe(records, now)
+        watch_snapshot(records, now)
+        notify_snapshot()
+
+    def snapshot(self):
+        with self.lock:
+            return self.index, list(self.feeds)
+
+    def records(self):
+        # -> (registros brutos, fontes, hora do último merge)
+        with self.lock:
+            return [a for _, a in self.aircraft.values()], list(self.feeds), self.last_tick
+
+    def status(self):
+        with self.lock:
+            return {"aircraft": len(self.aircraft), "version": self.version, "feeds": self.feeds,
+                    "age_s": round(time.time() - self.last_tick, 1) if self.last_tick else None}
+
+class Ingestor(threading.Thread):
+    # fetch(lat, lon) -> (aircraft, feeds); nos testes basta passar uma fonte stub
+    def __init__(self, store, regions, fetch=None, interval=INGEST_INTERVAL):
+        super().__init__(daemon=True, name="radar-ingest")
+        self.store, self.regions, self.interval = store, list(regions), interval
+        self.fetch = fetch or fetch_aircrafts
+        self.halt = threading.Event()
+        self.role = "local"
+
+    def covers(self, lat, lon, radius=RADIUS_KM):
+        return any(haversine_km(lat, lon, rlat, rlon) + radius <= FEED_RANGE_KM for rlat, rlon in self.regions)
+
+    def tick(self):
+        records, used = [], []
+        for rlat, rlon in self.regions:
+            try: data, feeds = self.fetch(rlat, rlon)
+            except Exception: continue
+            records.extend(data)
+            used.extend(f for f in feeds if f not in used)
+        if used: self.store.merge(records, used)
+
+    def run(self):
+        while not self.halt.is_set():
+            self.tick()
+            self.halt.wait(self.interval)
+
+    def serves(self, lat, lon):
+        # Área coberta e snapshot recente: antes do primeiro ciclo ou com o fetcher parado, tile
+        return self.is_alive() and self.covers(lat, lon) and time.time() - self.snapshot_ts() < INGEST_STALE_S
+
+    def snapshot_ts(self):
+        return self.store.last_tick
+
+    def snapshot(self):
+        # -> (índice com query(), fontes) que atende as áreas cobertas
+        return self.store.snapshot()
+
+    def stop(self):
+        self.halt.set()
+
+def parse_regions(spec):
+    regions = []
+    for part in (spec or "").split(';'):
+        if part.strip():
+            rlat, rlon = part.split(',')
+            regions.append((float(rlat), float(rlon)))
+    return regions or [(DEFAULT_LAT, DEFAULT_LON)]
+
+store = AircraftStore()
+ingestor = None
+
+def start_ingest(regions=None, fetch=None, interval=INGEST_INTERVAL):
+    global ingestor
+    if ingestor: ingestor.stop()
+    ingestor = Ingestor(store, regions or parse_regions(os.environ.get('RADAR_WATCH')), fetch, interval)
+    ingestor.start()
+    return ingestor
+
+def aircraft_snapshot(lat, lon):
+    if ingestor and ingestor.serves(lat, lon):
+        snap = ingestor.snapshot()
+        if snap[0] is not None: return snap
+    return fetch_tile(lat, lon)
+
+# --- SNAPSHOT COMPARTILHADO ENTRE PROCESSOS (MMAP, REGISTROS FIXOS) ---
+# Com RADAR_SHARED=/caminho/arquivo, os workers (gunicorn etc.) do mesmo host dividem
+# um único fetcher: quem pega o flock do arquivo .lock ingere e publica o store no
+# mmap; os demais só leem. Se o líder morre o SO solta o lock e outro assume no ciclo
+# seguinte. Dois slots: o líder escreve no que não está publicado e só então troca a
+# seq do cabeçalho. Seguidores consultam os registros direto no mmap (SharedView):
+# nada de copiar o corpo nem montar dicts/índice de tudo; só os hits viram dict.
+# Seq do slot zerada = escrita em andamento; a consulta confere a seq no fim e, se o
+# slot foi reescrito no meio, repete no snapshot mais novo. Rotas, clima e alertas
+# já são compartilhados pelo SQLite; só o líder avalia as assinaturas.
+SHARED_PATH = os.environ.get('RADAR_SHARED')
+SHARED_MAX = 50000      # Capacidade em aeronaves por slot (arquivo de ~6,7 MB)
+SHARED_POLL = 1.0       # Seguidores conferem a seq do cabeçalho nesse intervalo
+SHARED_MAGIC = b'RADARSN3' # Muda junto com o layout: líder antigo não é lido
+SHARED_HEADER = struct.Struct('<8sQ')                   # magic, seq publicada
+SHARED_SLOT = struct.Struct('<QdII')                    # seq (0 = escrevendo), ts, count, máscara de FEEDS
+SHARED_RECORD = struct.Struct('<8s8s10s4sddfffffB')     # hex (até '~' + 6), flight, r, t, lat, lon, alt, gs, track, baro_rate, seen_pos, flags
+SHARED_LATLON = struct.Struct('<dd')
+SHARED_LATLON_AT = struct.calcsize('<8s8s10s4s')        # Offset de lat/lon dentro do registro
+SHARED_GROUND, SHARED_MIL = 1, 2
+
+def pack_aircraft(a):
+    alt = a.get('alt_baro')
+    flags = (SHARED_GROUND if alt == "ground" else 0) | (SHARED_MIL if a.get('mil') else 0)
+    text = lambda k, n: (a.get(k) or '').encode('ascii', 'replace')[:n]
+    return SHARED_RECORD.pack(text('hex', 8), text('flight', 8), text('r', 10), text('t', 4), a['lat'], a['lon'],
+                              math.nan if alt == "ground" else fnum(alt), fnum(a.get('gs')), fnum(a.get('track')),
+                              fnum(a.get('baro_rate')), fnum(a.get('seen_pos')), flags)
+
+def unpack_aircraft(fields):
+    # Campos ausentes (NaN / vazio) ficam fora do dict, como vinham da fonte
+    hx, flight, reg, t, lat, lon, alt, gs, trk, vr, seen, flags = fields
+    a = {"hex": hx.rstrip(b'\0').decode(), "lat": lat, "lon": lon}
+    for k, v in (("flight", flight), ("r", reg), ("t", t)):
+        v = v.rstrip(b'\0')
+        if v: a[k] = v.decode()
+    if flags & SHARED_GROUND: a['alt_baro'] = "ground"
+    elif alt == alt: a['alt_baro'] = int(alt)
+    for k, v in (("gs", gs), ("track", trk), ("baro_rate", vr), ("seen_pos", seen)):
+        if v == v: a[k] = v
+    if flags & SHARED_MIL: a['mil'] = True
+    return a
+
+class SharedSnapshot:
+    def __init__(self, path, capacity=SHARED_MAX):
+        self.path, self.capacity = path, capacity
+        self.slot_size = SHARED_SLOT.size + capacity * SHARED_RECORD.size
+        self.size = SHARED_HEADER.size + 2 * self.slot_size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < self.size: os.ftruncate(fd, self.size)
+            self.mm = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+        self.lock_file, self.seq = None, 0
+        self.current, self.view_lock = None, threading.Lock()
+
+    def slot_at(self, seq):
+        return SHARED_HEADER.size + (seq % 2) * self.slot_size
+
+    def elect(self):
+        # True se este processo é (ou acabou de virar) o fetcher
+        if self.lock_file: return True
+        f = open(self.path + '.lock', 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self.lock_file = f
+        magic, seq = SHARED_HEADER.unpack_from(self.mm, 0)
+        self.seq = seq if magic == SHARED_MAGIC else 0 # Continua a seq de um líder anterior
+        return True
+
+    def publish(self, records, feeds, ts):
+        records = [a for a in records if a.get('hex') and a.get('lat') is not None and a.get('lon') is not None][:self.capacity]
+        mask = sum(1 << i for i, (name, _) in enumerate(FEEDS) if name in feeds)
+        seq = self.seq + 1
+        at = self.slot_at(seq) # O slot que ninguém está lendo como publicado
+        SHARED_SLOT.pack_into(self.mm, at, 0, ts, 0, 0)
+        body = b''.join(pack_aircraft(a) for a in records)
+        self.mm[at + SHARED_SLOT.size:at + SHARED_SLOT.size + len(body)] = body
+        SHARED_SLOT.pack_into(self.mm, at, seq, ts, len(records), mask)
+        SHARED_HEADER.pack_into(self.mm, 0, SHARED_MAGIC, seq)
+        self.seq = seq
+
+    def slot_seq(self, seq):
+        return SHARED_SLOT.unpack_from(self.mm, self.slot_at(seq))[0]
+
+    def view(self):
+        # -> SharedView da última publicação (a mesma enquanto a seq não muda), ou None
+        magic, seq = SHARED_HEADER.unpack_from(self.mm, 0)
+        if magic != SHARED_MAGIC or not seq: return None
+        with self.view_lock:
+            if self.current and self.current.seq == seq: return self.current
+            slot_seq, ts, count, mask = SHARED_SLOT.unpack_from(self.mm, self.slot_at(seq))
+            if slot_seq != seq: return self.current # Já sendo reescrito: fica com a anterior
+            feeds = [name for i, (name, _) in enumerate(FEEDS) if mask >> i & 1]
+            self.current = SharedView(self, seq, ts, count, feeds)
+            return self.current
+
+    def status(self):
+        magic, seq = SHARED_HEADER.unpack_from(self.mm, 0)
+        ts, count = SHARED_SLOT.unpack_from(self.mm, self.slot_at(seq))[1:3] if magic == SHARED_MAGIC and seq else (0, 0)
+        return {"path": self.path, "seq": seq, "aircraft": count, "capacity": self.capacity,
+                "age_s": round(time.time() - ts, 1) if ts else None}
+
+class SharedView:
+    # Uma publicação, lida no lugar; mesma interface de consulta do GridIndex
+    def __init__(self, shared, seq, ts, count, feeds):
+        self.shared, self.seq, self.ts, self.count, self.feeds = shared, seq, ts, count, feeds
+        self.serial = next(GRID_SERIALS)
+        self.base = shared.slot_at(seq) + SHARED_SLOT.size
+        self.lock = threading.Lock()
+        self.decoded = {} # posição -> dict: o mesmo objeto por publicação (o batch usa id())
+        self.grid = None # Sem NumPy: GridIndex cujas células guardam a posição no lugar do dict
+
+    def __len__(self):
+        return self.count
+
+    def latlon(self):
+        # Colunas lat/lon como views do mmap (sem cópia)
+        dtype = np.dtype({'names': ['lat', 'lon'], 'formats': ['<f8', '<f8'], 'offsets': [SHARED_LATLON_AT, SHARED_LATLON_AT + 8], 'itemsize': SHARED_RECORD.size})
+        rows = np.frombuffer(self.shared.mm, dtype=dtype, count=self.count, offset=self.base)
+        return rows['lat'], rows['lon']
+
+    def positions(self, lat, lon, radius_km):
+        # -> [(distância km, posição)] dentro do raio
+        if self.count >= BATCH_MIN and load_numpy():
+            la, lo = self.latlon()
+            dlat = math.degrees(radius_km / EARTH_KM)
+            cand = np.flatnonzero(np.abs(la - lat) <= dlat) # Faixa de latitude antes do haversine
+            if not len(cand): return []
+            rla, rlo = np.radians(la[cand]), np.radians(lo[cand])
+            rlat, rlon = math.radians(lat), math.radians(lon)
+            h = np.sin((rla - rlat) / 2) ** 2 + math.cos(rlat) * np.cos(rla) * np.sin((rlo - rlon) / 2) ** 2
+            d = EARTH_KM * 2 * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+            keep = d <= radius_km
+            return list(zip(d[keep].tolist(), cand[keep].tolist()))
+        with self.lock:
+            if self.grid is None: # Índice de offsets: só lat/lon saem do mmap, uma vez por publicação
+                grid, mm = GridIndex(), self.shared.mm
+                for i in range(self.count):
+                    la, lo = SHARED_LATLON.unpack_from(mm, self.base + i * SHARED_RECORD.size + SHARED_LATLON_AT)
+                    grid.cells.setdefault(grid.key(la, lo), []).append((la, lo, math.cos(math.radians(la)), i))
+                self.grid = grid
+        return self.grid.within(lat, lon, radius_km)
+
+    def target(self, lat, lon, radius_km, keep=None, current_icao=None, alt=(None, None)):
+        # Como GridIndex.target; os poucos hits do raio já são decodificados pelo query
+        hits = self.query(lat, lon, radius_km)
+        if keep: hits = [h for h in hits if keep(h[1])]
+        return select_target(hits, current_icao) if hits else None
+
+    def query(self, lat, lon, radius_km):
+        # Como GridIndex.query; se o slot foi reescrito durante a leitura, repete na publicação nova
+        hits = self.positions(lat, lon, radius_km)
+        with self.lock:
+            fresh = {i: unpack_aircraft(SHARED_RECORD.unpack_from(self.shared.mm, self.base + i * SHARED_RECORD.size))
+                     for _, i in hits if i not in self.decoded}
+            if self.shared.slot_seq(self.seq) != self.seq:
+                view = self.shared.view()
+                return view.query(lat, lon, radius_km) if view and view is not self else []
+            self.decoded.update(fresh)
+            out = [(d, self.decoded[i]) for d, i in hits]
+        if fresh: tracks.observe(list(fresh.values()), self.ts) # Trajetória só de quem foi consultado
+        return out
+
+class SharedIngestor(Ingestor):
+    def __init__(self, store, regions, shared, fetch=None, interval=INGEST_INTERVAL):
+        super().__init__(store, regions, fetch, interval)
+        self.shared, self.seen = shared, None
+        self.role = "follower"
+
+    def snapshot_ts(self):
+        if self.role == "leader": return self.store.last_tick
+        view = self.shared.view()
+        return view.ts if view else 0.0 # Líder morto: a publicação envelhece e o serves() larga
+
+    def snapshot(self):
+        if self.role == "leader": return self.store.snapshot()
+        view = self.shared.view()
+        return (view, list(view.feeds)) if view else (None, [])
+
+    def run(self):
+        while not self.halt.is_set():
+            try:
+                if self.shared.elect():
+                    self.role = "leader"
+                    self.tick()
+                    records, feeds, ts = self.store.records()
+                    if ts: self.shared.publish(records, feeds, ts)
+                else:
+                    view = self.shared.view()
+                    if view and view.serial != self.seen:
+                        self.seen = view.serial
+                        notify_snapshot() # Streams SSE deste worker recalculam
+            except Exception as e:
+                metrics.inc('radar_suppressed_errors_total', where='shared', error=type(e).__name__)
+            self.halt.wait(self.interval if self.role == "leader" else SHARED_POLL)
+
+def start_shared(path=SHARED_PATH, regions=None, fetch=None, interval=INGEST_INTERVAL):
+    # Sem flock cada processo se elegeria líder e o tráfego às fontes multiplicaria
+    if fcntl is None: raise RuntimeError("RADAR_SHARED exige fcntl (Unix)")
+    global ingestor
+    if ingestor: ingestor.stop()
+    ingestor = SharedIngestor(store, regions or parse_regions(os.environ.get('RADAR_WATCH')), SharedSnapshot(path), fetch, interval)
+    ingestor.start()
+    return ingestor
+
+# --- ALERTAS: ASSINATURAS (LOCAL, RAIO, REGRA) AVALIADAS A CADA SNAPSHOT ---
+# Regras: rare (classify), mil (MIL_RARE ou flag mil), types, operators (prefixo do
+# callsign) e hex; várias na mesma assinatura valem como OU. Cada aeronave consulta
+# só os índices das regras (dict/set) e cruza com as assinaturas da sua célula da
+# grade espacial: nada de assinaturas × aeronaves. Evento quando a aeronave entra na
+# área; a mesma (assinatura, hex) só dispara de novo depois de WATCH_EXIT_S fora.
+# Entrega por SSE em /api/watch/<id>/stream, com replay via Last-Event-ID.
+# Só há avaliação onde chega snapshot: área fora das regiões da ingestão só é vista
+# enquanto algum cliente faz polling ali, e a resposta marca covered=false.
+WATCH_CELL_DEG = 1.0
+WATCH_MAX = 10000
+WATCH_MAX_RADIUS_KM = FEED_RANGE_KM
+WATCH_TTL = 24 * 3600     # Assinatura sem leitor por esse tempo é removida
+WATCH_EXIT_S = 120        # Fora da área (ou sem ser vista) por esse tempo = saiu
+WATCH_QUEUE = 100         # Eventos guardados por assinatura para replay
+WATCH_HEARTBEAT = 15
+WATCH_POLL = 1.0          # Stream confere eventos gravados por outros workers nesse intervalo
+WATCH_SYNC_S = 2.0        # Geração no SQLite relida no máximo nesse intervalo (mudança local força)
+WATCH_PRUNE_S = 30        # Limpeza do estado dentro/fora; o dedupe compara a hora, não depende dela
+WATCH_STREAM_MAX = int(os.environ.get('RADAR_WATCH_STREAM_MAX', '32'))
+
+def rule_values(v):
+    # Lista JSON de strings ou string "a,b,c"; outro formato = ValueError (400)
+    if isinstance(v, str): return v.split(',')
+    if not v: return ()
+    if not isinstance(v, list) or not all(isinstance(x, str) for x in v):
+        raise ValueError("regra: use lista de strings ou 'a,b,c'")
+    return v
+
+class Watch:
+    __slots__ = ('id', 'lat', 'lon', 'radius', 'rare', 'mil', 'types', 'operators', 'hexes', 'cells', 'inside', 'seq')
+
+    def __init__(self, wid, lat, lon, radius, rule):
+        if not isinstance(rule, dict): raise ValueError("rule deve ser um objeto")
+        if not (math.isfinite(lat) and -90 <= lat <= 90 and math.isfinite(lon) and -180 <= lon <= 180):
+            raise ValueError("lat/lon fora do intervalo")
+        if not (math.isfinite(radius) and 0 < radius <= WATCH_MAX_RADIUS_KM):
+            raise ValueError(f"radius_km deve estar em (0, {WATCH_MAX_RADIUS_KM}]")
+        self.id, self.lat, self.lon, self.radius = wid, lat, lon, radius
+        self.rare, self.mil = bool(rule.get('rare')), bool(rule.get('mil'))
+        self.types = {t.strip().upper() for t in rule_values(rule.get('types')) if t.strip()}
+        self.operators = {o.strip().upper() for o in rule_values(rule.get('operators')) if o.strip()}
+        self.hexes = {h.strip().lower() for h in rule_values(rule.get('hex')) if h.strip()}
+        self.cells = []
+        self.inside, self.seq = 0, 0 # Preenchidos pelo WatchEngine.get a partir do SQLite
+
+    def rule(self):
+        return {"rare": self.rare, "mil": self.mil, "types": sorted(self.types), "operators": sorted(self.operators), "hex": sorted(self.hexes)}
+
+    def info(self):
+        return {"id": self.id, "lat": self.lat, "lon": self.lon, "radius_km": self.radius, "rule": self.rule(), "inside": self.inside, "seq": self.seq}
+
+class WatchCell:
+    # Índices de regra só das assinaturas que cobrem esta célula
+    __slots__ = ('ids', 'by_hex', 'by_type', 'by_op', 'op_lengths', 'rare', 'mil')
+
+    def __init__(self):
+        self.ids, self.rare, self.mil = set(), set(), set()
+        self.by_hex, self.by_type, self.by_op = {}, {}, {}
+        self.op_lengths = ()
+
+    def add(self, w):
+        self.ids.add(w.id)
+        for index, keys in ((self.by_hex, w.hexes), (self.by_type, w.types), (self.by_op, w.operators)):
+            for k in keys: index.setdefault(k, set()).add(w.id)
+        if w.rare: self.rare.add(w.id)
+        if w.mil: self.mil.add(w.id)
+        self.op_lengths = sorted({len(o) for o in self.by_op})
+
+    def discard(self, w):
+        self.ids.discard(w.id)
+        for index, keys in ((self.by_hex, w.hexes), (self.by_type, w.types), (self.by_op, w.operators)):
+            for k in keys:
+                ids = index.get(k)
+                if ids is None: continue
+                ids.discard(w.id)
+                if not ids: del index[k]
+        self.rare.discard(w.id)
+        self.mil.discard(w.id)
+        self.op_lengths = sorted({len(o) for o in self.by_op})
+
+    def match(self, icao, type_code, call, a):
+        # -> ids cuja regra casa com a aeronave (sem checar o raio)
+        out = set()
+        if self.by_hex: out.update(self.by_hex.get(icao, ()))
+        if self.by_type: out.update(self.by_type.get(type_code, ()))
+        for n in self.op_lengths: out.update(self.by_op.get(call[:n], ()))
+        if self.mil and (a.get('mil') or type_code in MIL_RARE): out.update(self.mil)
+        if self.rare and classify(call, type_code, a.get('mil'))[2]: out.update(self.rare)
+        return out
+
+class WatchEngine:
+    # Assinaturas, eventos e estado dentro/fora ficam no SQLite (arquivo das rotas):
+    # qualquer worker cria, consulta ou transmite. Cada processo guarda só os índices
+    # por célula, recarregados quando watch_meta.gen muda; escrita em BEGIN IMMEDIATE
+    # serializa seq e dedupe entre processos que avaliam o mesmo snapshot.
+    def __init__(self, cell_deg=WATCH_CELL_DEG, path=None):
+        self.cell = cell_deg
+        self.path, self.db = path, None # None = ROUTE_DB, resolvido no primeiro acesso
+        self.lock = threading.Lock()
+        self.changed = threading.Condition() # Acorda os streams deste processo
+        self.subs = {}  # id -> Watch
+        self.cells = {} # (linha, coluna) -> WatchCell
+        self.gen = None
+        self.synced, self.pruned = 0.0, 0.0 # time.monotonic() da última leitura da geração / limpeza
+        self.fired, self.evaluated = 0, 0
+
+    def conn(self):
+        # Chamado com self.lock
+        if self.db is None:
+            try:
+                self.db = sqlite3.connect(self.path or ROUTE_DB, timeout=2, check_same_thread=False, isolation_level=None)
+                self.db.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.Error:
+                self.db = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+            self.db.executescript("""
+                CREATE TABLE IF NOT EXISTS watches (id TEXT PRIMARY KEY, lat REAL NOT NULL, lon REAL NOT NULL, radius REAL NOT NULL,
+                                                    rule TEXT NOT NULL, seq INTEGER NOT NULL, touched REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS watch_events (watch TEXT NOT NULL, seq INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (watch, seq));
+                CREATE TABLE IF NOT EXISTS watch_inside (watch TEXT NOT NULL, hex TEXT NOT NULL, seen REAL NOT NULL, PRIMARY KEY (watch, hex));
+                CREATE TABLE IF NOT EXISTS watch_meta (k TEXT PRIMARY KEY, v INTEGER NOT NULL);
+                INSERT OR IGNORE INTO watch_meta VALUES ('gen', 0);""")
+        return self.db
+
+    def write(self, fn):
+        # fn(db) numa transação que já segura o lock de escrita do arquivo
+        db = self.conn()
+        db.execute("BEGIN IMMEDIATE")
+        try: out = fn(db)
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return out
+
+    def key(self, lat, lon):
+        return (math.floor(lat / self.cell), math.floor(lon / self.cell))
+
+    def cover(self, w):
+        # Células do bounding box do círculo da assinatura
+        dlat = w.radius / KM_PER_DEG
+        dlon = min(180.0, w.radius / (KM_PER_DEG * max(0.01, math.cos(math.radians(min(89.9, abs(w.lat) + dlat))))))
+        r0, c0 = self.key(w.lat - dlat, w.lon - dlon)
+        r1, c1 = self.key(w.lat + dlat, w.lon + dlon)
+        ncol = int(round(360 / self.cell))
+        return list({(r, (c + ncol // 2) % ncol - ncol // 2) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)})
+
+    def sync(self):
+        # Chamado com self.lock: reconstrói os índices se outro processo (ou este) mudou as assinaturas
+        if time.monotonic() - self.synced < WATCH_SYNC_S: return
+        db = self.conn()
+        gen = db.execute("SELECT v FROM watch_meta WHERE k = 'gen'").fetchone()[0]
+        self.synced = time.monotonic()
+        if gen == self.gen: return
+        subs, cells = {}, {}
+        for wid, lat, lon, radius, rule in db.execute("SELECT id, lat, lon, radius, rule FROM watches"):
+            w = subs[wid] = Watch(wid, lat, lon, radius, json.loads(rule))
+            w.cells = self.cover(w)
+            for c in w.cells:
+                cell = cells.get(c)
+                if cell is None: cell = cells[c] = WatchCell()
+                cell.add(w)
+        self.subs, self.cells, self.gen = subs, cells, gen
+
+    def add(self, lat, lon, radius, rule):
+        w = Watch(os.urandom(6).hex(), lat, lon, radius, rule)
+        if not (w.rare or w.mil or w.types or w.operators or w.hexes): raise ValueError("regra vazia")
+
+        def insert(db):
+            self.expire(db)
+            if db.execute("SELECT COUNT(*) FROM watches").fetchone()[0] >= WATCH_MAX: raise ValueError("limite de assinaturas")
+            db.execute("INSERT INTO watches VALUES (?, ?, ?, ?, ?, 0, ?)", (w.id, lat, lon, radius, json.dumps(w.rule()), time.time()))
+            db.execute("UPDATE watch_meta SET v = v + 1 WHERE k = 'gen'")
+
+        with self.lock:
+            self.write(insert)
+            self.synced = 0.0 # Próximo sync relê a geração
+        return w
+
+    def remove(self, wid):
+        with self.lock:
+            removed = self.write(lambda db: self.drop(db, [wid]))
+            self.synced = 0.0
+        with self.changed: self.changed.notify_all() # Stream aberto dessa assinatura encerra
+        return removed
+
+    def drop(self, db, ids):
+        # Dentro de write()
+        n = 0
+        for wid in ids:
+            n += db.execute("DELETE FROM watches WHERE id = ?", (wid,)).rowcount
+            db.execute("DELETE FROM watch_events WHERE watch = ?", (wid,))
+            db.execute("DELETE FROM watch_inside WHERE watch = ?", (wid,))
+        if n: db.execute("UPDATE watch_meta SET v = v + 1 WHERE k = 'gen'")
+        return n > 0
+
+    def expire(self, db):
+        ids = [r[0] for r in db.execute("SELECT id FROM watches WHERE touched < ?", (time.time() - WATCH_TTL,))]
+        if ids: self.drop(db, ids)
+
+    def active(self):
+        # Caminho dos snapshots: sem assinaturas (na última leitura) não toca no SQLite
+        if time.monotonic() - self.synced < WATCH_SYNC_S: return bool(self.subs)
+        with self.lock:
+            self.sync()
+            return bool(self.subs)
+
+    def evaluate(self, records, now=None):
+        # Um snapshot (tile ou ciclo de ingestão): dispara entradas novas nas áreas
+        now = now or time.time()
+        with self.lock:
+            self.sync()
+            if not self.subs: return 0
+            hits = [] # Casou a regra e está no raio; dedupe e seq no SQLite
+            for a in records:
+                la, lo = a.get('lat'), a.get('lon')
+                if la is None or lo is None: continue
+                cell = self.cells.get(self.key(la, lo))
+                if cell is None: continue
+                icao = (a.get('hex') or '').lower()
+                type_code = (a.get('t') or '').upper()
+                call = callsign(a)
+                for wid in cell.match(icao, type_code, call, a):
+                    w = self.subs[wid]
+                    d = haversine_km(w.lat, w.lon, la, lo)
+                    if d <= w.radius: hits.append((wid, icao, call, type_code, d, a))
+            self.evaluated += len(records)
+            if not hits: return 0
+
+            def record(db):
+                wids = list({h[0] for h in hits})
+                seen = {}
+                for i in range(0, len(wids), 500): # Limite de parâmetros do SQLite
+                    part = wids[i:i + 500]
+                    q = f"SELECT watch, hex, seen FROM watch_inside WHERE watch IN ({','.join('?' * len(part))})"
+                    seen.update(((w, h), t) for w, h, t in db.execute(q, part))
+                db.executemany("INSERT OR REPLACE INTO watch_inside VALUES (?, ?, ?)", [(h[0], h[1], now) for h in hits])
+                fired = 0
+                for wid, icao, call, type_code, d, a in hits:
+                    t = seen.get((wid, icao))
+                    if t is not None and now - t <= WATCH_EXIT_S: continue # Já dentro: sem evento repetido
+                    if not db.execute("UPDATE watches SET seq = seq + 1 WHERE id = ?", (wid,)).rowcount: continue # Removida por outro processo
+                    seq = db.execute("SELECT seq FROM watches WHERE id = ?", (wid,)).fetchone()[0]
+                    event = {"seq": seq, "watch": wid, "icao": icao.upper(), "call": call, "type": type_code,
+                             "airline": classify(call, type_code, a.get('mil'))[0],
+                             "dist": round(d, 1), "lat": a['lat'], "lon": a['lon'], "alt": alt_ft(a), "t": round(now, 1)}
+                    db.execute("INSERT INTO watch_events VALUES (?, ?, ?)", (wid, seq, json.dumps(event, separators=(',', ':'))))
+                    db.execute("DELETE FROM watch_events WHERE watch = ? AND seq <= ?", (wid, seq - WATCH_QUEUE))
+                    fired += 1
+                return fired
+
+            fired = self.write(record)
+            self.fired += fired
+        if fired:
+            with self.changed: self.changed.notify_all()
+        return fired
+
+    def prune(self, now=None):
+        now = now or time.time()
+        if time.monotonic() - self.pruned < WATCH_PRUNE_S: return
+        with self.lock:
+            self.pruned = time.monotonic()
+            self.write(lambda db: db.execute("DELETE FROM watch_inside WHERE seen < ?", (now - WATCH_EXIT_S,)))
+
+    def get(self, wid):
+        # -> Watch com seq/inside atuais (e marca leitura), ou None
+        with self.lock:
+            db = self.conn()
+            row = db.execute("SELECT lat, lon, radius, rule, seq FROM watches WHERE id = ?", (wid,)).fetchone()
+            if not row: return None
+            db.execute("UPDATE watches SET touched = ? WHERE id = ?", (time.time(), wid))
+            w = Watch(wid, row[0], row[1], row[2], json.loads(row[3]))
+            w.seq = row[4]
+            w.inside = db.execute("SELECT COUNT(*) FROM watch_inside WHERE watch = ?", (wid,)).fetchone()[0]
+            return w
+
+    def events(self, wid, after=0):
+        with self.lock:
+            rows = self.conn().execute("SELECT data FROM watch_events WHERE watch = ? AND seq > ? ORDER BY seq", (wid, after)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def wait_events(self, wid, after, timeout):
+        # -> eventos com seq > after (espera até timeout), ou None se a assinatura sumiu.
+        # Eventos de outro processo não acordam a Condition: confere o SQLite a cada WATCH_POLL
+        t_end = time.time() + timeout
+        while True:
+            with self.lock:
+                row = self.conn().execute("SELECT seq FROM watches WHERE id = ?", (wid,)).fetchone()
+            if not row: return None
+            if row[0] > after or time.time() >= t_end: break
+            with self.changed: self.changed.wait(min(WATCH_POLL, t_end - time.time()))
+        with self.lock: self.conn().execute("UPDATE watches SET touched = ? WHERE id = ?", (time.time(), wid))
+        return self.events(wid, after) if row[0] > after else []
+
+    def status(self):
+        with self.lock:
+            self.sync()
+            return {"subscriptions": len(self.subs), "cells": len(self.cells), "fired": self.fired, "evaluated": self.evaluated}
+
+watches = WatchEngine()
+watch_stream_slots = threading.BoundedSemaphore(max(1, WATCH_STREAM_MAX))
+
+def watch_info(w):
+    # info() + cobertura: a área inteira dentro de uma região da ingestão ativa
+    info = w.info()
+    info['covered'] = bool(ingestor and ingestor.is_alive() and ingestor.covers(w.lat, w.lon, w.radius))
+    if not info['covered']: info['warning'] = "área fora da ingestão: só avaliada enquanto houver polling de /api/radar nela"
+    return info
+
+def watch_snapshot(records, now=None):
+    # Gancho dos snapshots (tile e ingestão); não derruba o fetch se algo falhar
+    try:
+        if not watches.active(): return
+        watches.evaluate(records, now)
+        watches.prune(now)
+    except Exception as e:
+        metrics.inc('radar_suppressed_errors_total', where='watch', error=type(e).__name__)
+
+# --- CACHE DE ROTAS PERSISTENTE (SQLITE, COMPARTILHADO ENTRE WORKERS) ---
+# TTL separado para rota encontrada, "sem rota" e erro/timeout; LRU por tamanho.
+# Na Vercel só /tmp é gravável, então o arquivo padrão fica no diretório temporário.
+ROUTE_DB = os.environ.get('RADAR_ROUTE_DB', os.path.join(tempfile.gettempdir(), 'radar_routes.sqlite3'))
+ROUTE_CACHE_MAX = 5000
+ROUTE_TTL_OK = 6 * 3600
+ROUTE_TTL_MISS = 30 * 60
+ROUTE_TTL_ERROR = 60
+
+class RouteCache:
+    def __init__(self, path=ROUTE_DB, max_size=ROUTE_CACHE_MAX):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.hits, self.misses, self.evictions, self.expired = 0, 0, 0, 0
+        self.path, self.db = path, None
+
+    def conn(self):
+        # Aberto no primeiro acesso (chamado com self.lock), não no import
+        if self.db is None:
+            try:
+                self.db = sqlite3.connect(self.path, timeout=2, check_same_thread=False, isolation_level=None)
+                self.db.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.Error:
+                self.db = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+                self.path = ":memory:"
+            self.db.execute("CREATE TABLE IF NOT EXISTS routes (call TEXT PRIMARY KEY, route TEXT NOT NULL, expires REAL NOT NULL, used REAL NOT NULL)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS routes_used ON routes (used)")
+        return self.db
+
+    def get(self, call):
+        now, row = time.time(), None
+        with self.lock:
+            try:
+                row = self.conn().execute("SELECT route, expires FROM routes WHERE call = ?", (call,)).fetchone()
+                if row and row[1] > now:
+                    self.conn().execute("UPDATE routes SET used = ? WHERE call = ?", (now, call))
+                    self.hits += 1
+                    return row[0]
+            except sqlite3.Error:
+                pass
+            if row: self.expired += 1
+            self.misses += 1
+            return None
+
+    def put(self, call, route, ttl):
+        now = time.time()
+        with self.lock:
+            try:
+                self.conn().execute("INSERT OR REPLACE INTO routes VALUES (?, ?, ?, ?)", (call, route, now + ttl, now))
+                self.conn().execute("DELETE FROM routes WHERE expires <= ?", (now,))
+                cur = self.conn().execute("DELETE FROM routes WHERE call IN (SELECT call FROM routes ORDER BY used LIMIT max(0, (SELECT COUNT(*) FROM routes) - ?))", (self.max_size,))
+                self.evictions += max(0, cur.rowcount)
+            except sqlite3.Error:
+                pass
+
+    def stats(self):
+        with self.lock:
+            try: size = self.conn().execute("SELECT COUNT(*) FROM routes").fetchone()[0]
+            except sqlite3.Error: size = None
+            return {"path": self.path, "size": size, "max_size": self.max_size, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "expired": self.expired,
+                    "ttl_s": {"ok": ROUTE_TTL_OK, "miss": ROUTE_TTL_MISS, "error": ROUTE_TTL_ERROR}}
+
+route_cache = RouteCache()
+
+class SharedWeather:
+    # Clima por célula no mesmo arquivo SQLite das rotas: um fetch por célula no host, não por worker
+    def __init__(self, path=ROUTE_DB):
+        self.path, self.db = path, None
+        self.lock = threading.Lock()
+
+    def conn(self):
+        if self.db is None:
+            self.db = sqlite3.connect(self.path, timeout=2, check_same_thread=False, isolation_level=None)
+            self.db.execute("CREATE TABLE IF NOT EXISTS weather (cell TEXT PRIMARY KEY, ts REAL NOT NULL, data TEXT NOT NULL)")
+        return self.db
+
+    def get(self, key):
+        # -> (ts, clima) ou None
+        with self.lock:
+            try: row = self.conn().execute("SELECT ts, data FROM weather WHERE cell = ?", (f"{key[0]}:{key[1]}",)).fetchone()
+            except sqlite3.Error: return None
+        return (row[0], json.loads(row[1])) if row else None
+
+    def put(self, key, ts, w):
+        with self.lock:
+            try: self.conn().execute("INSERT OR REPLACE INTO weather VALUES (?, ?, ?)", (f"{key[0]}:{key[1]}", ts, json.dumps(w)))
+            except sqlite3.Error: pass
+
+shared_weather = SharedWeather()
+
 def fetch_route(callsign):
     if not callsign or callsign in ["N/A", "UNKNOWN"]: return "--- ---"
+    call = callsign.strip().upper()
+    cached = route_cache.get(call)
+    if cached is not None: return cached
     try:
         # API mais robusta que integra dados do ADSB-Exchange
-        url = f"https://api.adsb.lol/v2/callsign/{callsign.strip().upper()}"
-        r = requests.get(url, timeout=10).json()
+        url = f"{UPSTREAM or 'https://api.adsb.lol'}/v2/callsign/{call}"
+        r = upstream_get("adsb.lol/route", url, 10)
         if r.get('aircraft') and len(r['aircraft']) > 0:
             ac = r['aircraft'][0]
             # Tenta pegar a rota; se não tiver, pelo menos limpa o callsign
             rt = ac.get('route')
-            if rt: return rt.replace('-', ' ').upper()
+            if rt:
+                route = rt.replace('-', ' ').upper()
+                route_cache.put(call, route, ROUTE_TTL_OK)
+                return route
+        route_cache.put(call, "EN ROUTE", ROUTE_TTL_MISS)
         return "EN ROUTE"
-    except:
+    except Exception as e:
+        metrics.inc('radar_suppressed_errors_total', where='route', error=type(e).__name__)
+        route_cache.put(call, "EN ROUTE", ROUTE_TTL_ERROR) # Timeout/erro: negativo curto
         return "EN ROUTE"
 
+# --- ROTAS SOB DEMANDA: SÓ PARA OS VOOS DEVOLVIDOS, COM ORÇAMENTO DE TEMPO ---
+# O que não resolver no prazo sai como placeholder; o fetch continua em background
+# e o resultado entra no cache para o próximo poll.
+ROUTE_BUDGET = 1.5
+ROUTE_PENDING = "--- ---"
+route_pool = ThreadPoolExecutor(max_workers=4)
+route_inflight = {} # callsign -> Future (evita dois fetches do mesmo callsign)
+route_lock = threading.Lock()
+
+def resolve_routes(flights, budget=ROUTE_BUDGET):
+    t0, jobs = time.perf_counter(), []
+    with route_lock:
+        for f in flights:
+            if f.get('route'): continue
+            call = f['call']
+            fut = route_inflight.get(call)
+            if fut is None:
+                fut = route_inflight[call] = route_pool.submit(fetch_route, call)
+                fut.add_done_callback(lambda _, c=call: route_inflight.pop(c, None))
+            jobs.append((f, fut))
+    if jobs: wait([fut for _, fut in jobs], timeout=budget)
+    for f, fut in jobs:
+        ready = fut.done() and not fut.exception()
+        f['route'] = fut.result() if ready else ROUTE_PENDING
+        if not ready: f['route_pending'] = True
+    if jobs: stage('routes', t0)
+    return flights
+
+# --- FILTROS DE CONSULTA: PREDICADOS NOS CAMPOS BRUTOS, ANTES DO ENRIQUECIMENTO ---
+# rare_only, min_alt/max_alt (ft), types (códigos ICAO de tipo), operators (prefixo do
+# callsign, ex. TAM,GLO) e max_dist (km, no máximo RADIUS_KM). Aeronave filtrada não
+# gera dict nem lookup de rota.
+def callsign(s):
+    return (s.get('flight') or s.get('call') or 'N/A').strip().upper()
+
+def alt_ft(s):
+    a = s.get('alt_baro', 0)
+    return 0.0 if a == "ground" else num(a)
+
+def csv_set(v):
+    return {x.strip().upper() for x in v.split(',') if x.strip()} if v else set()
+
+def alt_bounds(args):
+    # -> (min_alt, max_alt) em pés, None onde não há limite
+    return (float(args['min_alt']) if args.get('min_alt') else None, float(args['max_alt']) if args.get('max_alt') else None)
+
+def build_filter(args):
+    # -> (raio km, predicado(registro) ou None)
+    radius = min(RADIUS_KM, float(args['max_dist'])) if args.get('max_dist') else RADIUS_KM
+    checks = []
+    min_alt, max_alt = alt_bounds(args)
+    if min_alt is not None: checks.append(lambda s: alt_ft(s) >= min_alt)
+    if max_alt is not None: checks.append(lambda s: alt_ft(s) <= max_alt)
+    types = csv_set(args.get('types'))
+    if types: checks.append(lambda s: (s.get('t') or '').upper() in types)
+    operators = tuple(csv_set(args.get('operators')))
+    if operators: checks.append(lambda s: callsign(s).startswith(operators))
+    if args.get('rare_only', 'false').lower() == 'true': # Único que precisa classificar: fica por último
+        checks.append(lambda s: classify(callsign(s), (s.get('t') or '').upper(), s.get('mil'))[2])
+    if not checks: return radius, None
+    return radius, lambda s: all(c(s) for c in checks)
+
+def s_icao(s):
+    return s.get('hex', 'UNK').upper()
+
+def flight_dict(d, s, now_date, now_time):
+    # Enriquecimento de um registro bruto da fonte (rota fica para resolve_routes)
+    call = callsign(s)
+    type_code = (s.get('t') or '').upper()
+    spd_kts = int(s.get('gs', 0))
+    spd_kmh = int(spd_kts * 1.852)
+    airline, color, is_rare = classify(call, type_code, s.get('mil'))
+    return {
+        "icao": s_icao(s),
+        "reg": s.get('r', 'N/A').upper(),
+        "call": call if call else "N/A",
+        "airline": airline,
+        "color": color,
+        "is_rare": is_rare,
+        "dist": round(d, 1),
+        "alt": int(s.get('alt_baro', 0) if s.get('alt_baro') != "ground" else 0),
+        "spd": spd_kmh,
+        "kts": spd_kts,
+        "hd": int(s.get('track', 0)),
+        "lat": s['lat'],
+        "lon": s['lon'],
+        "date": now_date,
+        "time": now_time,
+        "route": s.get('route'),
+        "eta": round((d / (spd_kmh or 1)) * 60),
+        "vrate": int(s.get('baro_rate', 0))
+    }
+
+def nearby_hits(lat, lon, args=None):
+    # -> ([(dist km, registro)] dentro do raio que passam nos filtros, fontes usadas)
+    radius, keep = build_filter(args or {})
+    t0 = time.perf_counter()
+    grid, feeds = aircraft_snapshot(lat, lon)
+    stage('snapshot', t0)
+    if not grid: return [], feeds
+    t0 = time.perf_counter()
+    hits = grid.query(lat, lon, radius)
+    hits = [h for h in hits if keep(h[1])] if keep else hits
+    stage('filter', t0)
+    return hits, feeds
+
+def nearby_target(lat, lon, args=None, current_icao=None):
+    # -> ((dist km, registro) do alvo ou None, fontes usadas); só o escolhido vira dict
+    args = args or {}
+    radius, keep = build_filter(args)
+    t0 = time.perf_counter()
+    grid, feeds = aircraft_snapshot(lat, lon)
+    stage('snapshot', t0)
+    if not grid: return None, feeds
+    t0 = time.perf_counter()
+    hit = grid.target(lat, lon, radius, keep, current_icao, alt_bounds(args))
+    stage('filter', t0)
+    return hit, feeds
+
+def select_target(hits, current_icao=None):
+    # Mais próximo; o alvo atual só perde para outro pelo menos 5 km mais perto (histerese)
+    best = min(hits, key=lambda h: round(h[0], 1))
+    if current_icao:
+        current_on_radar = next((h for h in hits if s_icao(h[1]) == current_icao), None)
+        if current_on_radar:
+            return best if round(best[0], 1) < (round(current_on_radar[0], 1) - 5) else current_on_radar
+    return best
+
+def radar_state(lat, lon, current_icao=None, test=False, args=None):
+    # Payload do /api/radar; também usado pelo stream SSE
+    local_now = get_time_local()
+    now_date = local_now.strftime("%d %b %Y").upper()
+    now_time = local_now.strftime("%H.%M")
+    wf = weather_future(lat, lon) # Em paralelo com o tráfego
+    
+    if test:
+        test_pool = [
+            {"icao": "ABC123", "reg": "61-7972", "call": "BLACKBIRD", "airline": "SR-71 RARE", "color": "#000", "is_rare": True, "dist": 15.2, "alt": 80000, "spd": 3200, "hd": 350, "route": "BEALE-EDW"},
+            {"icao": "E48C12", "reg": "PR-XTA", "call": "TAM3452", "airline": "LATAM BRASIL", "color": "#E6004C", "is_rare": False, "dist": 42.5, "alt": 35000, "spd": 840, "hd": 220, "route": "GRU GIG"},
+            {"icao": "A1B2C3", "reg": "PR-GXP", "call": "GLO1234", "airline": "GOL AIRLINES", "color": "#FF6700", "is_rare": False, "dist": 12.8, "alt": 28000, "spd": 790, "hd": 45, "route": "CGH BSB"},
+            {"icao": "D5F6G7", "reg": "PR-YRS", "call": "AZU4021", "airline": "AZUL LINHAS", "color": "#004590", "is_rare": False, "dist": 68.1, "alt": 32000, "spd": 810, "hd": 180, "route": "VCP CNF"},
+            {"icao": "896321", "reg": "A6-EEO", "call": "UAE262", "airline": "EMIRATES", "color": "#FF0000", "is_rare": False, "dist": 150.4, "alt": 38000, "spd": 910, "hd": 95, "route": "DXB GRU"},
+            {"icao": "3B4C5D", "reg": "F-GSQH", "call": "AFR454", "airline": "AIR FRANCE", "color": "#002395", "is_rare": False, "dist": 89.9, "alt": 36000, "spd": 880, "hd": 310, "route": "CDG GIG"}
+        ]
+        f = random.choice(test_pool) # Escolha aleatória a cada requisição
+        f.update({"date": now_date, "time": now_time, "lat": lat + random.uniform(-0.1, 0.1), "lon": lon + random.uniform(-0.1, 0.1)})
+        return {"flight": f, "weather": weather_result(wf), "date": now_date, "time": now_time}
+    
+    hit, feeds = nearby_target(lat, lon, args, current_icao)
+    found, next_poll = None, NEXT_POLL_DEFAULT
+    if hit:
+        # Seleção sem ordenar tudo: só o alvo vira dict
+        t0 = time.perf_counter()
+        found = flight_dict(*hit, now_date, now_time)
+        stage('classify', t0)
+        # Relativo à hora do fix, não a agora: o payload só muda com dado novo (ETag/304 seguem valendo)
+        found['motion'], next_poll = motion_model(tracks.history(found['icao']), lat, lon)
+        found = resolve_routes([found])[0]
+
+    return {"flight": found, "weather": weather_result(wf), "date": now_date, "time": now_time, "feeds": feeds, "next_poll_s": next_poll}
+
+# --- VERSÃO DO ESTADO: ETAG/304 E MODO DELTA (?since=<versão>) ---
+# A versão é o hash do payload; o processo guarda as últimas VERSION_HISTORY versões
+# para calcular deltas. Versão desconhecida (expirou ou outro worker) = payload completo.
+VERSION_HISTORY = 1024
+versions = OrderedDict() # versão -> payload
+versions_lock = threading.Lock()
+
+def state_version(payload):
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()).hexdigest()[:16]
+
+def json_diff(old, new):
+    # Campos alterados de new em relação a old; dicts viram sub-deltas, chave removida vira None
+    out = {k: None for k in old if k not in new}
+    for k, v in new.items():
+        o = old.get(k)
+        if isinstance(v, dict) and isinstance(o, dict):
+            sub = json_diff(o, v)
+            if sub: out[k] = sub
+        elif k not in old or o != v:
+            out[k] = v
+    return out
+
+# --- CODIFICAÇÃO COMPACTA + COMPRESSÃO ---
+# Respostas com lista "flights" podem sair em colunas (?format=columnar ou Accept
+# application/vnd.radar.columnar+json): nomes de campo uma vez só, airline/color
+# numa tabela de dicionário e date/time compartilhados. ?format=msgpack (ou Accept
+# application/msgpack) manda o mesmo objeto em MessagePack. Corpo >= COMPRESS_MIN
+# sai em br/gzip conforme Accept-Encoding.
+COMPRESS_MIN = 1024
+JSON_MIME = 'application/json'
+COLUMNAR_MIME = 'application/vnd.radar.columnar+json'
+MSGPACK_MIME = 'application/msgpack'
+FLIGHT_COLUMNS = ("icao", "reg", "call", "is_rare", "dist", "alt", "spd", "kts", "hd", "lat", "lon", "route", "eta", "vrate")
+
+def columnar(payload):
+    flights = payload.get('flights') or []
+    operators, op_index = [], {}
+    cols = {c: [f.get(c) for f in flights] for c in FLIGHT_COLUMNS}
+    cols['is_rare'] = [1 if r else 0 for r in cols['is_rare']]
+    cols['op'] = []
+    for f in flights:
+        op = (f['airline'], f['color'])
+        if op not in op_index:
+            op_index[op] = len(operators)
+            operators.append(list(op))
+        cols['op'].append(op_index[op])
+    out = {k: v for k, v in payload.items() if k != 'flights'}
+    out.update({"format": "columnar", "operators": operators, "columns": cols,
+                "route_pending": [i for i, f in enumerate(flights) if f.get('route_pending')]})
+    return out
+
+def negotiate_format(payload):
+    if 'flights' not in payload: return 'json'
+    fmt = request.args.get('format')
+    if fmt not in ('json', 'columnar', 'msgpack'):
+        best = request.accept_mimetypes.best_match([JSON_MIME, COLUMNAR_MIME, MSGPACK_MIME], default=JSON_MIME)
+        fmt = {COLUMNAR_MIME: 'columnar', MSGPACK_MIME: 'msgpack'}.get(best, 'json')
+    if fmt == 'msgpack' and msgpack is None: fmt = 'columnar' # Sem msgpack instalado: colunas em JSON
+    return fmt
+
+def negotiate_encoding():
+    if brotli is not None and request.accept_encodings['br']: return 'br'
+    if request.accept_encodings['gzip']: return 'gzip'
+    return None
+
+def encode_body(body, fmt):
+    # -> (bytes, mimetype)
+    if fmt == 'msgpack': return msgpack.packb(columnar(body)), MSGPACK_MIME
+    if fmt == 'columnar': return json.dumps(columnar(body), separators=(',', ':')).encode(), COLUMNAR_MIME
+    return app.json.dumps(body).encode(), JSON_MIME
+
+def compress(data, encoding):
+    if encoding is None or len(data) < COMPRESS_MIN: return data, None
+    if encoding == 'br': return brotli.compress(data, quality=5), 'br'
+    return gzip.compress(data, 5), 'gzip'
+
+def versioned_response(payload):
+    version = state_version(payload)
+    fmt, encoding = negotiate_format(payload), negotiate_encoding()
+    etag = version + (f"-{fmt}" if fmt != 'json' else '') + (f"-{encoding}" if encoding else '') # Uma ETag por representação
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        t0 = time.perf_counter()
+        since = request.args.get('since') if fmt == 'json' else None
+        with versions_lock: base = versions.get(since) if since else None
+        if base is not None: body = {"version": version, "base": since, "delta": json_diff(base, payload)}
+        else: body = dict(payload, version=version)
+        data, mimetype = encode_body(body, fmt)
+        data, applied = compress(data, encoding)
+        resp = Response(data, mimetype=mimetype)
+        if applied: resp.headers['Content-Encoding'] = applied
+        stage('serialize', t0)
+    with versions_lock:
+        versions[version] = payload
+        versions.move_to_end(version)
+        while len(versions) > VERSION_HISTORY: versions.popitem(last=False)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['Vary'] = 'Accept, Accept-Encoding'
+    return resp
+
 @app.route('/api/radar')
 def radar():
     try:
@@ -89,329 +2061,347 @@ def radar():
         lon = float(request.args.get('lon', DEFAULT_LON))
         current_icao = request.args.get('current_icao', None)
         test = request.args.get('test', 'false').lower() == 'true'
-        local_now = get_time_local()
-        now_date = local_now.strftime("%d %b %Y").upper()
-        now_time = local_now.strftime("%H.%M")
-        w = get_weather(lat, lon)
-        
-        if test:
-            test_pool = [
-                {"icao": "ABC123", "reg": "61-7972", "call": "BLACKBIRD", "airline": "SR-71 RARE", "color": "#000", "is_rare": True, "dist": 15.2, "alt": 80000, "spd": 3200, "hd": 350, "route": "BEALE-EDW"},
-                {"icao": "E48C12", "reg": "PR-XTA", "call": "TAM3452", "airline": "LATAM BRASIL", "color": "#E6004C", "is_rare": False, "dist": 42.5, "alt": 35000, "spd": 840, "hd": 220, "route": "GRU GIG"},
-                {"icao": "A1B2C3", "reg": "PR-GXP", "call": "GLO1234", "airline": "GOL AIRLINES", "color": "#FF6700", "is_rare": False, "dist": 12.8, "alt": 28000, "spd": 790, "hd": 45, "route": "CGH BSB"},
-                {"icao": "D5F6G7", "reg": "PR-YRS", "call": "AZU4021", "airline": "AZUL LINHAS", "color": "#004590", "is_rare": False, "dist": 68.1, "alt": 32000, "spd": 810, "hd": 180, "route": "VCP CNF"},
-                {"icao": "896321", "reg": "A6-EEO", "call": "UAE262", "airline": "EMIRATES", "color": "#FF0000", "is_rare": False, "dist": 150.4, "alt": 38000, "spd": 910, "hd": 95, "route": "DXB GRU"},
-                {"icao": "3B4C5D", "reg": "F-GSQH", "call": "AFR454", "airline": "AIR FRANCE", "color": "#002395", "is_rare": False, "dist": 89.9, "alt": 36000, "spd": 880, "hd": 310, "route": "CDG GIG"}
-            ]
-            f = random.choice(test_pool) # Escolha aleatória a cada requisição
-            f.update({"date": now_date, "time": now_time, "lat": lat + random.uniform(-0.1, 0.1), "lon": lon + random.uniform(-0.1, 0.1)})
-            return jsonify({"flight": f, "weather": w, "date": now_date, "time": now_time})
-        
-        data = fetch_aircrafts(lat, lon)
-        found = None
-        if data:
-            proc = []
-            for s in data:
-                slat, slon = s.get('lat'), s.get('lon')
-                if slat and slon:
-                    d = 6371 * 2 * math.asin(math.sqrt(math.sin(math.radians(slat-lat)/2)**2 + math.cos(math.radians(lat)) * math.cos(math.radians(slat)) * math.sin(math.radians(slon-lon)/2)**2))
-                    if d <= RADIUS_KM:
-                        call = (s.get('flight') or s.get('call') or 'N/A').strip().upper()
-                        type_code = (s.get('t') or '').upper()
-                        spd_kts = int(s.get('gs', 0))
-                        spd_kmh = int(spd_kts * 1.852)
-                        r_info = s.get('route') or fetch_route(call)
-                        eta = "--:--"
-                        airline, color, is_rare = "PRIVATE", "#444", False
-                        
-                        if s.get('mil') or type_code in MIL_RARE:
-                            airline, color, is_rare = "MILITARY", "#000", True
-                        elif call.startswith(("TAM", "JJ", "LA")): airline, color = "LATAM BRASIL", "#E6004C"
-                        elif call.startswith(("GLO", "G3")): airline, color = "GOL AIRLINES", "#FF6700"
-                        elif call.startswith(("AZU", "AD")): airline, color = "AZUL LINHAS", "#004590"
-                        elif call.startswith(("PTB", "2Z")): airline, color = "VOEPASS", "#F9A825"
-                        elif call.startswith("SID"): airline, color = "SIDERAL CARGO", "#FF0000"
-                        elif call.startswith("MWM"): airline, color = "MODERN LOG", "#202020"
-                        elif call.startswith("OWT"): airline, color = "TOTAL CARGO", "#005544"
-                        elif call.startswith("ABV"): airline, color = "ABAETE AVIAÇÃO", "#003366"
-                        elif call.startswith("ASL"): airline, color = "AEROSUL", "#00BFFF"
-                        elif call.startswith("SUL"): airline, color = "ASTA LINHAS", "#ED1C24"
-                        elif call.startswith("TTL"): airline, color = "TOTAL LINHAS", "#005544"
-                        elif call.startswith("PAM"): airline, color = "MAP LINHAS", "#0072CE"
-                        elif call.startswith("VXP"): airline, color = "AVION EXPRESS", "#701630"
-                        elif call.startswith("OMI"): airline, color = "OMNI TÁXI AÉREO", "#003366"
-                        elif call.startswith("DPF"): airline, color, is_rare = "POLÍCIA FEDERAL", "#000", True
-                        elif call.startswith("BRS"): airline, color, is_rare = "FAB MILITARY", "#003366", True
-                        elif call.startswith("RYR"): airline, color = "RYANAIR", "#003399"
-                        elif call.startswith("EZY"): airline, color = "EASYJET", "#FF6600"
-                        elif call.startswith("SWA"): airline, color = "SOUTHWEST AIR", "#FFBF00"
-                        elif call.startswith(("EJA", "NJE")): airline, color, is_rare = "NETJETS", "#000", True
-                        elif "MLBR" in call or "MELI" in call: airline, color, is_rare = "MERCADO LIVRE", "#FFE600", True
-                        elif call.startswith("GTI"): airline, color = "ATLAS AIR", "#003366"
-                        elif call.startswith("CLX"): airline, color = "CARGOLUX", "#ED1C24"
-                        elif call.startswith("ACA"): airline, color = "AIR CANADA", "#FF0000"
-                        elif call.startswith("QTR"): airline, color = "QATAR AIRWAYS", "#8A1538" # Grená Corrigido
-                        elif call.startswith(("SIA", "SQ")): airline, color = "SINGAPORE AIR", "#FFB200"
-                        elif call.startswith("CPA"): airline, color = "CATHAY PACIFIC", "#00656B"
-                        elif call.startswith("UAE"): airline, color = "EMIRATES", "#FF0000"
-                        elif call.startswith("ANA"): airline, color = "ANA NIPPON", "#003192"
-                        elif call.startswith("THY"): airline, color = "TURKISH AIR", "#C8102E"
-                        elif call.startswith("KAL"): airline, color = "KOREAN AIR", "#003399"
-                        elif call.startswith("AFR"): airline, color = "AIR FRANCE", "#002395"
-                        elif call.startswith("AAL"): airline, color = "AMERICAN AIR", "#12316E"
-                        elif call.startswith("DAL"): airline, color = "DELTA LINES", "#E01933"
-                        elif call.startswith("UAL"): airline, color = "UNITED AIR", "#1B3E93"
-                        elif call.startswith("CSN"): airline, color = "CHINA SOUTHERN", "#007AC1"
-                        elif call.startswith(("CMP", "RPB", "VCP")): airline, color = "COPA AIRLINES", "#003366"
-                        elif call.startswith("BAW"): airline, color = "BRITISH AIR", "#002366"
-                        elif call.startswith("IBE"): airline, color = "IBERIA", "#D7192D"
-                        elif call.startswith("KLM"): airline, color = "KLM ROYAL", "#00A1DE"
-                        elif call.startswith(("ARG", "AR", "GNA")): airline, color = "AEROLINEAS ARG", "#00AEEF"
-                        elif call.startswith("TAP"): airline, color = "TAP PORTUGAL", "#2F8E44"
-                        elif call.startswith("FDX"): airline, color = "FEDEX", "#4D148C"
-                        elif call.startswith("UPS"): airline, color = "UPS CARGO", "#351C15"
-                        elif call.startswith("VJT"): airline, color, is_rare = "VISTAJET", "#C0C0C0", True
-                        elif call.startswith("LXJ"): airline, color, is_rare = "FLEXJET", "#A52A2A", True
-                        elif call.startswith("BCS"): airline, color = "DHL CARGO", "#D40511"
-                        elif call.startswith(("ETH", "ET")): airline, color = "ETHIOPIAN AIR", "#006738"
-                        elif call.startswith(("MSR", "MS")): airline, color = "EGYPTAIR", "#002855"
-                        elif call.startswith(("SAA", "SA")): airline, color = "SOUTH AFRICAN", "#F9BE00"
-                        elif call.startswith(("RAM", "AT")): airline, color = "ROYAL AIR MAROC", "#C2102E"
-                        elif call.startswith(("KQA", "KQ")): airline, color = "KENYA AIRWAYS", "#C1121F"
-                        elif call.startswith(("DLA", "AH")): airline, color = "AIR ALGERIE", "#D21034"
-                        elif call.startswith(("LAA", "LN")): airline, color = "LIBYAN AIRLINES", "#000000"
-                        elif call.startswith(("TUI", "BY")): airline, color = "TUI AIRWAYS", "#2AD2FF"
-                        elif call.startswith(("ETD", "EY")): airline, color = "ETIHAD AIRWAYS", "#AD944D"
-                        elif call.startswith(("AXM", "AK")): airline, color = "AIRASIA", "#ED1C24"
-                        elif call.startswith(("JSA", "3K")): airline, color = "JETSTAR AIR", "#FF5000"
-                        elif call.startswith(("FDB", "FZ")): airline, color = "FLYDUBAI", "#003264"
-                        elif call.startswith(("RYN", "RD")): airline, color = "ROYAL JORDANIAN", "#8B0D1E"
-                        elif call.startswith(("AIC", "AI")): airline, color = "AIR INDIA", "#ED1C24"
-                        elif call.startswith(("IGO", "6E")): airline, color = "INDIGO", "#0055A4"
-                        elif call.startswith(("EVA", "BR")): airline, color = "EVA AIR", "#006233"
-                        elif call.startswith(("CAL", "CI")): airline, color = "CHINA AIRLINES", "#532E91"
-                        elif call.startswith(("CES", "MU")): airline, color = "CHINA EASTERN", "#013B82"
-                        elif call.startswith(("CHH", "HU")): airline, color = "HAINAN AIR", "#FFD700"
-                        elif call.startswith(("GIA", "GA")): airline, color = "GARUDA INDONESIA", "#004C64"
-                        elif call.startswith(("MAS", "MH")): airline, color = "MALAYSIA AIR", "#002244"
-                        elif call.startswith(("THA", "TG")): airline, color = "THAI AIRWAYS", "#4A2483"
-                        elif call.startswith(("HVN", "VN")): airline, color = "VIETNAM AIRLINES", "#006782"
-                        elif call.startswith(("PAL", "PR")): airline, color = "PHILIPPINE AIR", "#013281"
-                        elif call.startswith(("EVA", "BR")): airline, color = "EVA AIR", "#006233"
-                        elif call.startswith(("SIA", "SQ")): airline, color = "SINGAPORE AIR", "#FFB200"
-                        elif call.startswith(("CCA", "CA")): airline, color = "AIR CHINA", "#E30613"
-                        elif call.startswith(("VJC", "VJ")): airline, color = "VIETJET AIR", "#F9A825"
-                        elif call.startswith(("ITY", "AZ")): airline, color = "ITA AIRWAYS", "#004B96"
-                        elif call.startswith(("LOT", "LO")): airline, color = "LOT POLISH", "#003366"
-                        elif call.startswith(("FIN", "AY")): airline, color = "FINNAIR", "#00005C"
-                        elif call.startswith(("NAX", "DY")): airline, color = "NORWEGIAN AIR", "#D92121"
-                        elif call.startswith(("BEL", "SN")): airline, color = "BRUSSELS AIR", "#003399"
-                        elif call.startswith(("SWR", "LX", "EDW")): airline, color = "SWISS / EDELWEISS", "#E30613"
-                        elif call.startswith(("AUA", "OS")): airline, color = "AUSTRIAN AIR", "#E30613"
-                        elif call.startswith(("WZZ", "W6")): airline, color = "WIZZ AIR", "#D0006F"
-                        elif call.startswith(("PGT", "PC")): airline, color = "PEGASUS AIR", "#FFD700"
-                        elif call.startswith(("AEE", "A3")): airline, color = "AEGEAN AIR", "#002E62"
-                        elif call.startswith(("ICE", "FI")): airline, color = "ICELANDAIR", "#00205B"
-                        elif call.startswith(("TRA", "HV")): airline, color = "TRANSAVIA", "#00D66C"
-                        elif call.startswith(("AEA", "UX")): airline, color = "AIR EUROPA", "#0066FF"
-                        elif call.startswith(("VLG", "VY")): airline, color = "VUELING", "#FFD700"
-                        elif call.startswith(("JBU", "B6")): airline, color = "JETBLUE", "#00205B"
-                        elif call.startswith(("NKS", "NK")): airline, color = "SPIRIT AIR", "#FFEC00"
-                        elif call.startswith(("FFT", "F9")): airline, color = "FRONTIER AIR", "#006644"
-                        elif call.startswith(("ASA", "AS")): airline, color = "ALASKA AIR", "#00426A"
-                        elif call.startswith(("HAL", "HA")): airline, color = "HAWAIIAN AIR", "#93268F"
-                        elif call.startswith(("AAY", "G4")): airline, color = "ALLEGIANT AIR", "#FBBA00"
-                        elif call.startswith(("AMX", "AM")): airline, color = "AEROMEXICO", "#00235D"
-                        elif call.startswith(("VOI", "Y4")): airline, color = "VOLARIS", "#000000"
-                        elif call.startswith(("VIV", "VB")): airline, color = "VIVA AEROBUS", "#00A650"
-                        elif call.startswith(("WJA", "WS")): airline, color = "WESTJET", "#003A5D"
-                        elif call.startswith(("RPA", "YX")): airline, color = "REPUBLIC AIR", "#1D3263"
-                        elif call.startswith(("SKW", "OO")): airline, color = "SKYWEST AIR", "#003366"
-                        elif call.startswith(("PDT", "PT")): airline, color = "PIEDMONT AIR", "#C41230"
-                        elif call.startswith(("ENY", "MQ")): airline, color = "ENVOY AIR", "#AD1124"
-                        elif call.startswith(("QFA", "QF")): airline, color = "QANTAS", "#E3001B"
-                        elif call.startswith(("ANZ", "NZ")): airline, color = "AIR NEW ZEALAND", "#000000"
-                        elif call.startswith(("VOZ", "VA")): airline, color = "VIRGIN AUSTRALIA", "#E21737"
-                        elif call.startswith(("JST", "JQ")): airline, color = "JETSTAR", "#FF5100"
-                        elif call.startswith(("PAC", "PO")): airline, color = "POLAR CARGO", "#003366"
-                        elif call.startswith(("CKS", "K4")): airline, color = "KALITTA AIR", "#ED1C24"
-                        elif call.startswith(("AZG", "ZP")): airline, color = "SILK WAY WEST", "#001D41"
-                        elif call.startswith(("TAY", "3V")): airline, color = "ASL BELGIUM", "#FF6600"
-                        elif call.startswith(("VDA", "VI")): airline, color, is_rare = "VOLGA-DNEPR", "#003399", True
-                        elif call.startswith("XRO"): airline, color, is_rare = "JET FLYER", "#000", True
-                        elif call.startswith("VMP"): airline, color, is_rare = "VAMP AIR", "#333", True
-                        elif call.startswith("AXY"): airline, color, is_rare = "AIRX CHARTER", "#000", True
-                        elif call.startswith("FYG"): airline, color, is_rare = "FLYING SERVICE", "#555", True
-                        elif call.startswith(("JAT", "LBT", "JA" "JSS", "JWC", "JES")): airline, color = "JetSMART", "#D20019" # Fix JetSMART
-                        elif call.startswith(("LPE", "LP")): airline, color = "LATAM PERU", "#E6004C"
-                        elif call.startswith(("LNE", "XL")): airline, color = "LATAM ECUADOR", "#E6004C"
-                        elif call.startswith(("LNC", "4C")): airline, color = "LATAM COLOMBIA", "#E6004C"
-                        elif call.startswith(("LAN", "LA")): airline, color = "LATAM CHILE", "#E6004C"
-                        elif call.startswith(("BOV", "OB")): airline, color = "BOLIVIANA AVIACION", "#003399"
-                        elif call.startswith(("CUB", "CU")): airline, color = "CUBANA DE AVIACION", "#003399"
-                        elif call.startswith(("BWY", "BW")): airline, color = "CARIBBEAN AIRLINES", "#00AEEF"
-                        elif call.startswith(("GIA", "GA")): airline, color = "GARUDA INDONESIA", "#004C64"
-                        elif call.startswith(("AVA", "AV", "TAI", "LRC", "TPA", "GLP")): airline, color = "AVIANCA GROUP", "#E01F26"
-                        elif call.startswith(("GLG", "G3")): airline, color = "GOL (INTL)", "#FF6700"
-                        elif call.startswith("CMX"): airline, color = "AEROMEXICO CONNECT", "#00235D"
-                        elif call.startswith(("ELY", "LY")): airline, color = "EL AL ISRAEL", "#00205B"
-                        elif call.startswith(("SVA", "SV")): airline, color = "SAUDIA AIR", "#133E3C"
-                        elif call.startswith(("KAC", "KU")): airline, color = "KUWAIT AIRWAYS", "#004B91"
-                        elif call.startswith(("KZR", "KC")): airline, color = "AIR ASTANA", "#988252"
-                        elif call.startswith(("CFG", "DE")): airline, color = "CONDOR", "#FBC400"
-                        elif call.startswith("VRE"): airline, color, is_rare = "VOLARE AIR", "#000", True
-                        elif call.startswith("GES"): airline, color, is_rare = "GESTAIR", "#222", True
-                        elif call.startswith("LAV"): airline, color, is_rare = "ALBASTAR", "#E21E26"
-                        elif call.startswith("SWT"): airline, color = "SWIFTAIR", "#004A99"
-                        elif call.startswith("PWP"): airline, color = "PARANAIR", "#003366"
-                        elif call.startswith(("WHL", "FBZ")): airline, color = "FLYBONDI", "#FFD700"
-                        elif call.startswith("LDR"): airline, color, is_rare = "LIDER AVIAÇÃO", "#000", True
-                        elif call.startswith("NCR"): airline, color = "NATIONAL AIR", "#003366"
-                        elif call.startswith("VIR"): airline, color = "VIRGIN ATLANTIC", "#C8102E"
-                        elif call.startswith("AFL"): airline, color = "AEROFLOT", "#003399"
-                        elif call.startswith("VUK"): airline, color = "VOLOTEA", "#FF4F00"
-                        elif call.startswith("EXS"): airline, color = "JET2", "#ED1C24"
-                        elif call.startswith("RZO"): airline, color = "SATA AZORES", "#004B91"
-                        elif call.startswith("KRE"): airline, color, is_rare = "AEROSUCRE", "#FFD700", True
-                        elif call.startswith("OAE"): airline, color, is_rare = "OMNI AIR INTL", "#1D2951", True
-                        elif call.startswith("ICV"): airline, color = "CARGOLUX ITALIA", "#ED1C24"
-                        elif call.startswith("SBI"): airline, color = "S7 AIRLINES", "#C4D600" # Verde Limão
-                        elif call.startswith("BOS"): airline, color = "OPEN SKIES", "#003366"
-                        elif call.startswith("RPB"): airline, color = "COPA COLOMBIA", "#003366"
-                        elif call.startswith("PUE"): airline, color = "PLUS ULTRA", "#D7192D"
-                        elif call.startswith("VCV"): airline, color, is_rare = "CONVIASA", "#003366", True
-                        elif call.startswith("WTI"): airline, color = "WORLD TICKET", "#555"
-                        elif call.startswith(("SKU", "H2")): airline, color = "SKY AIRLINE", "#FF00FF"
-                        elif call.startswith("SAS"): airline, color = "SCANDINAVIAN", "#003399"
-                        elif call.startswith("MXY"): airline, color = "BREEZE AIRWAYS", "#00A3E0"
-                        elif call.startswith(("DLH", "GEC")): airline, color = "LUFTHANSA CARGO", "#FFD700"
-                        elif call.startswith("AAY"): airline, color = "ALLEGIANT AIR", "#FBBA00"
-                        elif call.startswith("BOX"): airline, color = "AEROLOGIC", "#FFD700"
-                        elif call.startswith("PDT"): airline, color = "PIEDMONT AIR", "#C41230"
-                        elif call.startswith("SVW"): airline, color, is_rare = "GLOBAL JET", "#000", True
-                        elif call.startswith("NJE"): airline, color, is_rare = "NETJETS EUROPE", "#333"
-                        elif call.startswith("SHH"): airline, color = "SKY HIGH", "#E21737"
-                        elif call.startswith("EDW"): airline, color = "EDELWEISS AIR", "#ED1C24"
-                        elif call.startswith("ACN"): airline, color = "AZUL CONECTA", "#004590"
-                        elif call.startswith("TNO"): airline, color = "AEROUNION", "#003366"
-                        elif call.startswith("LAE"): airline, color = "LATAM CARGO", "#E6004C"
-                        elif call.startswith("MPH"): airline, color = "MARTINAIR CARGO", "#FF4F00"
-                        elif call.startswith("CKS"): airline, color = "KALITTA AIR", "#ED1C24"
-                        elif call.startswith("LCO"): airline, color = "LAN CARGO", "#E6004C"
-                        elif call.startswith("CAO"): airline, color = "AIR CHINA CARGO", "#E30613"
-                        elif call.startswith("MSX"): airline, color = "EGYPTAIR CARGO", "#002855"
-                        elif call.startswith("KWC"): airline, color = "KOREAN AIR CARGO", "#003399"
-                        elif call.startswith("TNO"): airline, color = "AEROUNION", "#003366"
-                        elif call.startswith("MPH"): airline, color = "MARTINAIR CARGO", "#FF4F00"
-                        elif call.startswith(("JAL", "JL")): airline, color = "JAPAN AIRLINES", "#D90011"
-                        elif call.startswith(("VIV", "VA")): airline, color = "VIVA AEROBUS", "#00A650"
-                        elif call.startswith(("LID", "LD")): airline, color = "LINEA TURISTICA", "#003366"
-                        elif call.startswith("THK"): airline, color = "TURKISH CARGO", "#C8102E"
-                        elif call.startswith("ETD"): airline, color = "ETIHAD AIRWAYS", "#AD944D"
-                        elif call.startswith("FJI"): airline, color = "FIJI AIRWAYS", "#000000"
-                        elif call.startswith("MAU"): airline, color = "AIR MAURITIUS", "#EA1C2D"
-                        elif call.startswith("RBA"): airline, color = "ROYAL BRUNEI", "#F9DD16"
-                        elif call.startswith("OMA"): airline, color = "OMAN AIR", "#004B8D"
-                        elif call.startswith("LUA"): airline, color, is_rare = "LUXEMBOURG GOV", "#00A1DE", True
-                        elif call.startswith("CTM"): airline, color, is_rare = "REPUBLIQUE FRANÇAISE", "#002395", True
-                        elif call.startswith("GAF"): airline, color, is_rare = "GERMAN AIR FORCE", "#000", True
-                        elif call.startswith("TIE"): airline, color, is_rare = "TIME TO FLY", "#000", True
-                        elif call.startswith("FYL"): airline, color, is_rare = "FLYING GROUP", "#8B0000", True
-                        elif call.startswith("AXY"): airline, color, is_rare = "AIRX CHARTER", "#000", True
-                        elif call.startswith("AZG"): airline, color = "SILK WAY WEST", "#001D41"
-                        elif call.startswith("VDA"): airline, color, is_rare = "VOLGA-DNEPR", "#003399", True
-                        elif call.startswith("IBB"): airline, color = "IBERIA REGIONAL", "#D7192D"
-                        elif call.startswith("LNK"): airline, color = "AIR LINK", "#003366"
-                        elif call.startswith("EST"): airline, color = "ESTAR AIR", "#000"
-                        elif call.startswith("WFL"): airline, color = "WORLD2FLY", "#00AEEF"
-                        elif call.startswith("BOV"): airline, color = "BOA BOLIVIA", "#003399"
-                        elif call.startswith("PUA"): airline, color = "PLUNA (EX)", "#00AEEF"
-                        elif call.startswith("TUS"): airline, color = "ABSA CARGO", "#E6004C"
-                        elif call.startswith("MGE"): airline, color = "GENAVIA", "#444"
-                        elif call.startswith("RCH"): airline, color, is_rare = "US AIR FORCE AMC", "#555", True
-                        elif call.startswith("ASY"): airline, color, is_rare = "ROYAL AUSTRALIAN AF", "#002366", True
-                        elif call.startswith("KRH"): airline, color, is_rare = "SAUDI ROYAL FLIGHT", "#133E3C", True
-                        elif call.startswith("LWG"): airline, color, is_rare = "LUXWING", "#000", True
-                        elif call.startswith("T7"): airline, color, is_rare = "SAN MARINO REG", "#00A1DE", True
-                        elif call.startswith("BLU"): airline, color = "AZUL CARGO", "#002855"
-                        elif call.startswith(("TTL", "OWT")): airline, color = "TOTAL LINHAS", "#005544"
-                        elif call.startswith("RSV"): airline, color = "RICO TÁXI AÉREO", "#003366"
-                        elif call.startswith("VUR"): airline, color = "VOE ARUANÃ", "#00AEEF"
-                        elif call.startswith("AIB"): airline, color, is_rare = "AIRBUS BELUGA", "#003399", True
-                        elif call.startswith("VGN"): airline, color = "VIRGIN ATLANTIC", "#C8102E"
-                        elif call.startswith("TGB"): airline, color = "TUI FLY NORDIC", "#2AD2FF"
-                        elif call.startswith("ABD"): airline, color = "AIR ATLANTA", "#003366"
-                        elif call.startswith("ASY"): airline, color, is_rare = "ROYAL AUSTRALIAN AF", "#002366", True
-                        elif call.startswith("TEST"): airline, color, is_rare = "TEST FLIGHT", "#FFFF00", True
-                        elif call.startswith("DWI"): airline, color = "ARAJET", "#4ED3E5"
-                        elif call.startswith("PWF"): airline, color = "FLY ALLWAYS", "#003366"
-                        elif call.startswith("LQD"): airline, color = "LIQUID AIR", "#202020"
-                        elif call.startswith("VCP"): airline, color = "COPA CARGO", "#003366"
-                        elif call.startswith("TPA"): airline, color = "AVIANCA CARGO", "#E01F26"
-                        elif call.startswith("GUY"): airline, color = "GUYANA AIRWAYS", "#007A33"
-                        elif call.startswith("AHU"): airline, color, is_rare = "HULK JET (EXTRA)", "#000", True
-                        elif call.startswith("SRR"): airline, color = "STAR AIR (UPS)", "#351C15"
-                        elif call.startswith("LVU"): airline, color = "LEVU AIR CARGO", "#003366"
-                        elif call.startswith("QQE"): airline, color, is_rare = "QATAR EXECUTIVE", "#8A1538", True
-                        elif call.startswith("EAV"): airline, color = "MAERSK AIR CARGO", "#00205B"
-                        elif call.startswith("FSA"): airline, color = "FLYSA AIR", "#00AEEF"
-                        elif call.startswith(("RXA", "ZL")): airline, color = "REX AIRLINES", "#F15A24" # Laranja Rex
-                        elif call.startswith("VPC"): airline, color = "CONTOUR AIRL", "#004B91"
-                        elif "SANTA" in call or "HOHOHO" in call or type_code == "SLEI": 
-                            airline, color, is_rare = "SANTA CLAUS", "#D42426", True
-                        elif call.startswith(("PT", "PR", "PP", "PS")): airline, color = f"PRIVATE ({call[:2]})", "#71797E"
-                        
-                        eta = round((d / (spd_kmh or 1)) * 60)
-                        r_info = s.get('route') or fetch_route(call.strip().upper())
-
-                        proc.append({
-                            "icao": s.get('hex', 'UNK').upper(),
-                            "reg": s.get('r', 'N/A').upper(),
-                            "call": call if call else "N/A",
-                            "airline": airline,
-                            "color": color,
-                            "is_rare": is_rare,
-                            "dist": round(d, 1),
-                            "alt": int(s.get('alt_baro', 0) if s.get('alt_baro') != "ground" else 0),
-                            "spd": spd_kmh,
-                            "kts": spd_kts,
-                            "hd": int(s.get('track', 0)),
-                            "lat": slat, 
-                            "lon": slon,
-                            "date": now_date, 
-                            "time": now_time,
-                            "route": r_info, 
-                            "eta": eta,
-                            "vrate": int(s.get('baro_rate', 0))
-                        })
-            
-            if proc:
-                proc.sort(key=lambda x: x['dist'])
-                new_closest = proc[0]
-                if current_icao:
-                    current_on_radar = next((x for x in proc if x['icao'] == current_icao), None)
-                    if current_on_radar:
-                        found = new_closest if new_closest['dist'] < (current_on_radar['dist'] - 5) else current_on_radar
-                    else: found = new_closest
-                else: found = new_closest
-
-        return jsonify({"flight": found, "weather": w, "date": now_date, "time": now_time})
+        return versioned_response(radar_state(lat, lon, current_icao, test, request.args))
     except Exception as e:
         # Retorna o erro exato para diagnóstico se algo falhar
+        metrics.inc('radar_suppressed_errors_total', where='radar', error=type(e).__name__)
         return jsonify({"flight": None, "error": str(e)})
 
-@app.route('/')
-def index():
-    return render_template_string('''
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="apple-mobile-web-app-capable" content="yes">
-    <meta name="apple-mobile-web-app-status-bar-style" content="black-translucent">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no, viewport-fit=cover">
-    <style>
-        :root { --gold: #FFD700; --bg: #0b0e11; --brand: #444; --blue-txt: #34a8c9; }
+# --- TOP-K: /api/radar/nearby?k=N (SELEÇÃO PARCIAL + PAGINAÇÃO POR CURSOR) ---
+# O cursor é a chave (distância, hex) do último item da página anterior; a próxima
+# página são os k mais próximos depois dela. Rotas só para a página devolvida.
+# O cursor leva uma assinatura curta (HMAC com RADAR_CURSOR_KEY, igual em todos os
+# workers); cursor ilegível ou adulterado = 400, nunca uma página vazia.
+NEARBY_DEFAULT_K = 20
+NEARBY_MAX_K = 100
+CURSOR_KEY = os.environ.get('RADAR_CURSOR_KEY', 'radar-cursor').encode()
+
+class BadCursor(ValueError):
+    pass
+
+def cursor_sig(raw):
+    return hmac.new(CURSOR_KEY, raw.encode(), hashlib.sha256).hexdigest()[:12]
+
+def encode_cursor(d, s):
+    raw = f"{d:.6f}|{s.get('hex', '')}"
+    return base64.urlsafe_b64encode(f"{raw}|{cursor_sig(raw)}".encode()).decode().rstrip('=')
+
+def decode_cursor(c):
+    try:
+        raw, sig = base64.urlsafe_b64decode(c + '=' * (-len(c) % 4)).decode().rsplit('|', 1)
+        d, icao = raw.split('|', 1)
+        d = float(d)
+    except ValueError as e: # binascii.Error e UnicodeDecodeError são ValueError
+        raise BadCursor("cursor inválido") from e
+    if not hmac.compare_digest(sig, cursor_sig(raw)) or not math.isfinite(d): raise BadCursor("cursor inválido")
+    return d, icao
+
+@app.route('/api/radar/nearby')
+def radar_nearby():
+    try:
+        lat = float(request.args.get('lat', DEFAULT_LAT))
+        lon = float(request.args.get('lon', DEFAULT_LON))
+        k = max(1, min(NEARBY_MAX_K, int(request.args.get('k', NEARBY_DEFAULT_K))))
+        cursor = request.args.get('cursor')
+        after = decode_cursor(cursor) if cursor else None
+        local_now = get_time_local()
+        now_date, now_time = local_now.strftime("%d %b %Y").upper(), local_now.strftime("%H.%M")
+        wf = weather_future(lat, lon)
+        hits, feeds = nearby_hits(lat, lon, request.args)
+        t0 = time.perf_counter()
+        key = lambda h: (round(h[0], 6), h[1].get('hex', ''))
+        total = len(hits)
+        if after: hits = [h for h in hits if key(h) > after]
+        page = heapq.nsmallest(k + 1, hits, key=key) # +1 só para saber se há próxima página
+        more = len(page) > k
+        page = page[:k]
+        flights = [flight_dict(d, s, now_date, now_time) for d, s in page]
+        stage('classify', t0)
+        flights = resolve_routes(flights)
+        return versioned_response({"flights": flights, "count": len(flights), "total": total,
+                                   "next_cursor": encode_cursor(*page[-1]) if more else None,
+                                   "weather": weather_result(wf), "date": now_date, "time": now_time, "feeds": feeds})
+    except BadCursor as e:
+        return jsonify({"flights": [], "error": str(e)}), 400
+    except Exception as e:
+        metrics.inc('radar_suppressed_errors_total', where='nearby', error=type(e).__name__)
+        return jsonify({"flights": [], "error": str(e)})
+
+# --- LOTE: POST /api/radar/batch PARA FROTAS DE QUIOSQUES ---
+# Corpo: {"entries": [{"lat", "lon", "current_icao", "id"?}], "filters": {...}} com os
+# mesmos filtros do /api/radar. Um snapshot por tile (ou o store da ingestão) para
+# todas as entradas que caem nele, clima uma vez por célula, dict/classificação uma
+# vez por aeronave e rotas num único resolve_routes; histerese continua por entrada.
+BATCH_MAX = 200
+batch_pool = ThreadPoolExecutor(max_workers=FEED_FANOUTS) # Separado do feed_pool, que os tiles usam por dentro
+
+def snapshot_key(lat, lon):
+    # Mesma decisão do aircraft_snapshot: entradas com a mesma chave dividem o snapshot
+    if ingestor and ingestor.serves(lat, lon): return 'store'
+    return tile_key(lat, lon)
+
+@app.route('/api/radar/batch', methods=['POST'])
+def radar_batch():
+    body = request.get_json(silent=True) or {}
+    entries = body.get('entries')
+    if not isinstance(entries, list) or not entries: return jsonify({"error": "entries vazio"}), 400
+    if len(entries) > BATCH_MAX: return jsonify({"error": f"máximo de {BATCH_MAX} entradas"}), 400
+    try:
+        points = [(float(e['lat']), float(e['lon']), e.get('current_icao') or None) for e in entries]
+        filters = {k: str(v) for k, v in (body.get('filters') or {}).items()}
+        radius, keep = build_filter(filters)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    local_now = get_time_local()
+    now_date, now_time = local_now.strftime("%d %b %Y").upper(), local_now.strftime("%H.%M")
+    wfs = {}
+    for lat, lon, _ in points:
+        if weather_key(lat, lon) not in wfs: wfs[weather_key(lat, lon)] = weather_future(lat, lon)
+
+    t0 = time.perf_counter()
+    keys = [snapshot_key(lat, lon) for lat, lon, _ in points]
+    groups = {}
+    for k, (lat, lon, _) in zip(keys, points): groups.setdefault(k, (lat, lon))
+    futs = {k: batch_pool.submit(aircraft_snapshot, lat, lon) for k, (lat, lon) in groups.items()}
+    snaps, feeds = {}, []
+    for k, f in futs.items():
+        try: snaps[k] = f.result()
+        except Exception as e:
+            metrics.inc('radar_suppressed_errors_total', where='batch', error=type(e).__name__)
+            snaps[k] = (None, [])
+        feeds.extend(x for x in snaps[k][1] if x not in feeds)
+    stage('snapshot', t0)
+
+    t0 = time.perf_counter()
+    kept, chosen = {}, [] # kept: id(registro) -> passou no filtro (círculos sobrepostos avaliam uma vez)
+    def keep_once(s):
+        if id(s) not in kept: kept[id(s)] = keep(s)
+        return kept[id(s)]
+    alt = alt_bounds(filters)
+    for k, (lat, lon, current_icao) in zip(keys, points):
+        grid = snaps[k][0]
+        chosen.append(grid.target(lat, lon, radius, keep_once if keep else None, current_icao, alt) if grid else None)
+    stage('filter', t0)
+
+    t0 = time.perf_counter()
+    enriched = {} # id(registro) -> dict classificado uma vez só
+    for hit in chosen:
+        if hit and id(hit[1]) not in enriched: enriched[id(hit[1])] = flight_dict(*hit, now_date, now_time)
+    stage('classify', t0)
+    resolve_routes(list(enriched.values()))
+    t0 = time.perf_counter()
+    wait(list(wfs.values()), timeout=WEATHER_GRACE)
+    stage('weather', t0)
+    weather = {k: weather_result(f, 0) for k, f in wfs.items()}
+
+    results = []
+    for e, (lat, lon, _), hit in zip(entries, points, chosen):
+        flight, next_poll = None, NEXT_POLL_DEFAULT
+        if hit:
+            d, s = hit
+            base = enriched[id(s)]
+            flight = dict(base, dist=round(d, 1), eta=round((d / (base['spd'] or 1)) * 60)) # Por entrada: distância e ETA
+            flight['motion'], next_poll = motion_model(tracks.history(base['icao']), lat, lon)
+        r = {"flight": flight, "weather": weather[weather_key(lat, lon)], "next_poll_s": next_poll}
+        if 'id' in e: r['id'] = e['id']
+        results.append(r)
+    return versioned_response({"results": results, "count": len(results), "date": now_date, "time": now_time, "feeds": feeds})
+
+# --- STREAM SSE: UMA ASSINATURA POR CLIENTE, EVENTO SÓ QUANDO ALGO MUDA ---
+# Muda = outro voo, rota resolvida, outra faixa de altitude/distância ou outro clima.
+# A conexão dorme em snapshot_changed e só recalcula quando a versão (serial do
+# índice + ts do clima) muda; sem aviso, confere a cada TILE_TTL (tile expira).
+# Clientes no mesmo ponto dividem o cálculo pelo stream_memo. Cada conexão segura
+# uma thread: acima de STREAM_MAX_CONN responde 503 e a página cai no polling.
+# A conexão fecha em STREAM_MAX_S (limite de duração da função); o EventSource reconecta.
+STREAM_TICK = TILE_TTL
+STREAM_ROUTE_TICK = 2 # Rota pendente resolve fora do snapshot: confere mais cedo
+STREAM_HEARTBEAT = 15
+STREAM_MAX_S = 290
+STREAM_MAX_CONN = int(os.environ.get('RADAR_STREAM_MAX', '32'))
+STREAM_MEMO_MAX = 512
+ALT_BAND_FT = 1000
+DIST_BAND_KM = 1
+stream_slots = threading.BoundedSemaphore(max(1, STREAM_MAX_CONN))
+stream_memo = OrderedDict() # (versão, ponto, alvo, filtros) -> (payload, chave, json)
+stream_memo_lock = threading.Lock()
+
+def stream_key(d):
+    f = d.get('flight')
+    fk = (f['icao'], f.get('route'), int(f['alt'] // ALT_BAND_FT), int(f['dist'] // DIST_BAND_KM)) if f else None
+    return (fk, tuple(sorted((d.get('weather') or {}).items())), d.get('error'))
+
+def weather_version(lat, lon):
+    key = weather_key(lat, lon)
+    with weather_lock:
+        hit = weather_cache.get(key)
+        fresh = hit and time.time() - hit[0] < WEATHER_TTL
+    if not fresh: weather_future(lat, lon) # Vencido: dispara o refresh; o load_weather avisa
+    return hit[0] if hit else 0
+
+def stream_version(lat, lon):
+    grid, _ = aircraft_snapshot(lat, lon) # Cache do tile/store; refetch só quando o tile vence
+    return (grid.serial if grid else 0, weather_version(lat, lon))
+
+def stream_state(version, lat, lon, icao, args):
+    key = (version, round(lat, 4), round(lon, 4), icao, tuple(sorted(args.items())))
+    with stream_memo_lock:
+        hit = stream_memo.get(key)
+    if hit: return hit
+    try: d = radar_state(lat, lon, icao, False, args)
+    except Exception as e: d = {"flight": None, "error": str(e)}
+    hit = (d, stream_key(d), json.dumps(d, separators=(',', ':')))
+    if not (d.get('flight') or {}).get('route_pending'): # Rota pendente: não congela a resposta
+        with stream_memo_lock:
+            stream_memo[key] = hit
+            while len(stream_memo) > STREAM_MEMO_MAX: stream_memo.popitem(last=False)
+    return hit
+
+@app.route('/api/radar/stream')
+def radar_stream():
+    lat = float(request.args.get('lat', DEFAULT_LAT))
+    lon = float(request.args.get('lon', DEFAULT_LON))
+    current_icao = request.args.get('current_icao') or None
+    test = request.args.get('test', 'false').lower() == 'true'
+    args = {k: v for k, v in request.args.items() if k not in ('lat', 'lon', 'current_icao', 'test')}
+    if STREAM_MAX_CONN <= 0 or not stream_slots.acquire(blocking=False):
+        return jsonify({"error": "stream indisponível, use /api/radar"}), 503
+
+    def events():
+        icao, last, version, pending = current_icao, None, None, False
+        t_end, t_sent = time.time() + STREAM_MAX_S, time.time()
+        yield "retry: 3000\n\n"
+        while time.time() < t_end:
+            if test:
+                try: d = radar_state(lat, lon, icao, True, args)
+                except Exception as e: d = {"flight": None, "error": str(e)}
+                key, data = stream_key(d), json.dumps(d, separators=(',', ':'))
+            else:
+                try: v = stream_version(lat, lon)
+                except Exception: v = None
+                if v is not None and v == version and not pending: d = None # Nada novo: nem recalcula
+                else:
+                    version = v
+                    d, key, data = stream_state(v, lat, lon, icao, args)
+                    pending = bool((d.get('flight') or {}).get('route_pending'))
+            if d is not None and key != last:
+                last, t_sent = key, time.time()
+                if d.get('flight'): icao = d['flight']['icao'] # Histerese segue o alvo atual
+                yield f"data: {data}\n\n"
+            elif time.time() - t_sent >= STREAM_HEARTBEAT:
+                t_sent = time.time()
+                yield ": ping\n\n"
+            tick = STREAM_ROUTE_TICK if pending or test else STREAM_TICK
+            with snapshot_changed: snapshot_changed.wait(min(tick, STREAM_HEARTBEAT, max(0, t_end - time.time())))
+
+    resp = Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    resp.call_on_close(stream_slots.release)
+    return resp
+
+# --- ASSINATURAS DE ALERTA ---
+@app.route('/api/watch', methods=['POST'])
+def watch_create():
+    body = request.get_json(silent=True) or {}
+    try:
+        lat, lon = float(body['lat']), float(body['lon'])
+        radius = float(body.get('radius_km', RADIUS_KM))
+        w = watches.add(lat, lon, radius, body.get('rule') or {})
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(dict(watch_info(w), stream=f"/api/watch/{w.id}/stream")), 201
+
+@app.route('/api/watch/<wid>', methods=['GET', 'DELETE'])
+def watch_detail(wid):
+    if request.method == 'DELETE':
+        return (jsonify({"deleted": wid}), 200) if watches.remove(wid) else (jsonify({"error": "not found"}), 404)
+    w = watches.get(wid)
+    if not w: return jsonify({"error": "not found"}), 404
+    return jsonify(dict(watch_info(w), events=watches.events(wid)))
+
+@app.route('/api/watch/<wid>/stream')
+def watch_stream(wid):
+    if not watches.get(wid): return jsonify({"error": "not found"}), 404
+    try: after = int(request.headers.get('Last-Event-ID') or request.args.get('after', 0))
+    except ValueError: after = 0
+    # Mesma regra do stream do radar: cada conexão segura uma thread
+    if WATCH_STREAM_MAX <= 0 or not watch_stream_slots.acquire(blocking=False):
+        return jsonify({"error": "stream indisponível, use GET /api/watch/<id>"}), 503
+
+    def events():
+        last, t_end = after, time.time() + STREAM_MAX_S
+        yield "retry: 3000\n\n"
+        while time.time() < t_end:
+            evs = watches.wait_events(wid, last, WATCH_HEARTBEAT)
+            if evs is None: return # Assinatura removida
+            for e in evs:
+                last = e['seq']
+                yield f"id: {e['seq']}\nevent: watch\ndata: {json.dumps(e, separators=(',', ':'))}\n\n"
+            if not evs: yield ": ping\n\n"
+
+    resp = Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    resp.call_on_close(watch_stream_slots.release)
+    return resp
+
+@app.route('/api/internal/feeds')
+def feeds_status():
+    with feed_health_lock:
+        hs = list(feed_health.values())
+    ingest = dict(store.status(), regions=ingestor.regions, running=ingestor.is_alive(), role=ingestor.role) if ingestor else None
+    if ingest and isinstance(ingestor, SharedIngestor): ingest['shared'] = ingestor.shared.status()
+    return jsonify({"feeds": [h.snapshot() for h in hs], "breaker": {"fails": BREAKER_FAILS, "cooldown_s": BREAKER_COOLDOWN}, "ingest": ingest,
+                    "tracks": tracks.status(), "watches": watches.status()})
+
+@app.route('/api/internal/routes')
+def routes_status():
+    return jsonify(route_cache.stats())
+
+@app.before_request
+def trace_start():
+    trace.t0, trace.spans = time.perf_counter(), []
+
+@app.after_request
+def trace_finish(resp):
+    spans = getattr(trace, 'spans', None)
+    if spans is None: return resp
+    total = (time.perf_counter() - trace.t0) * 1000
+    endpoint = request.endpoint or 'none'
+    metrics.observe('radar_request_seconds', total / 1000, endpoint=endpoint)
+    metrics.inc('radar_requests_total', endpoint=endpoint, status=resp.status_code)
+    resp.headers['Server-Timing'] = ", ".join([f"{n};dur={ms:.1f}" for n, ms in spans] + [f"total;dur={total:.1f}"])
+    return resp
+
+@app.teardown_request
+def trace_clear(exc=None):
+    trace.spans = None # O stream SSE continua na mesma thread: dali em diante só histograma
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Contadores que já existem nos objetos de saúde/cache entram lidos na hora
+    extra = []
+    with feed_health_lock:
+        hs = list(feed_health.values())
+    for h in hs:
+        snap = h.snapshot()
+        for k in ('ok', 'errors', 'skipped'):
+            extra.append(("radar_feed_calls_total", 'counter', (('feed', h.name), ('result', k)), snap[k]))
+        extra.append(("radar_feed_score", 'gauge', (('feed', h.name),), snap['score']))
+        extra.append(("radar_feed_breaker_open", 'gauge', (('feed', h.name),), 1 if snap['state'] == 'open' else 0))
+    rc = route_cache.stats()
+    for k in ('hits', 'misses', 'expired', 'evictions'):
+        extra.append(("radar_route_cache_total", 'counter', (('result', k),), rc[k]))
+    if rc['size'] is not None: extra.append(("radar_route_cache_size", 'gauge', (), rc['size']))
+    with tile_lock: extra.append(("radar_tile_cache_size", 'gauge', (), len(tile_cache)))
+    with weather_lock: extra.append(("radar_weather_cache_size", 'gauge', (), len(weather_cache)))
+    extra.sort(key=lambda r: r[0])
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+# --- PÁGINA: MONTADA UMA VEZ, SERVIDA DA MEMÓRIA JÁ COMPRIMIDA ---
+# CSS e JS saem como assets com hash no nome (cache imutável de 1 ano); o HTML usa
+# ETag + revalidação. Cada asset guarda as variantes crua, gzip e br (se disponível).
+ASSET_CACHE = 'public, max-age=31536000, immutable'
+PAGE_CACHE = 'no-cache'
+
+PAGE_CSS = '''        :root { --gold: #FFD700; --bg: #0b0e11; --brand: #444; --blue-txt: #34a8c9; }
         * { box-sizing: border-box; -webkit-tap-highlight-color: transparent; }
         body { background: var(--bg); font-family: -apple-system, sans-serif; display: flex; flex-direction: column; align-items: center; justify-content: center; min-height: 100dvh; margin: 0; perspective: 1500px; overflow: hidden; }
         
@@ -474,69 +2464,9 @@ def index():
             .main { width: 70% !important; } 
             .ticker { width: 550px; } 
         }
-    </style>
-</head>
-<body onclick="handleFlip(event); requestWakeLock()" style="background: #000000 !important; color: #fff; margin: 0; overflow: hidden; display: flex; flex-direction: column; align-items: center; justify-content: center; height: 100vh;">
-    <div id="ui">
-        <div class="ui-row">
-            <input type="text" id="in" placeholder="ENTER LOCATION">
-            <button onclick="startSearch(event)">CHECK-IN</button>
-        </div>
-        <button id="compass-btn" onclick="initCompass()">ENABLE LIVE TRACKING SENSORS</button>
-    </div>
-    <div class="scene" id="card">
-        <div class="face front">
-            <div class="stub" id="stb">
-                <div style="font-size:7px; font-weight:900; opacity:0.7;">RADAR SCANNING</div>
-                <div style="font-size:10px; font-weight:900; margin-top:5px;" id="airl">SEARCHING...</div>
-                <div style="font-size:65px; font-weight:900; letter-spacing:-4px; margin:2px 0;">19A</div>
-                <div class="dots-container" id="dots">
-                    <div id="d1" class="sq"></div><div id="d2" class="sq"></div><div id="d3" class="sq"></div><div id="d4" class="sq"></div><div id="d5" class="sq"></div>
-                </div>
-            </div>
-            <div class="perfor"></div>
-            <div class="main">
-                <div style="color: #333; font-weight: 900; font-size: 13px; border: 1.5px solid #333; padding: 3px 10px; border-radius: 4px; align-self: flex-start;">BOARDING PASS</div>
-                <div style="display:grid; grid-template-columns:1fr 1fr; gap:10px; margin-top:10px;">
-                    <div><span id="icao-label" style="font-size: 7px; font-weight: 900; color: #888;">AIRCRAFT ICAO</span><div id="f-icao" class="flap"></div></div>
-                    <div><span id="dist-label" style="font-size: 7px; font-weight: 900; color: #888;">DISTANCE</span><div id="f-dist" class="flap" style="color:#444"></div></div>
-                    <div><span style="font-size: 7px; font-weight: 900; color: #888;">FLIGHT IDENTIFICATION</span><div id="f-call" class="flap"></div></div>
-                    <div><span style="font-size: 7px; font-weight: 900; color: #888;">ROUTE (AT-TO)</span><div id="f-route" class="flap"></div></div>
-                </div>
-                <div style="display:flex; justify-content:space-between; align-items:flex-end;">
-                    <div id="arr" style="font-size:45px; color: #000000 !important; transition: transform 0.2s cubic-bezier(0.17, 0.67, 0.83, 0.67); filter: drop-shadow(0 1px 1px rgba(0,0,0,0.1));">✈</div>
-                    <div class="date-visual">
-                        <div id="f-line1">-- --- ----</div>
-                        <div id="f-line2">--.--</div>
-                        <img id="bc" src="https://bwipjs-api.metafloor.com/?bcid=code128&text=WAITING" onclick="openMap(event)">
-                    </div>
-                </div>
-            </div>
-        </div>
-        <div class="face back">
-            <div style="height:100%; border:1px dashed rgba(0,0,0,0.15); border-radius:15px; padding:20px; display:flex; flex-direction:column; position:relative;">
-                <div style="display:flex; justify-content:space-between;">
-                    <div><span style="font-size: 7px; font-weight: 900; color: #888;">ALTITUDE</span><div id="b-alt" class="flap"></div></div>
-                    <div><span id="spd-label" style="font-size: 7px; font-weight: 900; color: #888;">GROUND SPEED</span><div id="b-spd" class="flap"></div></div>
-                </div>
-                <div style="border: 3px double var(--blue-txt); color: var(--blue-txt); padding: 15px; border-radius: 10px; transform: rotate(-10deg); align-self: center; margin-top: 30px; text-align: center; font-weight: 900; opacity: 0.8;">
-                    <div style="font-size:8px;">SECURITY CHECKED</div>
-                    <div id="b-date-line1">-- --- ----</div>
-                    <div id="b-date-line2" style="font-size:22px;">--.--</div>
-                    <div style="font-size:8px; margin-top:5px;">RADAR CONTACT V106.2</div>
-                </div>
-                <div id="gold-seal" class="metal-seal">
-                    <span>Rare</span>
-                    <span style="font-size:10px;">Aircraft</span>
-                    <span>Found</span>
-                </div>
-            </div>
-        </div>
-    </div>
-    <div class="ticker" id="tk">WAITING...</div>
+'''
 
-    <script>
-        // --- INÍCIO WAKE LOCK (TELA SEMPRE ATIVA iOS 26) ---
+PAGE_JS = '''        // --- INÍCIO WAKE LOCK (TELA SEMPRE ATIVA iOS 26) ---
         let wakeLock = null;
         const requestWakeLock = async () => {
             try {
@@ -554,9 +2484,16 @@ def index():
 
         let pos = null, act = null, isTest = false;
         let toggleState = true, tickerMsg = [], tickerIdx = 0, audioCtx = null;
-        let lastDist = null;
+        let lastDist = null, nextPoll = 10;
         let deviceHeading = 0;
         const chars = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ.- ";
+        // Filtros do quiosque vêm da URL da página (ex: /?rare_only=true&min_alt=10000)
+        const filterQs = (() => {
+            const q = new URLSearchParams(location.search), o = new URLSearchParams();
+            ['rare_only', 'min_alt', 'max_alt', 'types', 'operators', 'max_dist'].forEach(k => { if(q.has(k)) o.set(k, q.get(k)); });
+            const qs = o.toString();
+            return qs ? '&' + qs : '';
+        })();
 
         function initCompass() {
             if (typeof DeviceOrientationEvent.requestPermission === 'function') {
@@ -678,16 +2615,73 @@ def index():
             if(!pos) return;
             try {
                 const current_icao = act ? act.icao : '';
-                const r = await fetch(`/api/radar?lat=${pos.lat}&lon=${pos.lon}&current_icao=${current_icao}&test=${isTest}&_=${Date.now()}`);
-                const d = await r.json();
-                
+                // no-cache: o navegador revalida com If-None-Match e o servidor responde 304 se nada mudou
+                const r = await fetch(`/api/radar?lat=${pos.lat}&lon=${pos.lon}&current_icao=${current_icao}&test=${isTest}${filterQs}`, {cache: 'no-cache'});
+                render(await r.json());
+            } catch(e) {}
+        }
+
+        // Sem EventSource (ou stream que não entrega): polling no ritmo sugerido pelo servidor (next_poll_s)
+        let polling = false;
+        async function poll() {
+            polling = true;
+            await update();
+            setTimeout(poll, nextPoll * 1000);
+        }
+
+        // Entre eventos/polls a posição é extrapolada pelo modelo de movimento (dead reckoning)
+        setInterval(() => {
+            if(!act || !act.motion || !pos) return;
+            const m = act.motion;
+            const t = Math.min(120, Math.max(0, Date.now() / 1000 - m.t)); // Desde o fix, limitado a 2 min
+            act.lat = m.lat + (m.vn_kmh * t / 3600) / 111.195;
+            act.lon = m.lon + (m.ve_kmh * t / 3600) / (111.195 * Math.cos(m.lat * Math.PI / 180));
+            const dy = (act.lat - pos.lat) * 111.195, dx = (act.lon - pos.lon) * 111.195 * Math.cos(pos.lat * Math.PI / 180);
+            act.dist = Math.round(Math.hypot(dx, dy) * 10) / 10;
+            act.eta = Math.round(act.dist / (act.spd || 1) * 60);
+            updatePlaneVisual();
+        }, 1000);
+
+        // SSE: o servidor só manda evento quando algo muda. Cai no polling sem EventSource,
+        // após STREAM_FAILS erros seguidos (503 = servidor lotado) ou se o primeiro evento
+        // não chega em 10 s (host que bufferiza a resposta nunca entrega nada)
+        const STREAM_FAILS = 3;
+        let stream = null, streamErrors = 0;
+        function fallbackToPoll() {
+            if(stream) { stream.close(); stream = null; }
+            if(!polling) poll();
+        }
+        function startStream() {
+            if(polling) return;
+            if(!window.EventSource) { fallbackToPoll(); return; }
+            const current_icao = act ? act.icao : '';
+            stream = new EventSource(`/api/radar/stream?lat=${pos.lat}&lon=${pos.lon}&current_icao=${current_icao}&test=${isTest}${filterQs}`);
+            const s = stream;
+            const watchdog = setTimeout(() => { if(stream === s) fallbackToPoll(); }, 10000);
+            s.onmessage = (e) => {
+                clearTimeout(watchdog);
+                streamErrors = 0;
+                try { render(JSON.parse(e.data)); } catch(err) {}
+            };
+            s.onerror = () => {
+                clearTimeout(watchdog);
+                if(stream !== s) return;
+                s.close(); stream = null;
+                if(++streamErrors >= STREAM_FAILS) fallbackToPoll();
+                else setTimeout(startStream, 3000); // Reabre com o alvo atual
+            };
+        }
+
+        function render(d) {
+            try {
                 if(d.flight) {
                     const f = d.flight;
                     const stub = document.getElementById('stb');
                     const seal = document.getElementById('gold-seal');
 
                     let trend = "MAINTAINING";
-                    if(lastDist !== null) {
+                    if(f.motion) trend = f.motion.trend; // Tendência calculada no servidor pela trajetória
+                    else if(lastDist !== null) {
                         if(f.dist < lastDist - 0.1) trend = "CLOSING IN";
                         else if(f.dist > lastDist + 0.1) trend = "MOVING AWAY";
                     }
@@ -706,7 +2700,7 @@ def index():
                     if(!act || act.icao !== f.icao) {
                         playPing();
                         document.getElementById('airl').innerText = f.airline;
-                        applyFlap('f-call', f.call); applyFlap('f-route', f.route);
+                        applyFlap('f-call', f.call);
                         document.getElementById('bc').src = `https://bwipjs-api.metafloor.com/?bcid=code128&text=${f.icao}&scale=2`;
                         
                         document.getElementById('f-line1').innerText = f.date;
@@ -720,9 +2714,11 @@ def index():
                         document.getElementById('d'+i).className = f.dist <= threshold ? 'sq on' : 'sq';
                     }
                     if(!act || act.alt !== f.alt) applyFlap('b-alt', f.alt + " FT");
+                    applyFlap('f-route', f.route); // Rota pode chegar em um poll posterior
                     
                     tickerMsg = ["CONTACT ESTABLISHED", trend, d.weather.temp + " " + d.weather.sky];
                     act = f;
+                    if(d.next_poll_s) nextPoll = d.next_poll_s;
                     updatePlaneVisual();
                 } else if (act) {
                     tickerMsg = ["SIGNAL LOST / GHOST MODE ACTIVE", "SEARCHING TRAFFIC..."];
@@ -775,10 +2771,7 @@ def index():
         function hideUI() { 
             const ui = document.getElementById('ui');
             ui.classList.add('hide'); 
-            setTimeout(() => {
-                update(); 
-                setInterval(update, 10000); 
-            }, 800);
+            setTimeout(startStream, 800);
         }
 
         // AUTO GPS INTEGRATION
@@ -793,10 +2786,132 @@ def index():
             requestWakeLock(); // <--- ACRESCENTE ESTA LINHA
         }, e => console.log("GPS OFF"));
 
-    </script>
+'''
+
+PAGE_HTML = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="apple-mobile-web-app-capable" content="yes">
+    <meta name="apple-mobile-web-app-status-bar-style" content="black-translucent">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no, viewport-fit=cover">
+    <link rel="stylesheet" href="__CSS_URL__">
+</head>
+<body onclick="handleFlip(event); requestWakeLock()" style="background: #000000 !important; color: #fff; margin: 0; overflow: hidden; display: flex; flex-direction: column; align-items: center; justify-content: center; height: 100vh;">
+    <div id="ui">
+        <div class="ui-row">
+            <input type="text" id="in" placeholder="ENTER LOCATION">
+            <button onclick="startSearch(event)">CHECK-IN</button>
+        </div>
+        <button id="compass-btn" onclick="initCompass()">ENABLE LIVE TRACKING SENSORS</button>
+    </div>
+    <div class="scene" id="card">
+        <div class="face front">
+            <div class="stub" id="stb">
+                <div style="font-size:7px; font-weight:900; opacity:0.7;">RADAR SCANNING</div>
+                <div style="font-size:10px; font-weight:900; margin-top:5px;" id="airl">SEARCHING...</div>
+                <div style="font-size:65px; font-weight:900; letter-spacing:-4px; margin:2px 0;">19A</div>
+                <div class="dots-container" id="dots">
+                    <div id="d1" class="sq"></div><div id="d2" class="sq"></div><div id="d3" class="sq"></div><div id="d4" class="sq"></div><div id="d5" class="sq"></div>
+                </div>
+            </div>
+            <div class="perfor"></div>
+            <div class="main">
+                <div style="color: #333; font-weight: 900; font-size: 13px; border: 1.5px solid #333; padding: 3px 10px; border-radius: 4px; align-self: flex-start;">BOARDING PASS</div>
+                <div style="display:grid; grid-template-columns:1fr 1fr; gap:10px; margin-top:10px;">
+                    <div><span id="icao-label" style="font-size: 7px; font-weight: 900; color: #888;">AIRCRAFT ICAO</span><div id="f-icao" class="flap"></div></div>
+                    <div><span id="dist-label" style="font-size: 7px; font-weight: 900; color: #888;">DISTANCE</span><div id="f-dist" class="flap" style="color:#444"></div></div>
+                    <div><span style="font-size: 7px; font-weight: 900; color: #888;">FLIGHT IDENTIFICATION</span><div id="f-call" class="flap"></div></div>
+                    <div><span style="font-size: 7px; font-weight: 900; color: #888;">ROUTE (AT-TO)</span><div id="f-route" class="flap"></div></div>
+                </div>
+                <div style="display:flex; justify-content:space-between; align-items:flex-end;">
+                    <div id="arr" style="font-size:45px; color: #000000 !important; transition: transform 0.2s cubic-bezier(0.17, 0.67, 0.83, 0.67); filter: drop-shadow(0 1px 1px rgba(0,0,0,0.1));">✈</div>
+                    <div class="date-visual">
+                        <div id="f-line1">-- --- ----</div>
+                        <div id="f-line2">--.--</div>
+                        <img id="bc" src="https://bwipjs-api.metafloor.com/?bcid=code128&text=WAITING" onclick="openMap(event)">
+                    </div>
+                </div>
+            </div>
+        </div>
+        <div class="face back">
+            <div style="height:100%; border:1px dashed rgba(0,0,0,0.15); border-radius:15px; padding:20px; display:flex; flex-direction:column; position:relative;">
+                <div style="display:flex; justify-content:space-between;">
+                    <div><span style="font-size: 7px; font-weight: 900; color: #888;">ALTITUDE</span><div id="b-alt" class="flap"></div></div>
+                    <div><span id="spd-label" style="font-size: 7px; font-weight: 900; color: #888;">GROUND SPEED</span><div id="b-spd" class="flap"></div></div>
+                </div>
+                <div style="border: 3px double var(--blue-txt); color: var(--blue-txt); padding: 15px; border-radius: 10px; transform: rotate(-10deg); align-self: center; margin-top: 30px; text-align: center; font-weight: 900; opacity: 0.8;">
+                    <div style="font-size:8px;">SECURITY CHECKED</div>
+                    <div id="b-date-line1">-- --- ----</div>
+                    <div id="b-date-line2" style="font-size:22px;">--.--</div>
+                    <div style="font-size:8px; margin-top:5px;">RADAR CONTACT V106.2</div>
+                </div>
+                <div id="gold-seal" class="metal-seal">
+                    <span>Rare</span>
+                    <span style="font-size:10px;">Aircraft</span>
+                    <span>Found</span>
+                </div>
+            </div>
+        </div>
+    </div>
+    <div class="ticker" id="tk">WAITING...</div>
+
+    <script src="__JS_URL__"></script>
 </body>
 </html>
-''')
+'''
+
+class StaticAsset:
+    def __init__(self, body, mimetype, cache_control):
+        raw = body.encode('utf-8')
+        self.mimetype, self.cache_control = mimetype, cache_control
+        self.etag = hashlib.sha1(raw).hexdigest()[:16]
+        self.variants = {None: raw}
+        self.lock = threading.Lock()
+
+    def variant(self, encoding):
+        # gzip 9 / br 11 custam ~50 ms no total: feitos no primeiro pedido, não no cold start
+        data = self.variants.get(encoding)
+        if data is None:
+            with self.lock:
+                data = self.variants.get(encoding)
+                if data is None:
+                    raw = self.variants[None]
+                    data = self.variants[encoding] = brotli.compress(raw, quality=11) if encoding == 'br' else gzip.compress(raw, 9)
+        return data
+
+    def response(self):
+        encoding = negotiate_encoding()
+        etag = self.etag + (f"-{encoding}" if encoding else '')
+        if request.if_none_match.contains(etag): resp = Response(status=304)
+        else:
+            resp = Response(self.variant(encoding), mimetype=self.mimetype)
+            if encoding: resp.headers['Content-Encoding'] = encoding
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = self.cache_control
+        resp.headers['Vary'] = 'Accept-Encoding'
+        return resp
+
+page_css = StaticAsset(PAGE_CSS, 'text/css', ASSET_CACHE)
+page_js = StaticAsset(PAGE_JS, 'application/javascript', ASSET_CACHE)
+ASSETS = {f"radar.{page_css.etag}.css": page_css, f"radar.{page_js.etag}.js": page_js}
+page_html = StaticAsset(PAGE_HTML.replace('__CSS_URL__', f"/assets/radar.{page_css.etag}.css").replace('__JS_URL__', f"/assets/radar.{page_js.etag}.js"), 'text/html', PAGE_CACHE)
+
+@app.route('/')
+def index():
+    return page_html.response()
+
+@app.route('/assets/<name>')
+def assets(name):
+    asset = ASSETS.get(name)
+    return asset.response() if asset else Response(status=404)
+
+if SHARED_PATH and fcntl is None:
+    app.logger.warning("RADAR_SHARED ignorado: sem fcntl não há eleição do fetcher; cada worker busca por tile")
+elif SHARED_PATH:
+    start_shared()
+elif os.environ.get('RADAR_INGEST') == '1':
+    start_ingest()
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# Testes do estado da aplicação dirigidos por fontes stub: ingestão + store, circuit
+# breaker, ETag/304 e delta, validação de assinaturas e o snapshot compartilhado.
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('RADAR_ROUTE_DB', os.path.join(tempfile.mkdtemp(), 'radar_test.sqlite3')) # Antes do import
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pytest
+
+import index
+
+LAT, LON = -23.55, -46.63
+
+def aircraft(hex_, lat=LAT + 0.05, lon=LON + 0.05, **extra):
+    return dict({"hex": hex_, "lat": lat, "lon": lon, "flight": "TAM3452", "t": "A320",
+                 "alt_baro": 35000, "gs": 450.0, "track": 90.0, "seen_pos": 0.5}, **extra)
+
+class StubFeed:
+    # fetch(lat, lon) do Ingestor; devolve o que o teste colocar em records
+    def __init__(self, records, feeds=("adsb.lol",)):
+        self.records, self.feeds, self.calls = list(records), list(feeds), 0
+
+    def __call__(self, lat, lon):
+        self.calls += 1
+        return list(self.records), list(self.feeds)
+
+@pytest.fixture
+def client(monkeypatch):
+    # Nada sai para a rede: clima e rota stub, tile proibido
+    monkeypatch.setattr(index, 'fetch_weather', lambda lat, lon: {"temp": "20C", "sky": "CLEAR SKY", "vis": "10KM"})
+    monkeypatch.setattr(index, 'fetch_route', lambda call: "GRU GIG")
+    monkeypatch.setattr(index, 'fetch_tile', lambda lat, lon: pytest.fail("fetch_tile chamado com a ingestão ativa"))
+    return index.app.test_client()
+
+@pytest.fixture
+def ingest(monkeypatch):
+    # -> função que liga a ingestão com a fonte stub e espera o primeiro ciclo
+    monkeypatch.setattr(index, 'store', index.AircraftStore())
+    started = []
+
+    def start(feed):
+        ing = index.start_ingest([(LAT, LON)], fetch=feed, interval=60)
+        started.append(ing)
+        deadline = time.time() + 5
+        while not index.store.last_tick and time.time() < deadline: time.sleep(0.01)
+        return ing
+
+    yield start
+    for ing in started: ing.stop()
+    monkeypatch.setattr(index, 'ingestor', None)
+
+# --- INGESTÃO + STORE ---
+def test_ingestor_tick_merges_stub_feed():
+    store = index.AircraftStore()
+    feed = StubFeed([aircraft("e48c12"), aircraft("abc123", lat=LAT + 0.1)])
+    index.Ingestor(store, [(LAT, LON)], fetch=feed).tick()
+    assert feed.calls == 1
+    assert store.status()["aircraft"] == 2
+    grid, feeds = store.snapshot()
+    assert feeds == ["adsb.lol"]
+    assert {a["hex"] for _, a in grid.query(LAT, LON, 50)} == {"e48c12", "abc123"}
+
+def test_store_expires_aircraft_not_seen():
+    store = index.AircraftStore(ttl=60)
+    t0 = time.time()
+    store.merge([aircraft("e48c12"), aircraft("abc123")], ["adsb.lol"], now=t0)
+    store.merge([aircraft("e48c12")], ["adsb.lol"], now=t0 + 30)
+    assert store.status()["aircraft"] == 2 # abc123 ainda dentro do TTL
+    store.merge([aircraft("e48c12")], ["adsb.lol"], now=t0 + 61)
+    assert [a["hex"] for _, a in store.snapshot()[0].query(LAT, LON, 50)] == ["e48c12"]
+
+def test_failed_region_does_not_wipe_store():
+    store = index.AircraftStore()
+    index.Ingestor(store, [(LAT, LON)], fetch=StubFeed([aircraft("e48c12")])).tick()
+    index.Ingestor(store, [(LAT, LON)], fetch=StubFeed([], feeds=[])).tick() # Nenhuma fonte respondeu
+    assert store.status()["aircraft"] == 1
+
+def test_radar_serves_from_store(client, ingest):
+    ingest(StubFeed([aircraft("e48c12")]))
+    r = client.get(f"/api/radar?lat={LAT}&lon={LON}")
+    body = r.get_json()
+    assert r.status_code == 200
+    assert body["flight"]["icao"] == "E48C12"
+    assert body["feeds"] == ["adsb.lol"]
+
+# --- CIRCUIT BREAKER ---
+def test_feed_health_opens_and_recovers():
+    h = index.FeedHealth("stub")
+    for _ in range(index.BREAKER_FAILS - 1): h.record(100, index.UpstreamError("boom"))
+    assert h.available()
+    h.record(100, index.UpstreamError("boom"))
+    assert not h.available()
+    snap = h.snapshot()
+    assert snap["state"] == "open" and snap["skipped"] == 1 and snap["score"] == 0.0
+    h.open_until = time.time() - 1 # Cooldown vencido: volta a tentar
+    assert h.available()
+    h.record(50)
+    assert h.snapshot()["consecutive_fails"] == 0 and h.snapshot()["state"] == "closed"
+
+# --- ETAG/304 E DELTA ---
+def test_etag_304_and_delta(client, ingest):
+    ingest(StubFeed([aircraft("e48c12")]))
+    url = f"/api/radar?lat={LAT}&lon={LON}"
+    first = client.get(url)
+    etag, version = first.headers["ETag"], first.get_json()["version"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    index.store.merge([aircraft("e48c12", lat=LAT + 0.06, seen_pos=0.1)], ["adsb.lol"]) # Aeronave andou
+    r = client.get(url + f"&since={version}")
+    body = r.get_json()
+    assert r.headers["ETag"] != etag
+    assert body["base"] == version and "delta" in body and "flight" not in body
+
+def test_unknown_since_returns_full_payload(client, ingest):
+    ingest(StubFeed([aircraft("e48c12")]))
+    body = client.get(f"/api/radar?lat={LAT}&lon={LON}&since=desconhecida").get_json()
+    assert body["flight"]["icao"] == "E48C12" and "delta" not in body
+
+# --- ASSINATURAS ---
+@pytest.mark.parametrize("body", [
+    {"lat": LAT, "lon": LON, "rule": "mil"},
+    {"lat": LAT, "lon": LON, "rule": {"types": [5]}},
+    {"lat": LAT, "lon": LON, "rule": {}},
+    {"lat": "nan", "lon": LON, "rule": {"mil": True}},
+    {"lat": 91, "lon": LON, "rule": {"mil": True}},
+    {"lat": LAT, "lon": 181, "rule": {"mil": True}},
+    {"lat": LAT, "lon": LON, "radius_km": -5, "rule": {"mil": True}},
+    {"lat": LAT, "lon": LON, "radius_km": index.WATCH_MAX_RADIUS_KM + 1, "rule": {"mil": True}},
+    {"lon": LON, "rule": {"mil": True}},
+])
+def test_watch_rejects_malformed(client, body):
+    r = client.post("/api/watch", json=body)
+    assert r.status_code == 400 and "error" in r.get_json()
+
+def test_watch_fires_once_per_entry(client):
+    r = client.post("/api/watch", json={"lat": LAT, "lon": LON, "radius_km": 50, "rule": {"types": "A320"}})
+    assert r.status_code == 201
+    wid = r.get_json()["id"]
+    now = time.time()
+    assert index.watches.evaluate([aircraft("e48c12")], now) == 1
+    assert index.watches.evaluate([aircraft("e48c12")], now + 5) == 0 # Ainda dentro
+    info = client.get(f"/api/watch/{wid}").get_json()
+    assert info["seq"] == 1 and [e["icao"] for e in info["events"]] == ["E48C12"]
+    assert client.delete(f"/api/watch/{wid}").status_code == 200
+    assert client.get(f"/api/watch/{wid}").status_code == 404
+
+# --- SNAPSHOT COMPARTILHADO ---
+def test_shared_snapshot_round_trip(tmp_path):
+    shared = index.SharedSnapshot(str(tmp_path / "snap"), capacity=16)
+    records = [aircraft("e48c12"), aircraft("~abc123", lat=LAT + 0.1, alt_baro="ground", mil=True)]
+    shared.publish(records, ["adsb.lol", "adsb.fi"], time.time())
+
+    reader = index.SharedSnapshot(str(tmp_path / "snap"), capacity=16) # Outro "processo"
+    view = reader.view()
+    assert len(view) == 2 and view.feeds == ["adsb.lol", "adsb.fi"]
+    got = {a["hex"]: a for _, a in view.query(LAT, LON, 50)}
+    assert got["e48c12"]["flight"] == "TAM3452" and got["e48c12"]["alt_baro"] == 35000
+    assert got["~abc123"]["alt_baro"] == "ground" and got["~abc123"]["mil"] is True
+    assert reader.view() is view # Mesma publicação, mesma view
+
+    shared.publish(records[:1], ["adsb.lol"], time.time())
+    shared.publish(records[:1], ["adsb.lol"], time.time()) # Reescreve o slot da view antiga
+    assert [a["hex"] for _, a in view.query(LAT, LON, 50)] == ["e48c12"]
+    assert reader.status()["aircraft"] == 1